@@ -0,0 +1,239 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit
+except ImportError:    # numba 不可用时退回 numpy 实现（排序去重 + searchsorted）
+    njit = None
+
+POLICIES = ('inner', 'ffill', 'outer')
+
+
+def _merge_count(ts, offsets):
+    """统计并集时间戳的个数（ffill/outer 预分配输出用）；ts 为各腿首尾相接的时间戳，offsets 为各腿起点"""
+    n_legs = len(offsets) - 1
+    pos = offsets[:-1].copy()
+    count = 0
+    while True:
+        t = 0
+        found = False
+        for k in range(n_legs):
+            if pos[k] < offsets[k + 1] and (not found or ts[pos[k]] < t):
+                t = ts[pos[k]]
+                found = True
+        if not found:
+            return count
+        for k in range(n_legs):
+            while pos[k] < offsets[k + 1] and ts[pos[k]] == t:
+                pos[k] += 1
+        count += 1
+
+
+def _merge_fill(ts, offsets, inner, out_ts, last, missing, distinct):
+    """
+    一次 N 路归并写出时间戳与每条腿的 bar 位置，返回输出行数；某条腿未按时间排序时返回 -1。
+
+    last[k, i]:    腿 k 在 out_ts[i] 及之前最近一根 bar 的位置（重复时间戳取最后一根），尚无 bar 时为 -1
+    missing[k, i]: 腿 k 在 out_ts[i] 没有 bar
+    distinct[k]:   腿 k 不重复时间戳的个数
+    inner 时只写出所有腿都有 bar 的时刻，输出行数不超过最短的腿，无需预先计数。
+    """
+    n_legs = len(offsets) - 1
+    pos = offsets[:-1].copy()
+    prev = np.full(n_legs, -1, dtype=np.int64)
+    hit = np.zeros(n_legs, dtype=np.bool_)
+    distinct[:] = 0
+    i = 0
+    while True:
+        t = 0
+        found = False
+        for k in range(n_legs):
+            if pos[k] < offsets[k + 1] and (not found or ts[pos[k]] < t):
+                t = ts[pos[k]]
+                found = True
+        if not found:
+            return i
+        present = 0
+        for k in range(n_legs):
+            end = offsets[k + 1]
+            hit[k] = False
+            while pos[k] < end and ts[pos[k]] == t:
+                prev[k] = pos[k] - offsets[k]
+                hit[k] = True
+                pos[k] += 1
+            if hit[k]:
+                present += 1
+                distinct[k] += 1
+                if pos[k] < end and ts[pos[k]] < t:
+                    return -1
+        if inner and present < n_legs:
+            continue
+        out_ts[i] = t
+        for k in range(n_legs):
+            last[k, i] = prev[k]
+            missing[k, i] = not hit[k]
+        i += 1
+
+
+if njit is not None:
+    _merge_count = njit(cache=True)(_merge_count)
+    _merge_fill = njit(cache=True)(_merge_fill)
+
+
+def _merge(stamps, inner) -> tuple:
+    """归并各腿时间戳，返回 (out_ts, last, missing, distinct)；numba 不可用时用排序去重 + searchsorted"""
+    index_dtype = np.int32 if max(len(s) for s in stamps) < 2 ** 31 else np.int64
+    if njit is not None:
+        offsets = np.cumsum([0] + [len(s) for s in stamps]).astype(np.int64)
+        flat = np.concatenate(stamps)
+        n = min(len(s) for s in stamps) if inner else _merge_count(flat, offsets)
+        out_ts = np.empty(n, dtype=np.int64)
+        last = np.empty((len(stamps), n), dtype=index_dtype)
+        missing = np.empty((len(stamps), n), dtype=bool)
+        distinct = np.empty(len(stamps), dtype=np.int64)
+        n = _merge_fill(flat, offsets, inner, out_ts, last, missing, distinct)
+        if n < 0:
+            raise ValueError("时间戳未排序")
+        return out_ts[:n], last[:, :n], missing[:, :n], distinct
+
+    if any((s[1:] < s[:-1]).any() for s in stamps):
+        raise ValueError("时间戳未排序")
+    out_ts = np.sort(np.concatenate(stamps), kind='stable')
+    out_ts = out_ts[np.concatenate([[True], out_ts[1:] != out_ts[:-1]])] if len(out_ts) else out_ts
+    last = np.empty((len(stamps), len(out_ts)), dtype=index_dtype)
+    missing = np.empty((len(stamps), len(out_ts)), dtype=bool)
+    for k, s in enumerate(stamps):
+        last[k] = np.searchsorted(s, out_ts, side='right') - 1
+        valid = last[k] >= 0
+        missing[k] = True
+        missing[k][valid] = s[last[k][valid]] != out_ts[valid]
+    distinct = np.count_nonzero(~missing, axis=1)
+    if inner:
+        rows = ~missing.any(axis=0)
+        out_ts, last, missing = out_ts[rows], last[:, rows], missing[:, rows]
+    return out_ts, last, missing, distinct
+
+
+def _leg_arrays(leg, unit):
+    """Series/DataFrame → (int64 时间戳, 列名 → 数组)"""
+    frame = leg.to_frame() if isinstance(leg, pd.Series) else leg
+    stamps = np.ascontiguousarray(frame.index.values.astype(unit, copy=False).view(np.int64))
+    return stamps, {name: frame[name].to_numpy() for name in frame.columns}
+
+
+def _sort_leg(stamps, columns):
+    order = np.argsort(stamps, kind='stable')
+    return stamps[order], {name: values[order] for name, values in columns.items()}
+
+
+def align_legs(legs: dict, policy='inner', max_staleness=None, dropna=True) -> tuple:
+    """
+    在一次线性归并中按时间戳对齐任意多条腿（现货、永续、交割合约、指数价格等）。
+
+    参数:
+        legs: 腿名 → 以时间为索引的 Series/DataFrame；列名在结果中须唯一
+        policy: 'inner' - 只保留所有腿都有 bar 的时刻（等价于 pd.merge(how='inner')）
+                'ffill' - 在并集时间轴上向前填充，超过 max_staleness 的旧值视为缺失
+                'outer' - 并集时间轴，缺失为 NaN
+        max_staleness: ffill 允许的最大陈旧时间（pd.Timedelta 或字符串，如 '15min'），None 表示不限制
+        dropna: ffill/outer 下是否丢弃仍有缺失值的行
+
+    返回 (frame, report)：
+        frame: 对齐后的 DataFrame
+        report: {'missing': 腿名 → 布尔数组（与 frame 行对应，True 表示该腿在该时刻没有 bar，值为填充或 NaN），
+                 'dropped': 腿名 → 该腿未进入结果的 bar 数（不含重复时间戳）, 'rows': 输出行数}
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"无效的 policy 参数，请使用 {POLICIES} 之一。")
+    names = list(legs)
+    first = legs[names[0]].index
+    unit = first.values.dtype
+    arrays = [_leg_arrays(legs[name], unit) for name in names]
+    inner = policy == 'inner'
+    try:
+        out_ts, last, missing, distinct = _merge([s for s, _ in arrays], inner)
+    except ValueError:
+        arrays = [_sort_leg(*leg) for leg in arrays]
+        out_ts, last, missing, distinct = _merge([s for s, _ in arrays], inner)
+
+    if inner:
+        source, rows = last, None
+    else:
+        source = last
+        if policy == 'outer':
+            source = np.where(missing, -1, last)
+        elif max_staleness is not None:
+            limit = pd.Timedelta(max_staleness).to_numpy().astype(unit.str.replace('M8', 'm8')).view(np.int64)
+            source = last.copy()
+            for k, (stamps, _) in enumerate(arrays):
+                valid = source[k] >= 0
+                stale = np.zeros(len(out_ts), dtype=bool)
+                stale[valid] = out_ts[valid] - stamps[source[k][valid]] > limit
+                source[k][stale] = -1
+        rows = np.flatnonzero(~(source < 0).any(axis=0)) if dropna else None
+        if rows is not None:
+            out_ts, source, missing = out_ts[rows], source[:, rows], missing[:, rows]
+
+    columns = {}
+    for k, (_, leg_columns) in enumerate(arrays):
+        positions = source[k]
+        absent = None if inner else positions < 0
+        for name, values in leg_columns.items():
+            if name in columns:
+                raise ValueError(f"列名重复: {name}")
+            if absent is None or not absent.any():
+                columns[name] = values[positions]
+            else:
+                picked = values[np.where(absent, 0, positions)].astype(np.float64)
+                picked[absent] = np.nan
+                columns[name] = picked
+    index = pd.DatetimeIndex(out_ts.view(unit), name=first.name)
+    frame = pd.DataFrame(columns, index=index, copy=False)
+
+    report = {
+        'missing': {name: missing[k] for k, name in enumerate(names)},
+        'dropped': {name: int(distinct[k] - np.count_nonzero(~missing[k])) for k, name in enumerate(names)},
+        'rows': len(out_ts),
+    }
+    return frame, report
+
+
+def log_report(report: dict):
+    """记录各腿被丢弃与填充的 bar 数"""
+    for name, dropped in report['dropped'].items():
+        filled = int(report['missing'][name].sum())
+        if dropped or filled:
+            logging.warning(f"对齐: {name} 丢弃 {dropped} 根 bar, 缺失 {filled} 根（已填充或为 NaN）")
+
+
+def benchmark(n_bars=10_000_000, n_legs=4, gap=0.001, seed=0) -> dict:
+    """n_legs 条各自随机缺失 gap 比例 bar 的 1m 序列：链式 pd.merge 与 align_legs(inner) 的耗时对比"""
+    import time
+
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2015-01-01', periods=n_bars, freq='1min', name='timestamp')
+    legs = {}
+    for k in range(n_legs):
+        keep = rng.random(n_bars) >= gap
+        legs[f'leg{k}'] = pd.DataFrame({f'leg{k}': rng.random(int(keep.sum()))}, index=index[keep])
+
+    start = time.perf_counter()
+    merged = legs['leg0']
+    for k in range(1, n_legs):
+        merged = pd.merge(merged, legs[f'leg{k}'], left_index=True, right_index=True, how='inner')
+    pandas_seconds = time.perf_counter() - start
+
+    align_legs({name: leg.iloc[:10] for name, leg in legs.items()})    # 排除 numba 编译时间（按腿数编译）
+    start = time.perf_counter()
+    frame, _ = align_legs(legs, policy='inner')
+    align_seconds = time.perf_counter() - start
+    assert frame.equals(merged)
+    return {'bars': n_bars, 'legs': n_legs, 'pandas_merge_s': pandas_seconds, 'align_s': align_seconds,
+            'speedup': pandas_seconds / align_seconds}
+
+
+if __name__ == '__main__':
+    for key, value in benchmark().items():
+        print(f'{key}: {value}')
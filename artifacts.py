@@ -0,0 +1,140 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+
+import pandas as pd
+
+ARTIFACT_DIR = 'debug'
+FORMATS = ('csv',)    # 可选 'csv'、'pickle'（二进制，读写最快）、'parquet'（需要 pyarrow）
+QUEUE_SIZE = 64       # 待写出的文件上限，队列满时丢弃新的文件而不是阻塞调用方
+
+# 调试文件类型：market - 原始行情，signals - 信号，positions - 交易记录，cache - 缓存数据的 CSV 副本，plot - 图表
+KINDS = ('market', 'signals', 'positions', 'cache', 'plot')
+
+_WRITERS = {
+    'csv': (lambda frame, path: frame.to_csv(path), '.csv'),
+    'pickle': (lambda frame, path: frame.to_pickle(path, compression=None), '.pkl'),
+    'parquet': (lambda frame, path: frame.to_parquet(path), '.parquet'),
+}
+
+
+def _write_bytes(data, path):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class ArtifactSink:
+    """
+    调试文件的后台写出器。
+
+    submit() 只把数据放入队列并立即返回，由单个后台线程负责格式化与写盘；
+    各类型可单独关闭，写出失败只记录日志，不影响主流程。进程退出时自动写完队列中的文件。
+    """
+
+    def __init__(self, directory=ARTIFACT_DIR, formats=FORMATS, disabled=(), maxsize=QUEUE_SIZE):
+        self.directory = directory
+        self.formats = tuple(formats)
+        self.disabled = set(disabled)
+        self.queue = queue.Queue(maxsize)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def configure(self, directory=None, formats=None, enable=(), disable=()):
+        """修改输出目录/格式，开启或关闭指定类型的调试文件"""
+        if directory is not None:
+            self.directory = directory
+        if formats is not None:
+            unknown = set(formats) - set(_WRITERS)
+            if unknown:
+                raise ValueError(f"不支持的格式: {sorted(unknown)}")
+            self.formats = tuple(formats)
+        self.disabled.difference_update(enable)
+        self.disabled.update(disable)
+
+    def enabled(self, kind) -> bool:
+        return kind not in self.disabled
+
+    def submit(self, kind, name, data, formats=None) -> bool:
+        """
+        提交一个调试文件，返回是否已入队。
+
+        参数:
+            kind: 文件类型，见 KINDS
+            name: 相对输出目录的文件名（不含扩展名），绝对路径原样使用
+            data: DataFrame/Series 按 formats 写出；bytes 原样写出，此时 name 需包含扩展名
+        """
+        if kind in self.disabled:
+            return False
+        if isinstance(data, (pd.DataFrame, pd.Series)):
+            # 浅拷贝：调用方之后增删列不影响写出的内容
+            data = data.copy(deep=False)
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait((name, data, tuple(formats or self.formats)))
+        except queue.Full:
+            self.dropped += 1
+            logging.warning(f"调试文件队列已满，丢弃: {name}")
+            return False
+        return True
+
+    def _ensure_thread(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='artifact-writer', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"调试文件写出失败: {item[0]}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _write(self, name, data, formats):
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if isinstance(data, (bytes, bytearray)):
+            targets = [(path, lambda tmp: _write_bytes(data, tmp))]
+        else:
+            targets = [(path + _WRITERS[fmt][1], lambda tmp, fmt=fmt: _WRITERS[fmt][0](data, tmp))
+                       for fmt in formats]
+        for target, write in targets:
+            # 先写临时文件再替换，读取方不会看到写了一半的文件
+            tmp = target + '.tmp'
+            write(tmp)
+            os.replace(tmp, target)
+
+    def flush(self):
+        """等待队列中已提交的文件全部写完"""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def close(self):
+        """写完剩余文件并停止后台线程"""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.thread = None
+
+
+# 全局写出器，各模块通过 submit() 提交调试文件
+SINK = ArtifactSink()
+submit = SINK.submit
+configure = SINK.configure
+enabled = SINK.enabled
+flush = SINK.flush
+atexit.register(SINK.close)
@@ -2,96 +2,451 @@ import pandas as pd
 import numpy as np
 import math
 
+from instrumentation import stage
+from artifacts import submit
+from metrics import performance_stats
+
+try:
+    from numba import njit
+except ImportError:  # numba 为可选依赖，未安装时回退到纯 Python 内核
+    njit = None
+
 # Configuration moved from external config.py
 INITIAL_CAPITAL = 10000           # Example initial capital
 FEE_RATE = {'spot': 0.001, 'future': 0.0001}  # Example fee rates
 SLIPPAGE = 0.0005                  # Example slippage value
+SLIPPAGE_IMPACT = 0.1              # 平方根冲击系数：滑点 = SLIPPAGE + SLIPPAGE_IMPACT * sqrt(下单金额 / bar 成交额)
+SLIPPAGE_CAP = 0.01                # 单边滑点上限（成交额极小或为 0 的 bar）
 ENABLE_FEE = False
 ENABLE_SLIPPAGE = False
+ENABLE_FUNDING = False             # 持仓期间按永续合约资金费率累计资金费（需 market_data 含 funding_rate 列）
 LEVERAGE = 20                      # Example leverage
 TAKE_PROFIT = 0.02                 # Example take profit threshold
 STOP_LOSS = 0.03                   # Example stop loss threshold
 POSITION_RATIO = 0.1               # Example position ratio
 ENABLE_DEBUG = True
+ENABLE_JIT = True                  # 安装了 numba 时使用 JIT 编译的回测内核
+
+# 平仓类型编码，与 position_history 中的 close_type 一一对应
+CLOSE_TYPES = {1: '爆仓', 2: '止盈', 3: '止损', 4: '反向'}
+
+# 内核状态: [资金, 持仓规模, 入场现货价, 入场合约价, 方向, 入场索引（相对下一块起点）, 入场资金,
+#           入场时现货/合约成本比例, 持仓以来累计的资金费]
+STATE_SIZE = 10
+
+
+def _initial_state(initial_capital) -> np.ndarray:
+    state = np.zeros(STATE_SIZE, dtype=np.float64)
+    state[0] = initial_capital
+    return state
+
+
+def _backtest_kernel(spot, future, signal, cost_spot, cost_future, funding,
+                     take_profit, stop_loss, leverage, position_ratio, state):
+    """基于连续数组的开仓/持仓/平仓状态机，逐 bar 逻辑与原 iterrows 循环保持一致
+
+    cost_spot/cost_future 为逐 bar 的单边成交成本比例（手续费 + 滑点），入场取入场 bar、出场取当前 bar 的值；
+    funding 为逐 bar 结算的资金费率（无结算为 0），持仓期间按合约名义价值累计进 pnl（见 cost_arrays）。
+
+    返回已平仓交易的 (入场索引, 出场索引, 方向, pnl, 平仓类型, 入场资金, 平仓后资金)，
+    以及持仓时顺带算出的逐 bar 盯市资金 equity 与 bar 末持仓方向 position。
+
+    state 为长度 STATE_SIZE 的 float64 数组（见 _initial_state），进入时读取资金与持仓，返回前写回，
+    分块回测据此把未平仓头寸带入下一块；带入的头寸入场索引为负数（相对本块起点）。
+    """
+    n = spot.shape[0]
+    max_trades = n // 2 + 1
+    entry_idx = np.empty(max_trades, dtype=np.int64)
+    exit_idx = np.empty(max_trades, dtype=np.int64)
+    direction = np.empty(max_trades, dtype=np.int8)
+    pnls = np.empty(max_trades, dtype=np.float64)
+    close_type = np.empty(max_trades, dtype=np.int8)
+    capital_in = np.empty(max_trades, dtype=np.float64)
+    capital_out = np.empty(max_trades, dtype=np.float64)
+    equity = np.empty(n, dtype=np.float64)
+    position = np.zeros(n, dtype=np.int8)
+
+    current_capital = state[0]
+    position_size = state[1]
+    entry_spot_price = state[2]
+    entry_future_price = state[3]
+    position_direction = int(state[4])
+    entry_cost_spot = state[7]
+    entry_cost_future = state[8]
+    funding_pnl = state[9]
+    n_trades = 0
+    if position_direction != 0:
+        entry_idx[0] = int(state[5])
+        direction[0] = position_direction
+        capital_in[0] = state[6]
+
+    for i in range(n):
+        # 持仓则计算盈亏
+        if position_direction != 0:
+            if position_direction == 1:
+                spot_pnl = (spot[i] / entry_spot_price) * \
+                    ((1 - entry_cost_spot) * (1 - cost_spot[i])) - 1
+                future_pnl = (1 - entry_cost_future) - (future[i] /
+                                                        entry_future_price) / (1 - cost_future[i])
+            else:
+                spot_pnl = (1 - entry_cost_spot) - (spot[i] /
+                                                    entry_spot_price) / (1 - cost_spot[i])
+                future_pnl = (future[i] / entry_future_price) * \
+                    ((1 - entry_cost_future) * (1 - cost_future[i])) - 1
+            # 做多溢价（空合约）收取正费率，做空溢价（多合约）支付正费率，按当前合约名义价值计
+            if funding[i] != 0:
+                funding_pnl += position_direction * funding[i] * 0.5 * leverage * future[i] / entry_future_price
+            pnl = spot_pnl * 0.5 + future_pnl * 0.5 * leverage + funding_pnl
+
+            # 平仓
+            code = 0
+            if pnl < -1:
+                code = 1
+            elif pnl >= take_profit:
+                code = 2
+            elif pnl <= -stop_loss:
+                code = 3
+            elif signal[i] == -position_direction and pnl > 0:
+                code = 4
+            if code != 0:
+                current_capital += (1 + pnl) * position_size
+                exit_idx[n_trades] = i
+                pnls[n_trades] = pnl
+                close_type[n_trades] = code
+                capital_out[n_trades] = current_capital
+                n_trades += 1
+                position_direction = 0
+                equity[i] = current_capital
+            else:
+                equity[i] = current_capital + (1 + pnl) * position_size
+        # 开仓
+        elif signal[i] != 0:
+            entry_spot_price = spot[i]
+            entry_future_price = future[i]
+            entry_cost_spot = cost_spot[i]
+            entry_cost_future = cost_future[i]
+            funding_pnl = 0.0
+            position_direction = signal[i]
+            position_size = current_capital * position_ratio
+            entry_idx[n_trades] = i
+            direction[n_trades] = position_direction
+            capital_in[n_trades] = current_capital
+            equity[i] = current_capital
+            current_capital -= position_size
+        else:
+            equity[i] = current_capital
+        position[i] = position_direction
+
+    state[0] = current_capital
+    state[1] = position_size
+    state[2] = entry_spot_price
+    state[3] = entry_future_price
+    state[4] = position_direction
+    state[7] = entry_cost_spot
+    state[8] = entry_cost_future
+    state[9] = funding_pnl
+    if position_direction != 0:
+        state[5] = entry_idx[n_trades] - n
+        state[6] = capital_in[n_trades]
+    return (entry_idx[:n_trades], exit_idx[:n_trades], direction[:n_trades], pnls[:n_trades],
+            close_type[:n_trades], capital_in[:n_trades], capital_out[:n_trades], equity, position)
+
+
+_jit_kernel = njit(cache=True, nogil=True)(_backtest_kernel) if njit is not None else None
 
 
-def run_backtest(df, initial_capital=INITIAL_CAPITAL) -> tuple:
-    # Initialize parameters and state variables
-    use_fee = ENABLE_FEE
-    use_slippage = ENABLE_SLIPPAGE
-    fee_spot = FEE_RATE['spot'] if use_fee else 0
-    fee_future = FEE_RATE['future'] if use_fee else 0
-    slippage = SLIPPAGE if use_slippage else 0
-    fraction = {'spot': fee_spot + slippage, 'future': fee_future + slippage}
+def _get_kernel():
+    """选择回测内核：优先 JIT，否则使用纯 Python 版本"""
+    if ENABLE_JIT and _jit_kernel is not None:
+        return _jit_kernel
+    return _backtest_kernel
+
+
+def _to_arrays(df):
+    """把 DataFrame 中的 spot/future/signal 列转换为连续的 float64/int8 数组"""
+    spot = np.ascontiguousarray(df['spot'].to_numpy(dtype=np.float64))
+    future = np.ascontiguousarray(df['future'].to_numpy(dtype=np.float64))
+    signal = np.ascontiguousarray(df['signal'].to_numpy(dtype=np.int8))
+    return spot, future, signal
+
+
+def _build_position_history(index, trades, leverage, carried_entry_time=None):
+    """
+    将内核输出的交易数组组装为与原循环相同结构的 position_history。
+
+    分块回测中从上一块带入的头寸入场索引为负数，其入场时间由 carried_entry_time 给出
+    """
+    entry_idx, exit_idx, direction, pnls, close_type, capital_in, capital_out = trades[:7]
+    if len(entry_idx) and entry_idx[0] < 0:
+        entry_time = index[np.maximum(entry_idx, 0)].to_numpy(copy=True)
+        entry_time[0] = carried_entry_time
+        entry_time = pd.DatetimeIndex(entry_time, name=index.name)
+    else:
+        entry_time = index[entry_idx]
+    exit_time = index[exit_idx]
+    position_history = pd.DataFrame({
+        'initial_capital': capital_in,
+        'type': np.where(direction == 1, 'long', 'short'),
+        'entry_time': entry_time,
+        'leverage': np.full(len(entry_idx), leverage),
+        'pnl': pnls * 100,
+        'exit_time': exit_time,
+        'duration': (exit_time - entry_time).total_seconds() / 3600,
+        'close_type': [CLOSE_TYPES[c] for c in close_type],
+        'final_capital': capital_out,
+    })
+    return position_history
+
+
+def _closed_trade_equity(index, position_history, initial_capital):
+    """没有逐 bar 盯市资金时，用平仓后资金在时间轴上前向填充得到的阶梯资金曲线"""
+    exit_pos = index.get_indexer(position_history['exit_time'])
+    equity = np.full(len(index), np.nan)
+    equity[0] = initial_capital
+    equity[exit_pos] = position_history['final_capital'].to_numpy()
+    return pd.Series(equity).ffill().to_numpy()
+
+
+def _compute_metrics(index, position_history, initial_capital, raw=False, equity=None, position=None,
+                     position_ratio=None, stats=None):
+    """
+    回测指标：收益、胜率等来自已平仓交易，回撤、夏普等风险指标来自逐 bar 盯市资金曲线 equity。
+
+    raw=True 时返回未格式化的数值；分块回测传入 metrics.StreamingStats，此时不需要 index/equity
+    """
+    position_ratio = _setting(position_ratio, 'POSITION_RATIO')
+    if stats is None and equity is None:
+        equity = _closed_trade_equity(index, position_history, initial_capital)
+    initial_capital_value = initial_capital
+    final_capital_value = position_history['final_capital'].iloc[-1]
+    total_profit = final_capital_value - initial_capital_value
+    total_trades = len(position_history)
+
+    pnl = position_history['pnl'].to_numpy()
+    win_rate = np.count_nonzero(pnl > 0) / total_trades * 100
+    avg_duration = position_history['duration'].mean()
+
+    # 成交金额：开仓投入 + 平仓回收
+    size = position_history['initial_capital'].to_numpy() * position_ratio
+    traded = float((size * (2 + pnl / 100)).sum())
+    stats = performance_stats(index, equity, position, traded) if stats is None else stats.result(traded)
+
+    values = {
+        "初始资金": initial_capital_value,
+        "最终资金": final_capital_value,
+        "总收益": total_profit,
+        "年化收益率": stats['annualized_return'],
+        "胜率": win_rate,
+        "交易次数": total_trades,
+        "平均持仓时间": avg_duration,
+        "最大回撤": stats['max_drawdown'],
+        "最大回撤修复时间": stats['max_drawdown_recovery'],
+        "最大回撤持续时间": stats['max_drawdown_duration'],
+        "年化波动率": stats['annualized_volatility'],
+        "夏普比率": stats['sharpe'],
+        "索提诺比率": stats['sortino'],
+        "卡玛比率": stats['calmar'],
+        "持仓时间占比": stats['exposure'],
+        "年化换手率": stats['turnover'],
+    }
+    if raw:
+        return values
+
+    units = {"年化收益率": ' %', "胜率": ' %', "平均持仓时间": ' h', "最大回撤": ' %', "最大回撤修复时间": ' h',
+             "最大回撤持续时间": ' h', "年化波动率": ' %', "持仓时间占比": ' %'}
+    ratios = ("夏普比率", "索提诺比率", "卡玛比率", "年化换手率")
+    return {key: value if key in ratios else f'{value}{units.get(key, "")}' for key, value in values.items()}
+
+
+def _volume_slippage(price, volume, order_notional) -> np.ndarray:
+    """平方根冲击模型的逐 bar 滑点：下单金额占 bar 成交额越大，滑点越高"""
+    turnover = np.asarray(price, dtype=np.float64) * np.asarray(volume, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        impact = SLIPPAGE_IMPACT * np.sqrt(order_notional / turnover)
+    return np.minimum(SLIPPAGE + np.nan_to_num(impact, nan=np.inf), SLIPPAGE_CAP)
+
+
+def funding_per_bar(index, funding: pd.Series, after=None) -> np.ndarray:
+    """
+    把资金费率结算记录映射到 bar：每次结算计入时间不早于结算时刻的第一根 bar，早于首根 bar 的记录忽略。
+
+    分块处理时 after 为上一块最后一根 bar 的时间，(after, 首根 bar) 之间的结算计入本块首根 bar
+    """
+    rates = np.zeros(len(index), dtype=np.float64)
+    if funding is None or not len(funding) or not len(index):
+        return rates
+    times = funding.index.values.astype(index.values.dtype)
+    if after is not None:
+        keep = times > pd.Timestamp(after).to_datetime64().astype(times.dtype)
+    else:
+        keep = times >= index.values[0]
+    positions = np.searchsorted(index.values, times[keep], side='left')
+    inside = positions < len(index)
+    np.add.at(rates, positions[inside], funding.to_numpy(dtype=np.float64)[keep][inside])
+    return rates
+
+
+def _setting(value, name):
+    """未指定（None）的回测参数在调用时取模块的当前配置，运行时修改 backtest.ENABLE_FEE 等全局量即可生效"""
+    return globals()[name] if value is None else value
+
+
+def cost_arrays(n, enable_fee=None, enable_slippage=None, enable_funding=None, spot=None, future=None,
+                spot_volume=None, future_volume=None, funding_rate=None, order_notional=0.0, leverage=None) -> tuple:
+    """
+    预先算好回测内核使用的逐 bar 成本数组 (cost_spot, cost_future, funding)，内核只按下标读取。
+
+    cost_*: 单边手续费 + 滑点比例；给出价格与成交量时滑点按 _volume_slippage 随 bar 成交额变化，否则为常数 SLIPPAGE。
+            order_notional 为现货腿的下单金额（合约腿再乘以 leverage）
+    funding: 逐 bar 结算的资金费率（funding_per_bar 的结果），未启用或未给出时全为 0
+    """
+    enable_fee = _setting(enable_fee, 'ENABLE_FEE')
+    enable_slippage = _setting(enable_slippage, 'ENABLE_SLIPPAGE')
+    enable_funding = _setting(enable_funding, 'ENABLE_FUNDING')
+    leverage = _setting(leverage, 'LEVERAGE')
+    costs = []
+    for leg, price, volume, notional in (('spot', spot, spot_volume, order_notional),
+                                         ('future', future, future_volume, order_notional * leverage)):
+        fee = FEE_RATE[leg] if enable_fee else 0.0
+        if enable_slippage and volume is not None and price is not None:
+            costs.append(fee + _volume_slippage(price, volume, notional))
+        else:
+            costs.append(np.full(n, fee + (SLIPPAGE if enable_slippage else 0.0)))
+    if enable_funding and funding_rate is not None:
+        funding = np.ascontiguousarray(funding_rate, dtype=np.float64)
+    else:
+        funding = np.zeros(n, dtype=np.float64)
+    return costs[0], costs[1], funding
+
+
+def backtest_arrays(index, spot, future, signal, initial_capital=INITIAL_CAPITAL, leverage=None,
+                    take_profit=None, stop_loss=None, position_ratio=None, enable_fee=None, enable_slippage=None,
+                    raw_metrics=False, return_equity=False, enable_funding=None, spot_volume=None,
+                    future_volume=None, funding_rate=None) -> tuple:
+    """
+    直接在时间索引与 spot/future/signal 数组上回测，回测参数按调用传入，未指定的取模块当前配置。
+
+    spot_volume/future_volume 为逐 bar 成交量（启用滑点时按成交额计算滑点），funding_rate 为逐 bar 结算的资金费率；
+    return_equity=True 时额外返回逐 bar 的 equity/position DataFrame（可交给 metrics.rolling_stats）
+    """
+    # leverage = math.atan(
+    #     abs(df.loc[time, 'zscore'])/3)/(math.pi/2) * LEVERAGE
+    leverage = _setting(leverage, 'LEVERAGE')
+    take_profit = _setting(take_profit, 'TAKE_PROFIT')
+    stop_loss = _setting(stop_loss, 'STOP_LOSS')
+    position_ratio = _setting(position_ratio, 'POSITION_RATIO')
+
+    spot = np.ascontiguousarray(spot, dtype=np.float64)
+    future = np.ascontiguousarray(future, dtype=np.float64)
+    signal = np.ascontiguousarray(signal, dtype=np.int8)
+    # 下单金额按初始资金估计
+    costs = cost_arrays(len(spot), enable_fee, enable_slippage, enable_funding, spot=spot, future=future,
+                        spot_volume=spot_volume, future_volume=future_volume, funding_rate=funding_rate,
+                        order_notional=initial_capital * position_ratio * 0.5, leverage=leverage)
+    trades = _get_kernel()(spot, future, signal, *costs, float(take_profit), float(stop_loss), float(leverage),
+                           float(position_ratio), _initial_state(initial_capital))
+
+    equity, position = trades[7], trades[8]
+    position_history = _build_position_history(index, trades, leverage)
+    if position_history.empty:
+        metrics = {}
+    else:
+        metrics = _compute_metrics(index, position_history, initial_capital, raw=raw_metrics,
+                                   equity=equity, position=position, position_ratio=position_ratio)
+    if return_equity:
+        return position_history, metrics, pd.DataFrame({'equity': equity, 'position': position}, index=index)
+    return position_history, metrics
+
+
+# market_data 中可选的成交量与资金费率列（load_data 生成），回测计算滑点与资金费用时读取
+COST_COLUMNS = ('spot_volume', 'future_volume', 'funding_rate')
+
+
+def _cost_columns(df) -> dict:
+    """df 中存在的 COST_COLUMNS，缺失的列不传"""
+    return {name: df[name].to_numpy(dtype=np.float64) for name in COST_COLUMNS if name in df.columns}
+
+
+def run_backtest(df, initial_capital=INITIAL_CAPITAL, leverage=None, take_profit=None, stop_loss=None,
+                 position_ratio=None, enable_fee=None, enable_slippage=None, return_equity=False,
+                 enable_funding=None) -> tuple:
+    with stage('backtest', rows=len(df)):
+        spot, future, signal = _to_arrays(df)
+        result = backtest_arrays(
+            df.index, spot, future, signal, initial_capital=initial_capital, leverage=leverage,
+            take_profit=take_profit, stop_loss=stop_loss, position_ratio=position_ratio,
+            enable_fee=enable_fee, enable_slippage=enable_slippage, return_equity=return_equity,
+            enable_funding=enable_funding, **_cost_columns(df))
+    position_history, metrics = result[0], result[1]
+
+    # 交易结束，计算指标
+    if ENABLE_DEBUG:
+        submit('positions', 'position_history', position_history)
+    if position_history.empty:
+        print("没有交易执行。")
+
+    return result
+
+
+def _run_backtest_reference(df, initial_capital=INITIAL_CAPITAL) -> pd.DataFrame:
+    """原 iterrows 逐行实现，仅作为数组内核的一致性对照；成交成本与资金费率按 cost_arrays 逐 bar 取值"""
+    cost_spot, cost_future, funding = cost_arrays(
+        len(df), spot=df['spot'].to_numpy(dtype=np.float64), future=df['future'].to_numpy(dtype=np.float64),
+        order_notional=initial_capital * POSITION_RATIO * 0.5, **_cost_columns(df))
+    entry_fraction = {}
+    funding_pnl = 0.0
     position_history = []
     current_capital = initial_capital
     position_size = 0
     entry_spot_price = None
     entry_future_price = None
     entry_time = None
-    position_direction = 0  # 0: no position, 1: long, -1: short
+    position_direction = 0
     current_position = {}
 
-    for time, row in df.iterrows():
-        # 持仓则计算盈亏
+    for i, (time, row) in enumerate(df.iterrows()):
         if position_direction != 0:
             exit_spot_price = row['spot']
             exit_future_price = row['future']
+            fraction = {'spot': cost_spot[i], 'future': cost_future[i]}
             if position_direction == 1:
                 spot_pnl = (exit_spot_price / entry_spot_price) * \
-                    (1 - fraction['spot'])**2 - 1
-                future_pnl = (1 - fraction['future']) - (exit_future_price /
-                                                         entry_future_price) / (1 - fraction['future'])
-                pnl = spot_pnl * 0.5 + future_pnl * 0.5 * leverage
+                    ((1 - entry_fraction['spot']) * (1 - fraction['spot'])) - 1
+                future_pnl = (1 - entry_fraction['future']) - (exit_future_price /
+                                                               entry_future_price) / (1 - fraction['future'])
             else:
-                spot_pnl = (1 - fraction['spot']) - (exit_spot_price /
-                                                     entry_spot_price) / (1 - fraction['spot'])
+                spot_pnl = (1 - entry_fraction['spot']) - (exit_spot_price /
+                                                           entry_spot_price) / (1 - fraction['spot'])
                 future_pnl = (exit_future_price / entry_future_price) * \
-                    (1 - fraction['future'])**2 - 1
-                pnl = spot_pnl * 0.5 + future_pnl * 0.5 * leverage
+                    ((1 - entry_fraction['future']) * (1 - fraction['future'])) - 1
+            if funding[i] != 0:
+                funding_pnl += position_direction * funding[i] * 0.5 * leverage * exit_future_price / entry_future_price
+            pnl = spot_pnl * 0.5 + future_pnl * 0.5 * leverage + funding_pnl
 
-            # 平仓
+            close_type = None
             if pnl < -1:
+                close_type = '爆仓'
+            elif pnl >= TAKE_PROFIT or pnl <= -STOP_LOSS:
+                close_type = '止盈' if pnl >= TAKE_PROFIT else '止损'
+            elif (row['signal'] == -position_direction) and (pnl > 0):
+                close_type = '反向'
+            if close_type is not None:
                 current_capital += (1 + pnl) * position_size
                 current_position['pnl'] = pnl * 100
                 current_position['exit_time'] = time
                 current_position['duration'] = (
                     time - entry_time).total_seconds() / 3600
-                current_position['close_type'] = '爆仓'
+                current_position['close_type'] = close_type
                 current_position['final_capital'] = current_capital
                 position_history.append(current_position)
-
                 position_direction = 0
-            elif pnl >= TAKE_PROFIT or pnl <= -STOP_LOSS:  # 止盈止损
-                current_capital += (1 + pnl) * position_size
-                current_position['pnl'] = pnl * 100
-                current_position['exit_time'] = time
-                current_position['duration'] = (
-                    time - entry_time).total_seconds() / 3600
-                current_position['close_type'] = '止盈' if pnl >= TAKE_PROFIT else '止损'
-                current_position['final_capital'] = current_capital
-                position_history.append(current_position)
-
-                position_direction = 0
-            elif (row['signal'] == -position_direction) and (pnl > 0):  # 反向
-                current_capital += (1 + pnl) * position_size
-                current_position['pnl'] = pnl * 100
-                current_position['exit_time'] = time
-                current_position['duration'] = (
-                    time - entry_time).total_seconds() / 3600
-                current_position['close_type'] = '反向'
-                current_position['final_capital'] = current_capital
-                position_history.append(current_position)
-
-                position_direction = 0
-        # 开仓
         elif row['signal'] != 0:
             entry_spot_price = row['spot']
             entry_future_price = row['future']
             entry_time = time
+            entry_fraction = {'spot': cost_spot[i], 'future': cost_future[i]}
+            funding_pnl = 0.0
             position_direction = row['signal']
-            # leverage = math.atan(
-            #     abs(df.loc[time, 'zscore'])/3)/(math.pi/2) * LEVERAGE
             leverage = LEVERAGE
             position_size = current_capital * POSITION_RATIO
             current_position = {
@@ -101,70 +456,53 @@ def run_backtest(df, initial_capital=INITIAL_CAPITAL) -> tuple:
                 'leverage': leverage
             }
             current_capital -= position_size
-    
-    # 交易结束，计算指标
-    position_history = pd.DataFrame(position_history)
-    if ENABLE_DEBUG:
-        position_history.to_csv('debug/position_history.csv')
 
-    if position_history.empty:
-        print("没有交易执行。")
-        metrics = {}
-    else:
-        initial_capital_value = initial_capital
-        final_capital_value = position_history['final_capital'].iloc[-1]
-        total_profit = final_capital_value - initial_capital_value
-        total_trades = len(position_history)
-
-        profitable_trades = position_history[position_history['pnl'] > 0]
-        win_rate = len(profitable_trades) / total_trades * 100
-
-        avg_duration = position_history['duration'].mean(
-        ) if 'duration' in position_history.columns else 0
-
-        start_time = df.index[0]
-        end_time = df.index[-1]
-        time_in_years = (end_time - start_time).total_seconds() / \
-            (365.25 * 24 * 3600)
-        annualized_return = ((final_capital_value / initial_capital_value)
-                             ** (1 / time_in_years) - 1) * 100 if time_in_years > 0 else np.nan
-
-        max_drawdown = (position_history['final_capital'] /
-                         position_history['final_capital'].cummax() - 1).min() * 100
-
-        cumpnl = position_history['pnl'].cumsum()
-        drawdown_series = cumpnl - cumpnl.cummax()
-        if drawdown_series.empty:
-            max_drawdown_recovery_time = 0
-        else:
-            trough_idx = drawdown_series.idxmin()
-            peak_value = cumpnl.cummax().iloc[trough_idx]
-            trough_time = position_history['exit_time'].iloc[trough_idx]
-            recovery_time = None
-            for j in range(trough_idx, len(cumpnl)):
-                if cumpnl.iloc[j] >= peak_value:
-                    recovery_time = (
-                        position_history['exit_time'].iloc[j] - trough_time).total_seconds() / 3600
-                    break
-            max_drawdown_recovery_time = recovery_time if recovery_time is not None else np.nan
-
-        roi = (final_capital_value - initial_capital_value) / \
-            initial_capital_value * 100
-        avg_pnl = position_history['pnl'].mean() * 100
-        pnl_std = position_history['pnl'].std()
-        sharpe_ratio = avg_pnl / pnl_std if pnl_std != 0 else np.nan
-
-        metrics = {
-            "初始资金": f'{INITIAL_CAPITAL}',
-            "最终资金": f'{final_capital_value}',
-            "总收益": f'{total_profit}',
-            "年化收益率": f'{annualized_return} %',
-            "胜率": f'{win_rate} %',
-            "交易次数": f'{total_trades}',
-            "平均持仓时间": f'{avg_duration} h',
-            "最大回撤": f'{max_drawdown} %',
-            "最大回撤修复时间": f'{max_drawdown_recovery_time} h',
-            "夏普比率": sharpe_ratio,
-        }
-
-        return position_history, metrics
+    return pd.DataFrame(position_history)
+
+
+def check_parity(df, initial_capital=INITIAL_CAPITAL):
+    """对比数组内核与原逐行循环的 position_history 与指标是否完全一致（df 中的成本列两边同样计入）"""
+    expected = _run_backtest_reference(df, initial_capital)
+    debug = globals()['ENABLE_DEBUG']
+    globals()['ENABLE_DEBUG'] = False
+    try:
+        actual, metrics, equity = run_backtest(
+            df, initial_capital, leverage=LEVERAGE, take_profit=TAKE_PROFIT, stop_loss=STOP_LOSS,
+            position_ratio=POSITION_RATIO, enable_fee=ENABLE_FEE, enable_slippage=ENABLE_SLIPPAGE,
+            return_equity=True, enable_funding=ENABLE_FUNDING)
+    finally:
+        globals()['ENABLE_DEBUG'] = debug
+    if expected.empty:
+        # 没有交易时原实现返回无列的空表
+        assert actual.empty and not metrics, '原实现没有交易，数组内核却有交易'
+        return True
+    pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+    # 盯市资金在每笔平仓 bar 上应等于平仓后资金；基于交易记录的指标与原实现一致
+    exit_equity = equity['equity'].loc[expected['exit_time']].to_numpy()
+    assert np.array_equal(exit_equity, expected['final_capital'].to_numpy())
+    expected_metrics = _compute_metrics(df.index, expected, initial_capital)
+    for key in ("初始资金", "最终资金", "总收益", "胜率", "交易次数", "平均持仓时间"):
+        assert str(metrics[key]) == str(expected_metrics[key]), key
+    return True
+
+
+if __name__ == '__main__':
+    import time as _time
+
+    # 在合成的均值回归溢价数据上校验一致性并对比耗时
+    from synthetic import generate_market_data
+
+    df = generate_market_data(100_000)
+    premium = (df['spot'] - df['future']) / df['spot']
+    df['signal'] = np.where(premium > 6e-4, -1, np.where(premium < -6e-4, 1, 0))
+
+    start = _time.perf_counter()
+    _run_backtest_reference(df)
+    loop_time = _time.perf_counter() - start
+    ENABLE_DEBUG = False
+    run_backtest(df)  # 预热 JIT
+    start = _time.perf_counter()
+    run_backtest(df)
+    kernel_time = _time.perf_counter() - start
+    check_parity(df)
+    print(f'iterrows: {loop_time:.3f}s, kernel: {kernel_time:.4f}s, 一致性校验通过')
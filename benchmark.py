@@ -0,0 +1,200 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import synthetic
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+RESULTS_DIR = 'benchmarks'
+# 部分阶段在超大数据量下没有测量意义（或内存开销过大），超过上限时跳过
+STAGE_MAX_BARS = {'process_data': 1_000_000, 'plot': 1_000_000}
+
+
+def _disable_debug():
+    """关闭各模块的调试落盘，避免 CSV/PNG 写入混入计时"""
+    import backtest
+    import datafetcher
+    import strategy
+    import visualizer
+    for module in (backtest, datafetcher, strategy, visualizer):
+        module.ENABLE_DEBUG = False
+
+
+def _best_of(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_stages(n_bars, repeat=3, stages=None, seed=0) -> dict:
+    """在 n_bars 根合成 K 线上逐阶段计时，返回 {stage: 秒}"""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    import backtest
+    import signalcache
+    from alignment import align_legs
+    from datafetcher import DataFetcher
+    from datastore import MarketDataStore
+    from strategy import MeanReversionStrategy, _leg
+    from visualizer import Visualizer
+
+    _disable_debug()
+    spot, future = synthetic.generate_pair(n_bars, seed=seed)
+    timings = {}
+
+    def enabled(stage):
+        return (stages is None or stage in stages) and n_bars <= STAGE_MAX_BARS.get(stage, n_bars)
+
+    if enabled('process_data'):
+        ohlcv = synthetic.to_ohlcv_list(spot)
+        fetcher = DataFetcher()
+        timings['process_data'], _ = _best_of(lambda: fetcher._process_data(ohlcv), repeat)
+        del ohlcv
+
+    if enabled('cache_load'):
+        with tempfile.TemporaryDirectory() as root:
+            store = MarketDataStore(root)
+            key = ('synthetic', 'spot', 'BTC/USDT', '5m')
+            timestamp = spot.index.values.astype('datetime64[ms]').astype(np.int64)
+            store.write(key, np.column_stack([timestamp, spot.to_numpy()]))
+
+            def load():
+                df = store.load_frame(key)
+                df['close'].sum()  # 触发实际读取
+                return df
+            timings['cache_load'], _ = _best_of(load, repeat)
+
+    # 与 strategy.load_data 相同的对齐路径
+    legs = {'spot': _leg(spot, 'spot'), 'future': _leg(future, 'future')}
+    align = lambda: align_legs(legs, policy='inner')[0]
+    if enabled('align'):
+        timings['align'], _ = _best_of(align, repeat)
+    market_data = align()
+
+    engine = MeanReversionStrategy()
+    engine.config()
+
+    def signals(cold=True):
+        # 每次重复前清空信号缓存，否则第一次之后都是缓存命中，测到的只是查表耗时
+        if cold:
+            signalcache.CACHE.clear()
+        engine.market_data = market_data.copy()
+        return engine.generate_signals()
+    if enabled('generate_signals'):
+        timings['generate_signals'], _ = _best_of(signals, repeat)
+    signals()
+    if enabled('generate_signals_cached'):
+        # 缓存已由上一次调用填充，单独报告命中缓存时的耗时
+        timings['generate_signals_cached'], _ = _best_of(lambda: signals(cold=False), repeat)
+
+    backtest.run_backtest(engine.market_data.iloc[:1000])  # 预热 JIT，不计入耗时
+    run = lambda: backtest.run_backtest(engine.market_data)
+    if enabled('run_backtest'):
+        timings['run_backtest'], _ = _best_of(run, repeat)
+    position_history, _, equity = backtest.run_backtest(engine.market_data, return_equity=True)
+
+    if enabled('metrics') and not position_history.empty:
+        timings['metrics'], _ = _best_of(lambda: backtest._compute_metrics(
+            engine.market_data.index, position_history, backtest.INITIAL_CAPITAL,
+            equity=equity['equity'].to_numpy(), position=equity['position'].to_numpy()), repeat)
+
+    if enabled('plot') and not position_history.empty:
+        visualizer = Visualizer()
+        visualizer.link_strategy(engine)
+
+        def plot():
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                visualizer.plot(engine.market_data, position_history)
+            plt.close('all')
+        timings['plot'], _ = _best_of(plot, repeat)
+
+    return timings
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_suite(sizes=DEFAULT_SIZES, repeat=3, stages=None, seed=0) -> dict:
+    """对每个数据量运行全部阶段，返回可直接存为 JSON 的结果"""
+    results = {}
+    for n_bars in sizes:
+        logging.info(f"基准测试: {n_bars} 根 K 线")
+        for stage, seconds in run_stages(n_bars, repeat, stages, seed).items():
+            results.setdefault(stage, {})[str(n_bars)] = seconds
+    return {
+        'commit': _git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+
+def save_report(report: dict, path=None) -> str:
+    path = path or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def compare(report: dict, baseline: dict, threshold=0.2) -> list:
+    """与基线比较，返回耗时增加超过 threshold（相对值）的 (stage, n_bars, 基线秒, 当前秒) 列表"""
+    regressions = []
+    for stage, by_size in report['results'].items():
+        for n_bars, seconds in by_size.items():
+            base = baseline.get('results', {}).get(stage, {}).get(n_bars)
+            if base and seconds > base * (1 + threshold):
+                regressions.append((stage, int(n_bars), base, seconds))
+    return regressions
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='各阶段性能基准测试（合成数据，无需网络）')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stages', nargs='+', default=None)
+    parser.add_argument('--output', default=None, help='结果 JSON 路径，默认 benchmarks/<commit>.json')
+    parser.add_argument('--baseline', default=None, help='用于比较的基线 JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定为性能回退的相对增幅')
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.repeat, args.stages)
+    print(f'结果已保存: {save_report(report, args.output)}')
+    for stage, by_size in report['results'].items():
+        print(stage, {k: f'{v:.4f}s' for k, v in by_size.items()})
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for stage, n_bars, base, seconds in regressions:
+            print(f'性能回退: {stage} @ {n_bars}: {base:.4f}s -> {seconds:.4f}s')
+        if regressions:
+            raise SystemExit(1)
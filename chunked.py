@@ -0,0 +1,141 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from backtest import _get_kernel, _initial_state, _build_position_history, _compute_metrics, _cost_columns, \
+    _setting, cost_arrays, INITIAL_CAPITAL
+from strategy import compute_premium_pct, rolling_zscore, compute_volatility, compute_raw_signal, \
+    filter_low_volatility, VOLATILITY_WINDOW
+from metrics import StreamingStats
+from instrumentation import stage
+from artifacts import submit
+
+ENABLE_DEBUG = True
+BLOCK_BARS = 500_000     # 每块的 bar 数，峰值内存只与它有关
+
+
+class StreamingSignals:
+    """
+    分块计算信号，逻辑与 generate_signals 相同。
+
+    保留上一块末尾 max(2*zscore_window, VOLATILITY_WINDOW) 个溢价率作为下一块滚动窗口的前缀；
+    pandas 滚动统计量按增删累积，分块后与整体计算只差浮点舍入误差（约 1e-12），
+    信号只在 zscore 与阈值相差不到该误差时才可能不同。
+    """
+
+    def __init__(self, zscore_window=120, zscore_threshold=2.1, min_volatility=0.05,
+                 volatility_window=VOLATILITY_WINDOW):
+        self.zscore_window = zscore_window
+        self.zscore_threshold = zscore_threshold
+        self.min_volatility = min_volatility
+        self.volatility_window = volatility_window
+        self.tail = np.empty(0, dtype=np.float64)
+        self.tail_size = max(2 * zscore_window, volatility_window)
+
+    def update(self, spot: np.ndarray, future: np.ndarray) -> np.ndarray:
+        """输入一块 spot/future，返回该块的 int8 信号"""
+        premium_pct = np.concatenate([self.tail, compute_premium_pct(spot, future)])
+        series = pd.Series(premium_pct)
+        _, _, zscore = rolling_zscore(series, self.zscore_window)
+        raw_signal = compute_raw_signal(zscore, self.zscore_threshold)
+        signal = filter_low_volatility(raw_signal, compute_volatility(series, self.volatility_window),
+                                       self.min_volatility)
+        self.tail = premium_pct[-self.tail_size:].copy()
+        return signal[len(premium_pct) - len(spot):].astype(np.int8)
+
+
+def run_backtest_chunked(blocks, zscore_window=120, zscore_threshold=2.1, min_volatility=0.05,
+                         initial_capital=INITIAL_CAPITAL, leverage=None, take_profit=None, stop_loss=None,
+                         position_ratio=None, enable_fee=None, enable_slippage=None, enable_funding=None,
+                         raw_metrics=False) -> tuple:
+    """
+    分块回测：逐块计算信号并运行回测内核，返回与 generate_signals + run_backtest 相同的 (position_history, metrics)。
+
+    参数:
+        blocks: 按时间顺序产出含 spot/future 列、以时间为索引的 DataFrame 的可迭代对象
+                （如 MeanReversionStrategy.iter_market_data），可选 spot_volume/future_volume/funding_rate 列
+
+    滚动窗口前缀（StreamingSignals）与资金、持仓状态（回测内核的 state）跨块延续，
+    风险指标由 metrics.StreamingStats 逐块累积；除交易记录外不保留任何与总 bar 数成正比的数据。
+    回测参数为 None 时在调用时读取 backtest 模块的同名设置。
+    """
+    leverage = _setting(leverage, 'LEVERAGE')
+    take_profit = _setting(take_profit, 'TAKE_PROFIT')
+    stop_loss = _setting(stop_loss, 'STOP_LOSS')
+    position_ratio = _setting(position_ratio, 'POSITION_RATIO')
+    signals = StreamingSignals(zscore_window, zscore_threshold, min_volatility)
+    stats = StreamingStats()
+    kernel = _get_kernel()
+    state = _initial_state(initial_capital)
+    entry_time = None
+    histories = []
+
+    with stage('backtest_chunked') as chunked_stage:
+        for block in blocks:
+            if block.empty:
+                continue
+            spot = np.ascontiguousarray(block['spot'].to_numpy(dtype=np.float64))
+            future = np.ascontiguousarray(block['future'].to_numpy(dtype=np.float64))
+            signal = signals.update(spot, future)
+            costs = cost_arrays(len(block), enable_fee, enable_slippage, enable_funding, spot=spot, future=future,
+                                order_notional=initial_capital * position_ratio * 0.5, leverage=leverage,
+                                **_cost_columns(block))
+            trades = kernel(spot, future, signal, *costs, float(take_profit), float(stop_loss), float(leverage),
+                            float(position_ratio), state)
+            histories.append(_build_position_history(block.index, trades, leverage, entry_time))
+            stats.update(block.index, trades[7], trades[8])
+            if state[4] != 0:
+                # 未平仓头寸带入下一块；入场在本块内时记录入场时间
+                entry = int(state[5]) + len(block)
+                if entry >= 0:
+                    entry_time = block.index[entry]
+            chunked_stage.rows = stats.count
+            logging.debug(f"分块回测: 已处理 {stats.count} 根 bar，{sum(len(h) for h in histories)} 笔交易")
+
+    if not histories:
+        raise ValueError("没有可回测的行情数据")
+    position_history = pd.concat([h for h in histories if len(h)] or histories[:1], ignore_index=True)
+    if position_history.empty:
+        metrics = {}
+        print("没有交易执行。")
+    else:
+        metrics = _compute_metrics(None, position_history, initial_capital, raw=raw_metrics,
+                                   position_ratio=position_ratio, stats=stats)
+    if ENABLE_DEBUG:
+        submit('positions', 'position_history', position_history)
+    return position_history, metrics
+
+
+def run_strategy_chunked(strategy, block_bars=BLOCK_BARS, **backtest_params) -> tuple:
+    """用已 config 的 MeanReversionStrategy 的数据与信号参数做分块回测，无需 load_data"""
+    return run_backtest_chunked(strategy.iter_market_data(block_bars), zscore_window=strategy.zscore_window,
+                                zscore_threshold=strategy.zscore_threshold,
+                                min_volatility=strategy.min_volatility, **backtest_params)
+
+
+def iter_frame_blocks(df: pd.DataFrame, block_bars=BLOCK_BARS):
+    """把内存中的 DataFrame 按 block_bars 切块，用于与一次性回测对照"""
+    for lo in range(0, len(df), block_bars):
+        yield df.iloc[lo:lo + block_bars]
+
+
+def check_parity(df: pd.DataFrame, block_bars=BLOCK_BARS, zscore_window=120, zscore_threshold=2.1,
+                 min_volatility=0.05, **backtest_params) -> dict:
+    """对比分块回测与 generate_signals + run_backtest 的交易记录与指标，返回各指标的相对误差"""
+    from backtest import backtest_arrays
+    from strategy import signals_from_prices
+
+    spot, future = df['spot'].to_numpy(), df['future'].to_numpy()
+    signal = signals_from_prices(spot, future, zscore_window, zscore_threshold, min_volatility)
+    expected, expected_metrics = backtest_arrays(df.index, spot, future, signal, raw_metrics=True,
+                                                 **_cost_columns(df), **backtest_params)
+    actual, metrics = run_backtest_chunked(iter_frame_blocks(df, block_bars), zscore_window, zscore_threshold,
+                                           min_volatility, raw_metrics=True, **backtest_params)
+    pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+    errors = {}
+    for key, value in metrics.items():
+        reference = expected_metrics[key]
+        same = value == reference or (value != value and reference != reference)
+        errors[key] = 0.0 if same else abs(value - reference) / abs(reference)
+    return errors
@@ -0,0 +1,285 @@
+import argparse
+import importlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# 命令行入口：python cli.py <子命令>。各子命令只导入自身用到的模块，ccxt、matplotlib、numba 等按需加载；
+# --import-only 与 startup 据此测量冷启动时间
+IMPORTS = {
+    'fetch': ('datafetcher',),
+    'signals': ('strategy',),
+    'backtest': ('strategy', 'backtest'),
+    'sweep': ('strategy', 'sweep'),
+    'search': ('strategy', 'search'),
+    'plot': ('strategy', 'backtest', 'visualizer'),
+    'run': ('strategy', 'backtest', 'visualizer', 'instrumentation'),
+}
+# startup 报告中关注的重量级依赖
+HEAVY_MODULES = ('pandas', 'numba', 'ccxt', 'tqdm', 'matplotlib', 'matplotlib.pyplot')
+
+
+def _engine(args):
+    from strategy import MeanReversionStrategy
+
+    engine = MeanReversionStrategy()
+    engine.config(symbol=args.symbol, timeframe=args.timeframe, range=args.range, start_time=args.start,
+                  zscore_window=args.zscore_window, zscore_threshold=args.zscore_threshold,
+                  min_volatility=args.min_volatility)
+    return engine
+
+
+def _backtest_kwargs(args) -> dict:
+    return {k: v for k, v in (('take_profit', args.take_profit), ('stop_loss', args.stop_loss),
+                              ('leverage', args.leverage), ('enable_fee', args.fee),
+                              ('enable_slippage', args.slippage), ('enable_funding', args.funding)) if v is not None}
+
+
+def _print_metrics(metrics):
+    for key, value in (metrics or {}).items():
+        print(f'{key}: {value}')
+
+
+def cmd_fetch(args):
+    from datafetcher import DataFetcher
+
+    request = dict(symbol=args.symbol, start_time=args.start, range=args.range, timeframe=args.timeframe)
+    frames = DataFetcher().fetch_many([dict(request, contract_type='spot'), dict(request, contract_type='future')])
+    for name, df in zip(('spot', 'future'), frames):
+        span = f'{df.index[0]} - {df.index[-1]}' if len(df) else '-'
+        print(f'{name}: {len(df)} 根 K 线, {span}')
+
+
+def cmd_signals(args):
+    engine = _engine(args)
+    engine.load_data()
+    engine.generate_signals()
+    signal = engine.market_data['signal']
+    print(f'K 线: {len(signal)}, 做多信号: {int((signal == 1).sum())}, 做空信号: {int((signal == -1).sum())}')
+    if args.output:
+        frame = engine.market_data[['spot', 'future', 'signal']]
+        if args.output.endswith('.pkl'):
+            frame.to_pickle(args.output)
+        else:
+            frame.to_csv(args.output)
+        print(f'信号已保存: {args.output}')
+
+
+def cmd_backtest(args):
+    from backtest import run_backtest
+
+    engine = _engine(args)
+    if getattr(args, 'chunk_bars', None):
+        # 分块回测：逐块读取缓存，不构建完整的 market_data
+        from chunked import run_strategy_chunked
+
+        position_history, metrics = run_strategy_chunked(engine, args.chunk_bars, **_backtest_kwargs(args))
+        _print_metrics(metrics)
+        return engine, position_history
+    engine.load_data()
+    engine.generate_signals()
+    position_history, metrics = run_backtest(engine.market_data, **_backtest_kwargs(args))
+    _print_metrics(metrics)
+    return engine, position_history
+
+
+def cmd_sweep(args):
+    from sweep import run_sweep, param_grid
+
+    engine = _engine(args)
+    engine.load_data()
+    results = run_sweep(engine.market_data, param_grid(json.loads(args.grid)), n_jobs=args.n_jobs)
+    results = results.sort_values(args.sort_by, ascending=False)
+    print(results.head(args.top).to_string())
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f'扫描结果已保存: {args.output}')
+
+
+def cmd_search(args):
+    from search import successive_halving, hyperband, compare_with_grid, format_report
+    from sweep import param_grid
+
+    engine = _engine(args)
+    engine.load_data()
+    options = dict(objective=args.objective, eta=args.eta, min_bars=args.min_bars, n_jobs=args.n_jobs)
+    if args.method == 'hyperband':
+        # hyperband 的参数空间中 [low, high] 两元素列表表示连续区间
+        space = {k: tuple(v) if isinstance(v, list) and len(v) == 2 and not isinstance(v[0], str) else v
+                 for k, v in json.loads(args.space).items()}
+        history, report = hyperband(engine.market_data, space, seed=args.seed, **options)
+    else:
+        history, report = successive_halving(engine.market_data, param_grid(json.loads(args.space)), **options)
+    print(format_report(report))
+    if args.verify:
+        for key, value in compare_with_grid(engine.market_data, history, report, objective=args.objective,
+                                            n_jobs=args.n_jobs).items():
+            print(f'{key}: {value}')
+    if args.output:
+        history.to_csv(args.output, index=False)
+        print(f'搜索记录已保存: {args.output}')
+
+
+def cmd_plot(args):
+    if args.output:
+        # 保存图片时使用无界面后端，不加载 GUI
+        import matplotlib
+        matplotlib.use('Agg')
+    from visualizer import Visualizer
+
+    engine, position_history = cmd_backtest(args)
+    visualizer = Visualizer()
+    visualizer.link_strategy(engine)
+    fig = visualizer.plot(engine.market_data, position_history, layout=args.layout, show=not args.output)
+    if args.output:
+        fig.savefig(args.output)
+        print(f'图表已保存: {args.output}')
+
+
+def cmd_run(args):
+    """完整流程：数据 → 信号 → 回测 → 绘图（原 run.py）"""
+    import instrumentation
+
+    if args.profile or args.deep_profile:
+        instrumentation.configure(enabled=True, profile=args.deep_profile, trace_memory=args.deep_profile,
+                                  profile_dir='debug/profile')
+    cmd_plot(args)
+    if args.profile or args.deep_profile:
+        print(instrumentation.INSTRUMENT.summary())
+        report_path = instrumentation.INSTRUMENT.save_report(
+            f"debug/run_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        logging.info(f"运行报告已保存: {report_path}")
+
+
+def cold_start(commands=None, repeat=3) -> dict:
+    """
+    在新的解释器中测量各子命令的冷启动时间（解释器启动 + 导入该子命令依赖的模块），取 repeat 次最小值。
+    同时记录每个子命令实际加载了哪些重量级依赖。
+    """
+    script = os.path.abspath(__file__)
+    results = {}
+    for command in ['python', *(commands or IMPORTS)]:
+        argv = [sys.executable, '-c', 'pass'] if command == 'python' else \
+            [sys.executable, script, '--import-only', command]
+        best, loaded = float('inf'), []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = subprocess.run(argv, check=True, capture_output=True, text=True).stdout
+            best = min(best, time.perf_counter() - start)
+            loaded = output.split()
+        results[command] = {'seconds': best, 'modules': loaded}
+    return results
+
+
+def cmd_startup(args):
+    unknown = set(args.commands) - set(IMPORTS)
+    if unknown:
+        raise SystemExit(f"未知的子命令: {sorted(unknown)}")
+    for command, result in cold_start(args.commands or None, args.repeat).items():
+        print(f"{command:<10} {result['seconds'] * 1000:8.1f} ms  {' '.join(result['modules'])}")
+
+
+def _add_strategy_args(parser):
+    parser.add_argument('--symbol', default='BTC/USDT')
+    parser.add_argument('--timeframe', default='5m')
+    parser.add_argument('--range', default='1y')
+    parser.add_argument('--start', default='2024-01-01 00:00:00', help='起始时间，格式 YYYY-MM-DD HH:MM:SS')
+    parser.add_argument('--zscore-window', type=int, default=120)
+    parser.add_argument('--zscore-threshold', type=float, default=2.1)
+    parser.add_argument('--min-volatility', type=float, default=0.05)
+
+
+def _add_backtest_args(parser):
+    parser.add_argument('--take-profit', type=float)
+    parser.add_argument('--stop-loss', type=float)
+    parser.add_argument('--leverage', type=float)
+    # 未指定时沿用 backtest 模块的 ENABLE_FEE / ENABLE_SLIPPAGE / ENABLE_FUNDING
+    parser.add_argument('--fee', action='store_true', default=None, help='计入手续费')
+    parser.add_argument('--slippage', action='store_true', default=None, help='计入按成交量估计的滑点')
+    parser.add_argument('--funding', action='store_true', default=None, help='计入永续合约资金费率')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='期现价差均值回归策略')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--log-level', default='DEBUG')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sub = commands.add_parser('fetch', parents=[common], help='下载/更新现货与合约 K 线缓存')
+    _add_strategy_args(sub)
+    sub.set_defaults(func=cmd_fetch)
+
+    sub = commands.add_parser('signals', parents=[common], help='生成交易信号')
+    _add_strategy_args(sub)
+    sub.add_argument('--output', help='保存 spot/future/signal，.pkl 为 pickle，其余为 CSV')
+    sub.set_defaults(func=cmd_signals)
+
+    sub = commands.add_parser('backtest', parents=[common], help='回测并输出指标')
+    _add_strategy_args(sub)
+    _add_backtest_args(sub)
+    sub.add_argument('--chunk-bars', type=int, help='分块回测的每块 bar 数，内存占用只与块大小有关')
+    sub.set_defaults(func=cmd_backtest)
+
+    sub = commands.add_parser('sweep', parents=[common], help='参数扫描')
+    _add_strategy_args(sub)
+    sub.add_argument('--grid', required=True, help='参数空间 JSON，如 \'{"zscore_window": [60, 120]}\'')
+    sub.add_argument('--n-jobs', type=int)
+    sub.add_argument('--top', type=int, default=20)
+    sub.add_argument('--sort-by', default='最终资金')
+    sub.add_argument('--output', help='保存完整结果的 CSV 路径')
+    sub.set_defaults(func=cmd_sweep)
+
+    sub = commands.add_parser('search', parents=[common], help='逐轮淘汰 / Hyperband 参数搜索')
+    _add_strategy_args(sub)
+    sub.add_argument('--space', required=True,
+                     help='参数空间 JSON；halving 为网格，hyperband 中 [low, high] 表示均匀抽样区间')
+    sub.add_argument('--method', default='halving', choices=('halving', 'hyperband'))
+    sub.add_argument('--objective', default='最终资金')
+    sub.add_argument('--eta', type=int, default=3)
+    sub.add_argument('--min-bars', type=int, default=5000)
+    sub.add_argument('--seed', type=int)
+    sub.add_argument('--n-jobs', type=int)
+    sub.add_argument('--verify', action='store_true', help='再对全部候选做完整网格扫描，对比最优结果与计算量')
+    sub.add_argument('--output', help='保存每轮评估记录的 CSV 路径')
+    sub.set_defaults(func=cmd_search)
+
+    for name, func, help_text in (('plot', cmd_plot, '回测并绘图'), ('run', cmd_run, '完整流程（原 run.py）')):
+        sub = commands.add_parser(name, parents=[common], help=help_text)
+        _add_strategy_args(sub)
+        _add_backtest_args(sub)
+        sub.add_argument('--layout', default='stacked', choices=('stacked', 'twin'))
+        sub.add_argument('--output', help='保存图片的路径，不弹出窗口')
+        if name == 'run':
+            sub.add_argument('--profile', action='store_true', help='阶段插桩并保存 JSON 运行报告')
+            sub.add_argument('--deep-profile', action='store_true', help='额外采集 cProfile 与 tracemalloc')
+        sub.set_defaults(func=func)
+
+    sub = commands.add_parser('startup', parents=[common], help='测量各子命令的冷启动时间')
+    sub.add_argument('commands', nargs='*', help=f"默认全部: {' '.join(IMPORTS)}")
+    sub.add_argument('--repeat', type=int, default=3)
+    sub.set_defaults(func=cmd_startup)
+    return parser
+
+
+def main(argv=None):
+    # --import-only 仅供 cold_start 使用：导入子命令依赖后输出已加载的重量级模块并退出
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ['--import-only']:
+        for module in IMPORTS[argv[1]]:
+            importlib.import_module(module)
+        print(' '.join(m for m in HEAVY_MODULES if m in sys.modules))
+        return 0
+
+    args = build_parser().parse_args(argv)
+    from logger import Logger
+    Logger(level=getattr(logging, args.log_level.upper()))
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,18 @@
+import os
 import ccxt
 import pandas as pd
 import pickle
-import time
 import logging
 from tqdm import tqdm
 from datetime import datetime, timezone
+from datastore import MarketDataStore, FUNDING, timeframe_to_ms
+from downloader import DownloadScheduler
+from instrumentation import stage
+from artifacts import submit
 
 ENABLE_DEBUG = True
+# 只下载、缓存最细粒度的 K 线，其余周期由它聚合得到
+BASE_TIMEFRAME = '1m'
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,93 +24,176 @@ class DataFetcher:
         self.default_exchange_name = exchange_name
         self.proxy_url = 'http://127.0.0.1:7890'
         self.timezone = 'Asia/Shanghai'
+        self.store = MarketDataStore()
+        self.scheduler = DownloadScheduler(self)
 
     def fetch_data(self, symbol='BTC/USDT',start_time = "2024-01-01 00:00:00", range = '30d', timeframe='5m', contract_type='spot', data_source='binance'):
         """获取指定数据来源的现货或合约数据"""
+        return self.fetch_many([dict(symbol=symbol, start_time=start_time, range=range, timeframe=timeframe,
+                                     contract_type=contract_type, data_source=data_source)])[0]
+
+    def fetch_many(self, requests):
+        """并发获取多个市场的数据，requests 为 fetch_data 参数字典列表，按顺序返回 DataFrame"""
+        with stage('fetch') as fetch_stage:
+            plans = [self._plan_request(**request) for request in requests]
+            self._download(plans)
+
+            results = []
+            for plan in plans:
+                store_key, start_time_ms, end_time = plan['store_key'], plan['start_ms'], plan['end_ms']
+                df = self._load(plan, start_time_ms, end_time)
+                if not plan['missing']:
+                    logging.info("加载缓存数据成功")
+                else:
+                    for gap_start, gap_end in self.store.missing(store_key, start_time_ms, end_time):
+                        logging.warning(f"{store_key} 区间 {datetime.fromtimestamp(gap_start / 1000, tz=timezone.utc)} - "
+                                        f"{datetime.fromtimestamp(gap_end / 1000, tz=timezone.utc)} 下载未完成，下次请求时续传")
+                    # CSV 副本的文件名中包含数据来源信息，由后台线程写出
+                    if submit('cache', os.path.abspath(os.path.splitext(plan['cache_csv'])[0]), df,
+                              formats=('csv',)):
+                        logging.info(f"数据已提交保存，保存文件: {plan['cache_csv']}")
+                results.append(df)
+            fetch_stage.rows = sum(len(df) for df in results)
+        return results
+
+    def iter_blocks(self, requests, block_bars):
+        """
+        先补齐缓存，再按时间分块依次读取多个市场的数据，每次产出与 requests 顺序一致的 DataFrame 列表。
+
+        每块覆盖最粗周期下 block_bars 根 K 线的时间跨度，块边界按各自周期对齐，
+        各块首尾相接与 fetch_many 一次读取的结果相同；内存占用只与块大小有关。
+        """
+        plans = [self._plan_request(**request) for request in requests]
+        with stage('fetch'):
+            self._download(plans)
+        timeframes_ms = [self._timeframe_to_ms(plan['timeframe']) for plan in plans]
+        start = min(plan['start_ms'] for plan in plans)
+        end = max(plan['end_ms'] for plan in plans)
+        step = block_bars * max(timeframes_ms)
+        for lo in range(start, end, step):
+            frames = []
+            for plan, timeframe_ms in zip(plans, timeframes_ms):
+                block_start = max(plan['start_ms'], -(-lo // timeframe_ms) * timeframe_ms)
+                block_end = min(plan['end_ms'], -(-(lo + step) // timeframe_ms) * timeframe_ms)
+                frames.append(self._load(plan, block_start, max(block_start, block_end)))
+            yield frames
+
+    def fetch_funding(self, symbol='BTC/USDT', start_time="2024-01-01 00:00:00", range='30d',
+                      data_source='binance') -> pd.Series:
+        """
+        获取永续合约的资金费率历史（以结算时间为索引的 Series），与 K 线缓存放在同一市场目录下，只下载缺失区间。
+        """
+        start_ms = int(datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S").timestamp()) * 1000
+        end_ms = start_ms + self._parse_range(range)
+        key = self.store.funding_key(data_source, symbol)
+        missing = self.store.missing(key, start_ms, end_ms)
+        if missing:
+            logging.info(f"资金费率缓存缺少 {len(missing)} 个区间，开始从交易所获取...")
+            with stage('fetch'):
+                self._download([{'store_key': key, 'missing': missing}])
+        with stage('cache_io') as io_stage:
+            funding = self.store.read_funding(key, start_ms, end_ms)
+            io_stage.rows = len(funding)
+        return funding
+
+    def _download(self, plans):
+        """只下载覆盖索引中缺失的子区间，所有市场的窗口一起交给调度器"""
+        pending = []
+        for plan in plans:
+            # 同一基础数据可能被多个周期的请求共用，相同的缺失区间只下载一次
+            if plan['missing'] and (plan['store_key'], plan['missing']) not in pending:
+                pending.append((plan['store_key'], plan['missing']))
+        if not pending:
+            return
+        total = sum(end - start for _, gaps in pending for start, end in gaps)
+        logging.info(f"缓存缺少 {sum(len(gaps) for _, gaps in pending)} 个区间，开始从交易所获取数据...")
+        progress_bar = tqdm(total=total, desc="下载进度", unit="ms")
+
+        def on_window(store_key, since, until, ohlcv, covered_until):
+            # 先写数据再记录覆盖区间，窗口失败或被截断时只记录实际完成的部分，下次请求自动续传
+            try:
+                with stage('cache_io', rows=len(ohlcv)):
+                    if store_key[3] == FUNDING:
+                        self.store.write_funding(store_key, ohlcv)
+                    else:
+                        self.store.write(store_key, ohlcv)
+                    self.store.add_coverage(store_key, since, covered_until)
+            except Exception as e:
+                logging.error(f"缓存数据保存失败: {e}")
+            progress_bar.update(until - since)
+
+        with stage('download'):
+            self.scheduler.download(pending, on_window=on_window)
+        progress_bar.close()
+
+    def _load(self, plan, start_ms, end_ms):
+        """从列式存储读取 [start_ms, end_ms) 内的数据，非基础周期由基础周期聚合"""
+        with stage('cache_io') as io_stage:
+            if plan['derived']:
+                df = self.store.load_resampled(plan['store_key'], plan['timeframe'],
+                                               self._timeframe_to_ms(plan['timeframe']), start_ms, end_ms)
+            else:
+                df = self.store.load_frame(plan['store_key'], start_ms, end_ms)
+            io_stage.rows = len(df)
+        return df
+
+    def _plan_request(self, symbol='BTC/USDT', start_time="2024-01-01 00:00:00", range='30d', timeframe='5m',
+                      contract_type='spot', data_source='binance'):
+        """解析请求的时间范围，导入旧缓存，并计算缺失的子区间"""
         # 根据CONFIG计算时间范围
         start_time_ms = int(datetime.strptime(start_time,
                                    # 起始时间戳
                                    "%Y-%m-%d %H:%M:%S").timestamp())*1000
         range_ms = self._parse_range(range)
-        end_time = start_time_ms + range_ms
+        # 按周期边界对齐：与交易所按 since 返回的第一根 K 线一致，也便于由基础周期聚合
+        timeframe_ms = self._timeframe_to_ms(timeframe)
+        end_time = -(-(start_time_ms + range_ms) // timeframe_ms) * timeframe_ms
+        start_time_ms = -(-start_time_ms // timeframe_ms) * timeframe_ms
         file_year = datetime.fromtimestamp(
             start_time_ms/1000, tz=timezone.utc).strftime('%Y-%m-%d-%H:%M:%S')
         file_base = f'{data_source}_{contract_type}_{symbol.replace("/", "")}_{timeframe}_{file_year}_{range}'
         cache_pkl = f'database/{file_base}.pkl'
         cache_csv = f'database/{file_base}.csv'
 
-        # 尝试加载缓存数据
-        try:
+        store_key = (data_source, contract_type, symbol, timeframe)
+
+        # 兼容旧的 pickle 缓存：首次使用时导入列式存储
+        if os.path.exists(cache_pkl) and not self.store.coverage(store_key):
             with open(cache_pkl, 'rb') as f:
                 all_ohlcv = pickle.load(f)
-            df = self._process_data(all_ohlcv)
-            logging.info("加载缓存数据成功")
-            return df
-        except FileNotFoundError:
-            logging.info("未找到缓存数据，开始从交易所获取数据...")
+            self.store.write(store_key, all_ohlcv)
+            if all_ohlcv:
+                self.store.add_coverage(store_key, start_time_ms, min(
+                    end_time, all_ohlcv[-1][0] + timeframe_ms))
+            logging.info("旧缓存已导入列式存储")
+
+        # 已直接下载过该周期（含旧缓存）则直接读取，否则下载基础周期再聚合，切换周期无需额外请求
+        derived = timeframe != BASE_TIMEFRAME and not self.store.has_range(store_key, start_time_ms, end_time)
+        if derived:
+            store_key = (data_source, contract_type, symbol, BASE_TIMEFRAME)
+
+        return {
+            'store_key': store_key,
+            'timeframe': timeframe,
+            'derived': derived,
+            'start_ms': start_time_ms,
+            'end_ms': end_time,
+            'cache_csv': cache_csv,
+            'missing': self.store.missing(store_key, start_time_ms, end_time),
+        }
 
-        # 根据 data_source 创建交易所实例
+    def _create_exchange(self, data_source, contract_type):
+        """根据 data_source 创建交易所实例，并设置市场类型"""
         exchange = getattr(ccxt, data_source)({
             'enableRateLimit': True,
             'options': {'adjustForTimeDifference': True},
             'proxies': {'http': self.proxy_url, 'https': self.proxy_url},
             'timeout': 30000
         })
-
-        # 设置市场类型
         exchange.options['defaultType'] = contract_type
         if contract_type == 'future':
             exchange.options['defaultSettle'] = 'usdt'
-
-        all_ohlcv = []
-        since = start_time_ms
-        total_range = end_time - start_time_ms
-        progress_bar = tqdm(total=total_range, desc="下载进度", unit="ms")
-        while since < end_time:
-            batch_limit = 1000
-            try:
-                batch = exchange.fetch_ohlcv(
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    since=since,
-                    limit=batch_limit
-                )
-                if not batch:
-                    logging.info("无更多数据可获取，退出循环")
-                    break
-                all_ohlcv.extend(batch)
-                new_since = batch[-1][0] + \
-                    self._timeframe_to_ms(timeframe)
-                if new_since <= since:
-                    logging.warning("时间戳未更新，退出循环以避免无限循环")
-                    break
-                update_amount = min(new_since, end_time) - since
-                progress_bar.update(update_amount)
-                since = new_since
-                time.sleep(exchange.rateLimit / 1000)
-            except ccxt.RequestTimeout as e:
-                logging.error(f"请求超时: {e}")
-                time.sleep(30)
-                continue
-            except ccxt.ExchangeError as e:
-                logging.error(f"交易所错误: {e}")
-                break
-            except Exception as e:
-                logging.exception("未知错误:")
-                break
-        progress_bar.close()
-
-        # 保存下载数据到缓存，并在文件名中包含数据来源信息
-        try:
-            with open(cache_pkl, 'wb') as f:
-                pickle.dump(all_ohlcv, f)
-            df = self._process_data(all_ohlcv)
-            with open(cache_csv, 'w') as f:
-                f.write(df.to_csv())
-            logging.info(f"数据保存成功，保存文件: {cache_csv}")
-        except Exception as e:
-            logging.error(f"缓存数据保存失败: {e}")
-        return df
+        return exchange
 
     def _process_data(self, data):
         df = pd.DataFrame(
@@ -114,11 +203,8 @@ class DataFetcher:
         return df
 
     def _timeframe_to_ms(self, timeframe):
-        """将 timeframe 字符串转换为毫秒值，仅支持 '5m'，可扩展支持更多"""
-        if timeframe == '5m':
-            return 5 * 60 * 1000
-        else:
-            raise ValueError(f"不支持的时间周期: {timeframe}")
+        """将 timeframe 字符串转换为毫秒值（datastore.timeframe_to_ms）"""
+        return timeframe_to_ms(timeframe)
 
     def _parse_range(self, range_str):
         """将 range 字符串转换为毫秒值，支持格式 '1d'、'1M'、'1y'"""
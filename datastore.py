@@ -0,0 +1,355 @@
+import os
+import glob
+import mmap
+import json
+import pickle
+import time
+import logging
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+DAY_MS = 24 * 60 * 60 * 1000
+# 资金费率历史与合约 K 线存放在同一市场目录下，存储键的周期位置为 FUNDING
+FUNDING = 'funding'
+FUNDING_INTERVAL_MS = 8 * 60 * 60 * 1000    # 资金费率结算间隔（Binance 永续合约为 8 小时）
+
+
+def timeframe_to_ms(timeframe) -> int:
+    """将 timeframe 字符串转换为毫秒值，支持 '1m'、'15m'、'1h'、'4h'、'1d' 等按 UTC 纪元对齐的周期"""
+    units = {'m': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000}
+    try:
+        num = int(timeframe[:-1])
+    except ValueError:
+        raise ValueError(f"不支持的时间周期: {timeframe}")
+    if timeframe[-1] not in units or num <= 0:
+        raise ValueError(f"不支持的时间周期: {timeframe}")
+    return num * units[timeframe[-1]]
+
+
+def resample_ohlcv(columns: dict, timeframe_ms: int) -> dict:
+    """
+    把细粒度 K 线向量化聚合为 timeframe_ms 周期（按 UTC 纪元对齐，与交易所 K 线一致）。
+
+    输入需按时间戳有序；每个周期取首根 open、末根 close、high 最大、low 最小、volume 求和。
+    """
+    timestamp = columns['timestamp']
+    if len(timestamp) == 0:
+        return {name: values[:0] for name, values in columns.items()}
+    bucket = timestamp // timeframe_ms * timeframe_ms
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(bucket)) + 1])
+    ends = np.concatenate([starts[1:], [len(timestamp)]])
+    return {
+        'timestamp': bucket[starts],
+        'open': columns['open'][starts],
+        'high': np.maximum.reduceat(columns['high'], starts),
+        'low': np.minimum.reduceat(columns['low'], starts),
+        'close': columns['close'][ends - 1],
+        'volume': np.add.reduceat(columns['volume'], starts),
+    }
+
+
+class MarketDataStore:
+    """
+    列式行情存储：int64 毫秒时间戳 + float64 OHLCV 列，按 UTC 日期分区。
+
+    目录结构: {root}/{exchange}/{market_type}/{symbol}/{timeframe}/{YYYY-MM-DD}.bin
+    每个分区文件按列依次存放 timestamp、open、high、low、close、volume 六个定长数组，
+    读取时以 memory-map 方式打开，只有真正被访问的页才会载入内存。
+    """
+
+    def __init__(self, root='database/store'):
+        self.root = root
+
+    def _key_dir(self, key):
+        exchange, market_type, symbol, timeframe = key
+        return os.path.join(self.root, exchange, market_type, symbol.replace('/', ''), timeframe)
+
+    def _partition_path(self, key, day):
+        return os.path.join(self._key_dir(key), f'{np.datetime64(int(day), "D")}.bin')
+
+    def partitions(self, key):
+        """返回已存储的 UTC 日期分区（以天序号表示）"""
+        key_dir = self._key_dir(key)
+        if not os.path.isdir(key_dir):
+            return []
+        return sorted(int(np.datetime64(name[:-4], 'D').astype(np.int64))
+                      for name in os.listdir(key_dir) if name.endswith('.bin'))
+
+    def coverage(self, key):
+        """返回已完整下载的时间区间列表 [[start_ms, end_ms), ...]（有序、互不重叠）"""
+        path = os.path.join(self._key_dir(key), 'coverage.json')
+        try:
+            with open(path) as f:
+                return [tuple(interval) for interval in json.load(f)['intervals']]
+        except FileNotFoundError:
+            return []
+
+    def _write_coverage(self, key, intervals):
+        path = os.path.join(self._key_dir(key), 'coverage.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'intervals': intervals}, f)
+        os.replace(path + '.tmp', path)
+
+    def add_coverage(self, key, start_ms, end_ms):
+        """记录 [start_ms, end_ms) 已完整存储，并与已有区间合并"""
+        if end_ms <= start_ms:
+            return
+        intervals = sorted(self.coverage(key) + [(int(start_ms), int(end_ms))])
+        merged = [list(intervals[0])]
+        for start, end in intervals[1:]:
+            if start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self._write_coverage(key, merged)
+
+    def missing(self, key, start_ms, end_ms):
+        """返回 [start_ms, end_ms) 中尚未覆盖的子区间"""
+        gaps = []
+        cursor = start_ms
+        for start, end in self.coverage(key):
+            if end <= cursor:
+                continue
+            if start >= end_ms:
+                break
+            if start > cursor:
+                gaps.append((cursor, start))
+            cursor = max(cursor, end)
+        if cursor < end_ms:
+            gaps.append((cursor, end_ms))
+        return gaps
+
+    def has_range(self, key, start_ms, end_ms):
+        """[start_ms, end_ms) 是否已完整存储"""
+        return not self.missing(key, start_ms, end_ms)
+
+    def _read_partition(self, key, day):
+        with open(self._partition_path(key, day), 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        n = len(buf) // (8 * (len(OHLCV_COLUMNS) + 1))
+        columns = {'timestamp': np.frombuffer(buf, dtype=np.int64, count=n)}
+        values = np.frombuffer(buf, dtype=np.float64, count=n * len(OHLCV_COLUMNS), offset=8 * n)
+        for i, name in enumerate(OHLCV_COLUMNS):
+            columns[name] = values[i * n:(i + 1) * n]
+        return columns
+
+    def _write_partition(self, key, day, columns):
+        path = self._partition_path(key, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，避免读到写了一半的分区
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(np.ascontiguousarray(columns['timestamp'], dtype=np.int64).tobytes())
+            for name in OHLCV_COLUMNS:
+                f.write(np.ascontiguousarray(columns[name], dtype=np.float64).tobytes())
+        os.replace(tmp_path, path)
+
+    def write(self, key, ohlcv):
+        """写入 OHLCV 数据（ccxt 格式的二维列表或 (n, 6) 数组），与已有分区按时间戳合并去重"""
+        data = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        if len(data) == 0:
+            return 0
+        timestamp = data[:, 0].astype(np.int64)
+        days = timestamp // DAY_MS
+        for day in np.unique(days):
+            mask = days == day
+            columns = {'timestamp': timestamp[mask]}
+            for i, name in enumerate(OHLCV_COLUMNS):
+                columns[name] = data[mask, i + 1]
+            if os.path.exists(self._partition_path(key, day)):
+                existing = self._read_partition(key, day)
+                columns = {name: np.concatenate([existing[name], columns[name]]) for name in columns}
+            # 按时间戳排序去重，新数据覆盖旧数据
+            order = np.argsort(columns['timestamp'], kind='stable')[::-1]
+            _, first = np.unique(columns['timestamp'][order], return_index=True)
+            keep = order[first]
+            self._write_partition(key, day, {name: values[keep] for name, values in columns.items()})
+        return len(data)
+
+    def read(self, key, start_ms=None, end_ms=None):
+        """读取 [start_ms, end_ms) 内的列数据；单个分区时直接返回 memory-map 切片而不复制"""
+        days = self.partitions(key)
+        if start_ms is not None:
+            days = [d for d in days if d >= start_ms // DAY_MS]
+        if end_ms is not None:
+            days = [d for d in days if d <= (end_ms - 1) // DAY_MS]
+        pieces = []
+        for day in days:
+            part = self._read_partition(key, day)
+            lo = 0 if start_ms is None else np.searchsorted(part['timestamp'], start_ms, side='left')
+            hi = len(part['timestamp']) if end_ms is None else np.searchsorted(part['timestamp'], end_ms, side='left')
+            if hi > lo:
+                pieces.append({name: values[lo:hi] for name, values in part.items()})
+        if not pieces:
+            return {name: np.empty(0, dtype=np.int64 if name == 'timestamp' else np.float64)
+                    for name in ('timestamp',) + OHLCV_COLUMNS}
+        if len(pieces) == 1:
+            return pieces[0]
+        return {name: np.concatenate([p[name] for p in pieces]) for name in pieces[0]}
+
+    def load_frame(self, key, start_ms=None, end_ms=None):
+        """读取为与 DataFetcher._process_data 相同结构的 DataFrame"""
+        return _to_frame(self.read(key, start_ms, end_ms))
+
+    def funding_key(self, data_source, symbol):
+        return (data_source, 'future', symbol, FUNDING)
+
+    def _funding_path(self, key):
+        return os.path.join(self._key_dir(key), 'funding.bin')
+
+    def read_funding(self, key, start_ms=None, end_ms=None) -> pd.Series:
+        """读取 [start_ms, end_ms) 内的资金费率，返回以结算时间为索引的 Series"""
+        try:
+            with open(self._funding_path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        n = len(data) // 16
+        timestamp = np.frombuffer(data, dtype=np.int64, count=n)
+        rate = np.frombuffer(data, dtype=np.float64, count=n, offset=8 * n)
+        lo = 0 if start_ms is None else np.searchsorted(timestamp, start_ms, side='left')
+        hi = n if end_ms is None else np.searchsorted(timestamp, end_ms, side='left')
+        index = pd.DatetimeIndex(pd.to_datetime(timestamp[lo:hi], unit='ms'), name='timestamp')
+        return pd.Series(rate[lo:hi].copy(), index=index, name='funding_rate')
+
+    def write_funding(self, key, rows):
+        """写入 [[timestamp, rate], ...]，与已有记录按时间戳合并去重；整段历史很小，存为单个文件"""
+        data = np.asarray(rows, dtype=np.float64).reshape(-1, 2)
+        if len(data) == 0:
+            return 0
+        existing = self.read_funding(key)
+        timestamp = np.concatenate([existing.index.values.astype('datetime64[ms]').view(np.int64),
+                                    data[:, 0].astype(np.int64)])
+        rate = np.concatenate([existing.to_numpy(), data[:, 1]])
+        # 新数据覆盖旧数据
+        order = np.argsort(timestamp, kind='stable')[::-1]
+        _, first = np.unique(timestamp[order], return_index=True)
+        keep = order[first]
+        path = self._funding_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(timestamp[keep].tobytes())
+            f.write(rate[keep].tobytes())
+        os.replace(path + '.tmp', path)
+        return len(data)
+
+    def derived_key(self, base_key, timeframe):
+        """由 base_key 聚合出的 timeframe 周期数据的存储键，与直接下载的同周期数据分开存放"""
+        return tuple(base_key[:3]) + (f'{timeframe}@{base_key[3]}',)
+
+    def load_resampled(self, base_key, timeframe, timeframe_ms, start_ms, end_ms):
+        """
+        读取由基础周期聚合出的 [start_ms, end_ms) 内的 K 线（start_ms/end_ms 需按 timeframe_ms 对齐）。
+
+        派生数据缓存在 derived_key 下，并记录构建时基础数据的覆盖区间；
+        基础数据有新增下载时覆盖区间随之变化，已缓存的派生数据整体作废，按需重新聚合。
+        """
+        key = self.derived_key(base_key, timeframe)
+        base_coverage = [list(interval) for interval in self.coverage(base_key)]
+        meta_path = os.path.join(self._key_dir(key), 'derived.json')
+        try:
+            with open(meta_path) as f:
+                built_from = json.load(f)['base_coverage']
+        except (FileNotFoundError, KeyError, ValueError):
+            built_from = None
+        if built_from != base_coverage:
+            self._write_coverage(key, [])
+            with open(meta_path + '.tmp', 'w') as f:
+                json.dump({'base_coverage': base_coverage}, f)
+            os.replace(meta_path + '.tmp', meta_path)
+
+        for gap_start, gap_end in self.missing(key, start_ms, end_ms):
+            # 只聚合基础数据完整覆盖的整周期，未覆盖部分留待下载后再构建
+            for base_start, base_end in base_coverage:
+                lo = max(gap_start, -(-base_start // timeframe_ms) * timeframe_ms)
+                hi = min(gap_end, base_end // timeframe_ms * timeframe_ms)
+                if hi <= lo:
+                    continue
+                bars = resample_ohlcv(self.read(base_key, lo, hi), timeframe_ms)
+                self.write(key, np.column_stack([bars['timestamp']] + [bars[name] for name in OHLCV_COLUMNS]))
+                self.add_coverage(key, lo, hi)
+        return self.load_frame(key, start_ms, end_ms)
+
+
+def _to_frame(columns) -> pd.DataFrame:
+    index = pd.DatetimeIndex(pd.to_datetime(columns['timestamp'], unit='ms'), name='timestamp')
+    return pd.DataFrame({name: columns[name] for name in OHLCV_COLUMNS}, index=index, copy=False)
+
+
+def parse_cache_name(path):
+    """解析旧 pickle 缓存文件名: {source}_{contract_type}_{symbol}_{timeframe}_{start}_{range}.pkl"""
+    base = os.path.basename(path)[:-len('.pkl')]
+    data_source, contract_type, symbol, timeframe, start, range_str = base.split('_')
+    return (data_source, contract_type, symbol, timeframe), start, range_str
+
+
+def migrate_pickle_cache(database_dir='database', store=None):
+    """一次性把 database/*.pkl 旧缓存导入列式存储，返回已迁移的文件列表"""
+    from datafetcher import DataFetcher
+
+    store = store or MarketDataStore(os.path.join(database_dir, 'store'))
+    fetcher = DataFetcher()
+    migrated = []
+    for path in sorted(glob.glob(os.path.join(database_dir, '*.pkl'))):
+        try:
+            key, start, range_str = parse_cache_name(path)
+        except ValueError:
+            logging.warning(f"无法识别的缓存文件名，跳过: {path}")
+            continue
+        with open(path, 'rb') as f:
+            all_ohlcv = pickle.load(f)
+        rows = store.write(key, all_ohlcv)
+        if all_ohlcv:
+            # 旧缓存可能是中途出错被截断的下载，只把实际拿到的部分记为已覆盖
+            start_ms = _parse_cache_start(start)
+            end_ms = start_ms + fetcher._parse_range(range_str)
+            last_ms = int(all_ohlcv[-1][0]) + timeframe_to_ms(key[3])
+            store.add_coverage(key, start_ms, min(end_ms, last_ms))
+        logging.info(f"迁移缓存 {path} -> {store._key_dir(key)}，共 {rows} 行")
+        migrated.append(path)
+    return migrated
+
+
+def _parse_cache_start(start):
+    """旧缓存文件名中的起始时间为 UTC，格式 YYYY-mm-dd-HH:MM:SS"""
+    return int(pd.Timestamp(start[:10] + ' ' + start[11:]).value // 10**6)
+
+
+def benchmark_load(path, store=None, repeat=5):
+    """对比旧 pickle 路径与列式存储的加载耗时（秒，取最小值）"""
+    from datafetcher import DataFetcher
+
+    store = store or MarketDataStore(os.path.join(os.path.dirname(path), 'store'))
+    key, start, range_str = parse_cache_name(path)
+    fetcher = DataFetcher()
+    start_ms = _parse_cache_start(start)
+    end_ms = start_ms + fetcher._parse_range(range_str)
+
+    def load_pickle():
+        with open(path, 'rb') as f:
+            return fetcher._process_data(pickle.load(f))
+
+    def load_store():
+        df = store.load_frame(key, start_ms, end_ms)
+        df['close'].sum()  # 触发实际读取
+        return df
+
+    timings = {}
+    for name, func in (('pickle', load_pickle), ('store', load_store)):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            df = func()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        timings[f'{name}_rows'] = len(df)
+    return timings
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    for path in migrate_pickle_cache():
+        print(path, json.dumps(benchmark_load(path)))
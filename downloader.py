@@ -0,0 +1,205 @@
+import random
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import ccxt
+
+from datastore import FUNDING, FUNDING_INTERVAL_MS
+
+# 可重试的网络类错误；限频类错误额外触发令牌桶降速
+RETRYABLE_ERRORS = (ccxt.NetworkError,)
+RATE_LIMIT_ERRORS = (ccxt.DDoSProtection, ccxt.RateLimitExceeded)
+# Binance K 线接口的请求权重按 limit 分档：(limit 上界（不含）, 权重)，超出各档为 10
+KLINE_WEIGHTS = ((100, 1), (500, 2), (1001, 5))
+FUNDING_WEIGHT = 1
+
+
+def request_weight(timeframe, limit) -> int:
+    """单次请求消耗的权重，令牌桶以权重为单位计数（与 ccxt 的 rateLimit/cost 含义相同）"""
+    if timeframe == FUNDING:
+        return FUNDING_WEIGHT
+    for upper, weight in KLINE_WEIGHTS:
+        if limit < upper:
+            return weight
+    return 10
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶，同一交易所的所有市场共享。
+
+    速率按 AIMD 自适应：遇到限频错误时乘性降速，请求成功时加性回升到上限。
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = float(min_rate) if min_rate is not None else self.max_rate / 16
+        # 默认不允许突发：任意 1 秒内的请求数不超过 rate + capacity，贴近交易所的滑动窗口限频
+        self.capacity = float(capacity) if capacity is not None else 1.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, weight=1.0):
+        """
+        阻塞直到取得 weight 个令牌。
+
+        weight 大于桶容量时，令牌攒满即放行并记为负数（欠账），之后的请求等到还清为止，平均速率不变
+        """
+        need = min(weight, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= need:
+                    self.tokens -= weight
+                    return
+                wait = (need - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttle(self, factor=0.5):
+        """触发限频后降速，并清空已积累的令牌"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate * factor)
+            self.tokens = min(self.tokens, 0.0)
+
+    def reward(self, step=None):
+        """请求成功后逐步恢复速率"""
+        with self.lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + (step or self.max_rate / 20))
+
+
+class DownloadScheduler:
+    """
+    多市场并发 K 线下载调度器。
+
+    把每个缺失区间切成单次请求大小的窗口，所有市场、所有窗口一起提交到线程池；
+    交易所实例按 (data_source, contract_type) 复用，令牌桶按 data_source 共享。
+    """
+
+    def __init__(self, fetcher, max_workers=8, batch_limit=1000, max_retries=6,
+                 base_delay=0.5, max_delay=30.0):
+        self.fetcher = fetcher
+        self.max_workers = max_workers
+        self.batch_limit = batch_limit
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.exchanges = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def exchange(self, data_source, contract_type):
+        """获取（或创建并缓存）交易所实例；限频由共享令牌桶负责，关闭 ccxt 自带的串行限速"""
+        with self.lock:
+            key = (data_source, contract_type)
+            if key not in self.exchanges:
+                exchange = self.fetcher._create_exchange(data_source, contract_type)
+                exchange.enableRateLimit = False
+                self.exchanges[key] = exchange
+            return self.exchanges[key]
+
+    def bucket(self, data_source, exchange):
+        with self.lock:
+            if data_source not in self.buckets:
+                # ccxt 的 rateLimit 为单位权重的请求间隔（ms），即每秒 1000 / rateLimit 个权重
+                self.buckets[data_source] = TokenBucket(1000 / max(exchange.rateLimit, 1))
+            return self.buckets[data_source]
+
+    def _windows(self, start_ms, end_ms, timeframe_ms):
+        step = self.batch_limit * timeframe_ms
+        return [(since, min(since + step, end_ms)) for since in range(start_ms, end_ms, step)]
+
+    def _backoff(self, attempt):
+        """指数退避 + full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _fetch_window(self, store_key, since, until, timeframe_ms):
+        """
+        下载单个窗口，返回 (ohlcv, covered_until)；资金费率存储键返回 [[结算时间, 费率], ...]。
+
+        返回条数不足 limit 说明交易所在最后一根 K 线之后暂无数据，只记录到最后一根为止；
+        完整的空响应说明窗口内没有数据（上市前或停止交易后），已收盘的部分记为已覆盖，不再重复请求。
+        """
+        data_source, contract_type, symbol, timeframe = store_key
+        exchange = self.exchange(data_source, contract_type)
+        bucket = self.bucket(data_source, exchange)
+        limit = -(-(until - since) // timeframe_ms)
+        weight = request_weight(timeframe, limit)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire(weight)
+            try:
+                if timeframe == FUNDING:
+                    batch = [[item['timestamp'], item['fundingRate']] for item in
+                             exchange.fetch_funding_rate_history(symbol=symbol, since=since, limit=limit)]
+                else:
+                    batch = exchange.fetch_ohlcv(symbol=symbol, timeframe=timeframe, since=since, limit=limit)
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, RATE_LIMIT_ERRORS):
+                    bucket.throttle()
+                if attempt == self.max_retries:
+                    logging.error(f"{store_key} 窗口 {since} 重试 {attempt} 次仍失败: {e}")
+                    return [], since
+                delay = self._backoff(attempt)
+                logging.warning(f"请求失败，{delay:.2f}s 后重试: {e}")
+                time.sleep(delay)
+                continue
+            except ccxt.ExchangeError as e:
+                logging.error(f"交易所错误: {e}")
+                return [], since
+            except Exception:
+                # 解析错误等意外异常只影响本窗口，不中断其他市场的并发下载
+                logging.exception(f"{store_key} 窗口 {since} 下载异常")
+                return [], since
+            bucket.reward()
+            # 当前未收盘的 K 线（结算周期）及之后的部分仍可能变化或出现数据，不记入覆盖区间
+            closed = int(time.time() * 1000) // timeframe_ms * timeframe_ms
+            if timeframe != FUNDING and batch and batch[-1][0] >= closed:
+                # 未收盘的 K 线数据不完整，不落盘，下次请求时重新获取
+                batch = [row for row in batch if row[0] < closed]
+            if timeframe == FUNDING and len(batch) >= limit and batch[-1][0] + timeframe_ms < until:
+                # 结算间隔短于 8 小时时一页取不完，只记录到最后一条，其余部分下次续传
+                return batch, max(batch[-1][0] + 1, since)
+            if len(batch) >= limit:
+                return batch, min(max(closed, since), until)
+            if not batch:
+                return batch, min(max(closed, since), until)
+            covered = min(batch[-1][0] + timeframe_ms, closed)
+            return batch, min(max(covered, since), until)
+        return [], since
+
+    def download(self, requests, on_window=None):
+        """
+        并发下载多个市场的缺失区间。
+
+        参数:
+            requests: [(store_key, [(start_ms, end_ms), ...]), ...]
+            on_window: 每个窗口完成后在调用线程中回调 on_window(store_key, since, until, ohlcv, covered_until)，
+                       用于边下载边落盘
+        """
+        jobs = []
+        for store_key, gaps in requests:
+            timeframe_ms = FUNDING_INTERVAL_MS if store_key[3] == FUNDING else \
+                self.fetcher._timeframe_to_ms(store_key[3])
+            for gap_start, gap_end in gaps:
+                for since, until in self._windows(gap_start, gap_end, timeframe_ms):
+                    jobs.append((store_key, since, until, timeframe_ms))
+        if not jobs:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+            futures = {pool.submit(self._fetch_window, *job): job for job in jobs}
+            for future in as_completed(futures):
+                store_key, since, until, _ = futures[future]
+                ohlcv, covered_until = future.result()
+                if on_window is not None:
+                    on_window(store_key, since, until, ohlcv, covered_until)
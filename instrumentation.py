@@ -0,0 +1,232 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+
+class _NullStage:
+    """关闭插桩时返回的空计时器，进入/退出均不做任何事"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, key, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def _rss_peak_mb():
+    """进程迄今为止的峰值 RSS（MB）；Linux 上 ru_maxrss 单位为 KB，macOS 为字节"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def _rss_current_mb():
+    """当前 RSS（MB），读取 /proc/self/statm；不支持的平台返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+class _Stage:
+    """
+    单个阶段的计时上下文；with 块内可通过 stage.rows = n 补充处理的行数。
+
+    内存指标均为本阶段自身的量：rss_delta_mb 为阶段前后 RSS 之差，peak_rss_growth_mb 为本阶段把进程峰值 RSS
+    抬高了多少（未创新高为 0）；tracemalloc 的峰值按阶段栈累积，内层阶段 reset_peak 前把外层已达到的峰值记到外层。
+    """
+
+    def __init__(self, owner, name, rows):
+        self.owner = owner
+        self.name = name
+        self.rows = rows
+        self.profiler = None
+        self.traced_peak = 0
+
+    def __enter__(self):
+        owner = self.owner
+        parent = owner.stack[-1] if owner.stack else None
+        self.parent = parent.name if parent else None
+        owner.stack.append(self)
+        if owner.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                owner.started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent.traced_peak = max(parent.traced_peak, peak)
+            self.traced_start = current
+            tracemalloc.reset_peak()
+        self.rss_start = _rss_current_mb()
+        self.rss_peak_start = _rss_peak_mb()
+        # cProfile 不能嵌套启用，只在最外层阶段采样
+        if owner.profile and not owner.profiling:
+            owner.profiling = True
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        owner = self.owner
+        record = {
+            'stage': self.name,
+            'parent': self.parent,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'rows': self.rows,
+            'rows_per_s': self.rows / wall if self.rows and wall > 0 else None,
+            'rss_start_mb': self.rss_start,
+            'rss_delta_mb': None,
+            'peak_rss_growth_mb': _rss_peak_mb() - self.rss_peak_start,
+            'process_peak_rss_mb': _rss_peak_mb(),
+        }
+        rss_end = _rss_current_mb()
+        if rss_end is not None and self.rss_start is not None:
+            record['rss_delta_mb'] = rss_end - self.rss_start
+        if self.profiler is not None:
+            self.profiler.disable()
+            owner.profiling = False
+            record['profile'] = owner._profile_summary(self.profiler, self.name)
+        owner.stack.pop()
+        if owner.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(self.traced_peak, peak)
+            record['traced_peak_mb'] = (peak - self.traced_start) / 1024 / 1024
+            record['traced_delta_mb'] = (current - self.traced_start) / 1024 / 1024
+            if owner.stack:
+                owner.stack[-1].traced_peak = max(owner.stack[-1].traced_peak, peak)
+        if not owner.stack and owner.started_tracing:
+            # 由插桩启动的 tracemalloc 在最外层阶段结束时停止，避免之后的代码一直承担追踪开销
+            tracemalloc.stop()
+            owner.started_tracing = False
+        owner.records.append(record)
+        return False
+
+
+class Instrumentation:
+    """
+    流水线阶段插桩：记录每个阶段的墙钟/CPU 时间、行数、吞吐与内存变化。
+
+    关闭时 stage() 直接返回空上下文，开销仅为一次函数调用；
+    profile=True 时为最外层阶段采集 cProfile，trace_memory=True 时用 tracemalloc 统计阶段内分配峰值。
+    """
+
+    def __init__(self, enabled=False, profile=False, trace_memory=False, profile_dir=None, top=20):
+        self.records = []
+        self.stack = []
+        self.profiling = False
+        self.started_tracing = False
+        self.configure(enabled, profile, trace_memory, profile_dir, top)
+
+    def configure(self, enabled=True, profile=False, trace_memory=False, profile_dir=None, top=20):
+        self.enabled = enabled
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.top = top
+
+    def reset(self):
+        self.records = []
+        self.stack = []
+
+    def stage(self, name, rows=None):
+        """阶段计时上下文管理器"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, rows)
+
+    def timed(self, name=None, rows=None):
+        """
+        阶段计时装饰器。
+
+        rows 可以是整数，也可以是接收函数返回值、返回行数的可调用对象。
+        """
+        def decorator(func):
+            stage_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.stage(stage_name, rows if not callable(rows) else None) as stage:
+                    result = func(*args, **kwargs)
+                    if callable(rows):
+                        stage.rows = rows(result)
+                    return result
+            return wrapper
+        return decorator
+
+    def _profile_summary(self, profiler, name):
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.profile_dir, f'{name}.prof'))
+        stats = pstats.Stats(profiler)
+        stats.sort_stats('cumulative')
+        top = []
+        for (filename, lineno, func), (cc, nc, tt, ct, _) in list(stats.stats.items()):
+            top.append({'function': f'{os.path.basename(filename)}:{lineno}({func})',
+                        'calls': nc, 'tottime_s': tt, 'cumtime_s': ct})
+        top.sort(key=lambda item: item['cumtime_s'], reverse=True)
+        return top[:self.top]
+
+    def report(self) -> dict:
+        """结构化的运行报告"""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record['stage'], {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': 0})
+            total['calls'] += 1
+            total['wall_s'] += record['wall_s']
+            total['cpu_s'] += record['cpu_s']
+            total['rows'] += record['rows'] or 0
+        return {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'argv': sys.argv,
+            'process_peak_rss_mb': _rss_peak_mb(),
+            'stages': self.records,
+            'totals': totals,
+        }
+
+    def save_report(self, path) -> str:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False, default=str)
+        return path
+
+    def summary(self) -> str:
+        """便于打印的各阶段耗时摘要"""
+        out = io.StringIO()
+        for record in self.records:
+            indent = '  ' if record['parent'] else ''
+            rate = f", {record['rows_per_s']:.0f} 行/s" if record['rows_per_s'] else ''
+            delta = f"RSS {record['rss_delta_mb']:+.1f} MB, " if record['rss_delta_mb'] is not None else ''
+            out.write(f"{indent}{record['stage']}: {record['wall_s']:.4f}s (CPU {record['cpu_s']:.4f}s{rate}), "
+                      f"{delta}进程峰值 RSS {record['process_peak_rss_mb']:.1f} MB"
+                      f"（本阶段 +{record['peak_rss_growth_mb']:.1f} MB）\n")
+        return out.getvalue()
+
+
+# 全局插桩实例，各模块通过 stage()/timed() 使用；默认关闭
+INSTRUMENT = Instrumentation()
+stage = INSTRUMENT.stage
+timed = INSTRUMENT.timed
+configure = INSTRUMENT.configure
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtest import backtest_arrays, _cost_columns, COST_COLUMNS, INITIAL_CAPITAL
+from strategy import signals_from_prices
+from signalcache import CACHE, fingerprint, configure_worker
+from sweep import _split_params
+
+QUEUE_DIR = 'queue'
+CHUNK = 50               # 每个任务包含的参数组数
+LEASE_SECONDS = 600      # 领取的任务超过该时间没有心跳视为 worker 失效，重新入队
+POLL_SECONDS = 1.0
+MAX_ATTEMPTS = 3         # 任务失败达到该次数后移入 failed/，不再重试
+
+# 队列目录结构（可放在多台机器共享的文件系统上，领取任务依赖同一文件系统内 rename 的原子性）:
+#   pending/<数据键>__<任务键>.json   待执行
+#   claimed/<数据键>__<任务键>.json   已被某个 worker 领取，mtime 为最近一次心跳
+#   results/<任务键>.json             已完成任务的结果（检查点）
+#   failed/<数据键>__<任务键>.json    多次失败的任务，attempts/error 字段记录失败次数与最后一次错误
+
+
+def _dirs(queue_dir) -> dict:
+    dirs = {name: os.path.join(queue_dir, name) for name in ('pending', 'claimed', 'results', 'failed')}
+    for path in dirs.values():
+        os.makedirs(path, exist_ok=True)
+    return dirs
+
+
+def _digest(obj) -> str:
+    return hashlib.blake2b(json.dumps(obj, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+
+
+def _write_json(path, obj):
+    """先写临时文件再替换，读取方不会看到写了一半的文件"""
+    tmp = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, default=float)
+    os.replace(tmp, path)
+
+
+def _job_key(filename) -> str:
+    return filename[:-len('.json')].split('__')[1]
+
+
+def submit_study(queue_dir=QUEUE_DIR, symbols=('BTC/USDT',), periods=(('2024-01-01 00:00:00', '1y'),),
+                 params=({},), timeframe='5m', chunk=CHUNK) -> dict:
+    """
+    把 (交易对, 时间段, 参数组) 拆分为任务写入队列，返回各状态的任务数。
+
+    参数:
+        periods: (start_time, range) 列表，与 MeanReversionStrategy.config 的参数一致
+        params: 参数字典列表（sweep.param_grid / param_sample 的输出）
+        chunk: 每个任务的参数组数；同一策略参数的组合排在一起，使其在同一任务内共享信号
+
+    任务键由任务内容决定，重复提交是幂等的：已完成（有结果）或已在队列中的任务会被跳过，
+    因此中断后再次调用即可只补交未完成的任务。
+    """
+    dirs = _dirs(queue_dir)
+    done = {name[:-len('.json')] for name in os.listdir(dirs['results']) if name.endswith('.json')}
+    queued = {_job_key(name) for d in ('pending', 'claimed') for name in os.listdir(dirs[d])
+              if name.endswith('.json')}
+    ordered = sorted((_split_params(p) for p in params), key=lambda sp: tuple(sp[0].values()))
+    ordered = [{**signal_params, **backtest_params} for signal_params, backtest_params in ordered]
+
+    counts = {'submitted': 0, 'done': 0, 'queued': 0}
+    for symbol in symbols:
+        for start_time, range_ in periods:
+            data = {'symbol': symbol, 'timeframe': timeframe, 'start_time': start_time, 'range': range_}
+            data_key = _digest(data)
+            for lo in range(0, len(ordered), chunk):
+                job = {'data': data, 'params': ordered[lo:lo + chunk]}
+                key = _digest(job)
+                if key in done:
+                    counts['done'] += 1
+                elif key in queued:
+                    counts['queued'] += 1
+                else:
+                    _write_json(os.path.join(dirs['pending'], f'{data_key}__{key}.json'), job)
+                    counts['submitted'] += 1
+    logging.info(f"任务提交: 新增 {counts['submitted']}, 已完成 {counts['done']}, 已在队列 {counts['queued']}")
+    return counts
+
+
+def requeue_stale(queue_dir=QUEUE_DIR, lease=LEASE_SECONDS) -> int:
+    """把心跳超时的已领取任务放回待执行队列（worker 崩溃或机器宕机后恢复），返回数量"""
+    dirs = _dirs(queue_dir)
+    now = time.time()
+    count = 0
+    for name in os.listdir(dirs['claimed']):
+        path = os.path.join(dirs['claimed'], name)
+        try:
+            if name.endswith('.json') and now - os.path.getmtime(path) > lease:
+                os.replace(path, os.path.join(dirs['pending'], name))
+                count += 1
+        except FileNotFoundError:
+            pass
+    if count:
+        logging.warning(f"{count} 个任务心跳超时，已重新入队")
+    return count
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _claim(dirs, preferred=None):
+    """领取一个任务；优先选择与 worker 已加载数据相同的任务（数据局部性），rename 失败说明已被他人领取"""
+    names = sorted(name for name in os.listdir(dirs['pending']) if name.endswith('.json'))
+    if preferred:
+        names.sort(key=lambda name: not name.startswith(f'{preferred}__'))
+    for name in names:
+        claimed = os.path.join(dirs['claimed'], name)
+        try:
+            os.rename(os.path.join(dirs['pending'], name), claimed)
+        except FileNotFoundError:
+            continue
+        os.utime(claimed)
+        with open(claimed, encoding='utf-8') as f:
+            return name, claimed, json.load(f)
+    return None
+
+
+def load_market_data(data: dict) -> pd.DataFrame:
+    """按任务的数据描述加载对齐后的行情及存在的成本列（使用本机 DataFetcher 缓存，缺失时下载）"""
+    from strategy import MeanReversionStrategy
+
+    engine = MeanReversionStrategy()
+    engine.config(symbol=data['symbol'], timeframe=data['timeframe'], range=data['range'],
+                  start_time=data['start_time'])
+    engine.load_data()
+    market_data = engine.market_data
+    return market_data[['spot', 'future', *(name for name in COST_COLUMNS if name in market_data.columns)]]
+
+
+def _run_job(job, market_data, data_key, heartbeat, initial_capital) -> list:
+    """执行一个任务：同一策略参数只计算一次信号，依次回测其下的回测参数"""
+    index = market_data.index
+    spot = market_data['spot'].to_numpy(dtype=np.float64)
+    future = market_data['future'].to_numpy(dtype=np.float64)
+    costs = _cost_columns(market_data)
+    rows = []
+    for params in job['params']:
+        signal_params, backtest_params = _split_params(params)
+        signal = signals_from_prices(spot, future, **signal_params, cache=CACHE, data_key=data_key)
+        _, metrics = backtest_arrays(index, spot, future, signal, initial_capital=initial_capital,
+                                     raw_metrics=True, **costs, **backtest_params)
+        if not metrics:
+            metrics = {"初始资金": initial_capital, "最终资金": initial_capital, "交易次数": 0}
+        rows.append({'symbol': job['data']['symbol'], 'start_time': job['data']['start_time'],
+                     'range': job['data']['range'], **signal_params, **backtest_params, **metrics})
+        heartbeat()
+    return rows
+
+
+def run_worker(queue_dir=QUEUE_DIR, worker_id=None, loader=load_market_data, exit_when_empty=True,
+               poll=POLL_SECONDS, initial_capital=INITIAL_CAPITAL) -> int:
+    """
+    worker 主循环：领取任务 → 加载数据 → 回测 → 写入结果，返回完成的任务数。
+
+    loader 为 data 描述 → 含 spot/future（及可选成本列）的 DataFrame 的函数（须可 pickle，默认用 DataFetcher 加载）；
+    worker 只保留最近一份行情，并优先领取同一份数据的任务。exit_when_empty=False 时持续等待新任务。
+    单个任务失败只记录日志并放回队列（失败 MAX_ATTEMPTS 次后移入 failed/），worker 继续领取下一个任务。
+    """
+    dirs = _dirs(queue_dir)
+    worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+    loaded_key, market_data, data_fingerprint = None, None, None
+    finished = failed = 0
+    while True:
+        claimed = _claim(dirs, preferred=loaded_key)
+        if claimed is None:
+            if exit_when_empty and not os.listdir(dirs['claimed']):
+                break
+            time.sleep(poll)
+            requeue_stale(queue_dir)
+            continue
+        name, path, job = claimed
+        data_key, key = name[:-len('.json')].split('__')
+        if os.path.exists(os.path.join(dirs['results'], f'{key}.json')):
+            # 被收回的任务已由原 worker 完成
+            _remove(path)
+            continue
+        try:
+            if data_key != loaded_key:
+                market_data = loader(job['data'])
+                data_fingerprint = fingerprint(market_data['spot'].to_numpy(), market_data['future'].to_numpy())
+                loaded_key = data_key
+            last_beat = [time.time()]
+
+            def heartbeat():
+                # 更新领取文件的 mtime 作为心跳，避免长任务被误判为失效
+                if time.time() - last_beat[0] > LEASE_SECONDS / 10:
+                    os.utime(path)
+                    last_beat[0] = time.time()
+
+            rows = _run_job(job, market_data, data_fingerprint, heartbeat, initial_capital)
+            _write_json(os.path.join(dirs['results'], f'{key}.json'),
+                        {'worker': worker_id, 'finished_at': time.time(), 'rows': rows})
+            finished += 1
+            # 心跳超时被 requeue_stale 放回队列时领取文件已不在，结果已写出，再次领取时直接跳过
+            _remove(path)
+        except Exception as e:
+            failed += 1
+            if not os.path.exists(path):
+                logging.error(f"[{worker_id}] 任务 {key} 失败，领取已被收回: {e}")
+                continue
+            attempts = job.get('attempts', 0) + 1
+            target = 'pending' if attempts < MAX_ATTEMPTS else 'failed'
+            logging.error(f"[{worker_id}] 任务 {key} 第 {attempts} 次失败，"
+                          f"{'重新入队' if target == 'pending' else '移入 failed/'}: {e!r}")
+            try:
+                _write_json(path, {**job, 'attempts': attempts, 'error': repr(e)})
+                os.replace(path, os.path.join(dirs[target], name))
+            except FileNotFoundError:
+                pass
+    logging.info(f"[{worker_id}] 队列已空，完成 {finished} 个任务，失败 {failed} 次")
+    return finished
+
+
+def run_local_workers(queue_dir=QUEUE_DIR, n_workers=None, loader=load_market_data) -> list:
+    """在本机启动 n_workers 个 worker 进程直到队列为空，返回各 worker 完成的任务数"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    n_workers = n_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=configure_worker, initargs=(n_workers,)) as pool:
+        futures = [pool.submit(run_worker, queue_dir, None, loader) for _ in range(n_workers)]
+        return [future.result() for future in futures]
+
+
+def queue_status(queue_dir=QUEUE_DIR) -> dict:
+    dirs = _dirs(queue_dir)
+    return {name: sum(f.endswith('.json') for f in os.listdir(path)) for name, path in dirs.items()}
+
+
+def collect_results(queue_dir=QUEUE_DIR) -> pd.DataFrame:
+    """汇总全部已完成任务的结果，每组参数一行"""
+    dirs = _dirs(queue_dir)
+    rows = []
+    for name in sorted(os.listdir(dirs['results'])):
+        if name.endswith('.json'):
+            with open(os.path.join(dirs['results'], name), encoding='utf-8') as f:
+                rows.extend(json.load(f)['rows'])
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    from sweep import param_grid
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    space = {
+        'zscore_window': [60, 120, 240],
+        'zscore_threshold': [1.8, 2.1, 2.5],
+        'take_profit': [0.01, 0.02],
+        'stop_loss': [0.02, 0.03],
+    }
+    # 在其他机器上共享同一 QUEUE_DIR 后运行 run_worker() 即可加入计算
+    submit_study(symbols=('BTC/USDT',), periods=(('2024-01-01 00:00:00', '1y'),), params=param_grid(space))
+    run_local_workers()
+    print(queue_status())
+    results = collect_results()
+    print(results.sort_values('最终资金', ascending=False).head(10).to_string())
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+from strategy import compute_premium_pct, rolling_zscore, compute_volatility, compute_raw_signal, \
+    filter_low_volatility
+
+# 与 MeanReversionStrategy.generate_signals 输出的派生列同名，按需计算
+DERIVED_COLUMNS = ('premium', 'premium_pct', 'mean_premium_pct', 'std', 'zscore', 'raw_signal', 'signal',
+                   'SMA', 'volatility')
+# 回测计算滑点与资金费用时读取的可选原始列（backtest._cost_columns），存在时原样保留为 float64
+OPTIONAL_COLUMNS = ('spot_volume', 'future_volume', 'funding_rate')
+
+
+def compact_prices(values, price_dtype='auto') -> np.ndarray:
+    """价格序列转换为 float32 能无损表示时用 float32，否则保留 float64；price_dtype 可显式指定"""
+    values = np.asarray(values)
+    if price_dtype != 'auto':
+        return np.ascontiguousarray(values, dtype=price_dtype)
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    narrow = values.astype(np.float32)
+    if np.array_equal(narrow.astype(np.float64), values, equal_nan=True):
+        return narrow
+    return values
+
+
+class MarketFrame:
+    """
+    紧凑的对齐行情：int64 毫秒时间戳、float32/float64 价格，派生指标在被访问时才计算。
+
+    只有被消费者（回测、图表）显式访问的派生列会缓存，计算过程中的中间结果用完即释放；
+    信号列以 int8 存储；成交量与资金费率列（OPTIONAL_COLUMNS）提供时随行情一起保存。支持 frame['spot']、frame[['signal']]、frame.index、len(frame) 等
+    DataFrame 常用读法，可直接交给 run_backtest 与 Visualizer。
+    """
+
+    def __init__(self, timestamp, spot, future, zscore_window=120, zscore_threshold=2.1, min_volatility=0.05,
+                 price_dtype='auto', spot_volume=None, future_volume=None, funding_rate=None):
+        self.timestamp = np.ascontiguousarray(timestamp, dtype=np.int64)
+        self.spot = compact_prices(spot, price_dtype)
+        self.future = compact_prices(future, price_dtype)
+        optional = dict(spot_volume=spot_volume, future_volume=future_volume, funding_rate=funding_rate)
+        self.optional = {name: np.ascontiguousarray(values, dtype=np.float64)
+                         for name, values in optional.items() if values is not None}
+        self.zscore_window = zscore_window
+        self.zscore_threshold = zscore_threshold
+        self.min_volatility = min_volatility
+        self._cache = {}
+        self._index = None
+
+    @classmethod
+    def from_frame(cls, market_data: pd.DataFrame, **kwargs):
+        """由含 spot/future 列、以时间为索引的 DataFrame 构建，同时带上其中的 OPTIONAL_COLUMNS"""
+        timestamp = market_data.index.values.astype('datetime64[ms]').astype(np.int64)
+        optional = {name: market_data[name].to_numpy() for name in OPTIONAL_COLUMNS if name in market_data.columns}
+        return cls(timestamp, market_data['spot'].to_numpy(), market_data['future'].to_numpy(), **optional,
+                   **kwargs)
+
+    def configure(self, zscore_window, zscore_threshold, min_volatility):
+        """更新信号参数；参数变化时清空已缓存的派生列"""
+        params = (zscore_window, zscore_threshold, min_volatility)
+        if params != (self.zscore_window, self.zscore_threshold, self.min_volatility):
+            self._cache.clear()
+        self.zscore_window, self.zscore_threshold, self.min_volatility = params
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        if self._index is None:
+            self._index = pd.DatetimeIndex(pd.to_datetime(self.timestamp, unit='ms'), name='timestamp')
+        return self._index
+
+    @property
+    def columns(self) -> list:
+        return ['spot', 'future', *self.optional, *DERIVED_COLUMNS]
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def _compute(self, name) -> np.ndarray:
+        """计算单个派生列；依赖的列已缓存时直接复用，否则临时计算、不缓存"""
+        get = lambda dep: self._cache[dep] if dep in self._cache else self._compute(dep)
+        if name == 'premium':
+            return self.spot.astype(np.float64) - self.future
+        if name == 'premium_pct':
+            return compute_premium_pct(self.spot.astype(np.float64), self.future.astype(np.float64))
+        if name in ('mean_premium_pct', 'std', 'zscore'):
+            mean, std, zscore = rolling_zscore(pd.Series(get('premium_pct')), self.zscore_window)
+            return {'mean_premium_pct': mean, 'std': std, 'zscore': zscore}[name].to_numpy()
+        if name == 'raw_signal':
+            return compute_raw_signal(get('zscore'), self.zscore_threshold).astype(np.int8)
+        if name == 'volatility':
+            return compute_volatility(pd.Series(get('premium_pct'))).to_numpy()
+        if name == 'signal':
+            return filter_low_volatility(get('raw_signal'), get('volatility'), self.min_volatility).astype(np.int8)
+        if name == 'SMA':
+            return pd.Series(get('premium_pct')).rolling(window=2 * self.zscore_window).mean().to_numpy()
+        raise KeyError(name)
+
+    def values(self, name) -> np.ndarray:
+        """返回列的 numpy 数组；派生列首次访问时计算并缓存"""
+        if name == 'spot':
+            return self.spot
+        if name == 'future':
+            return self.future
+        if name in self.optional:
+            return self.optional[name]
+        if name not in self._cache:
+            self._cache[name] = self._compute(name)
+        return self._cache[name]
+
+    def __getitem__(self, key):
+        if isinstance(key, (list, tuple)):
+            return self.to_frame(key)
+        return pd.Series(self.values(key), index=self.index, name=key, copy=False)
+
+    def release(self, *names):
+        """释放已缓存的派生列（默认全部）"""
+        for name in names or list(self._cache):
+            self._cache.pop(name, None)
+
+    def to_frame(self, columns=None) -> pd.DataFrame:
+        """物化为普通 DataFrame（默认只含 spot/future、可选原始列与已缓存的列）"""
+        columns = columns or ['spot', 'future', *self.optional, *self._cache]
+        return pd.DataFrame({name: self.values(name) for name in columns}, index=self.index, copy=False)
+
+    def memory_usage(self) -> dict:
+        """各数组占用的字节数"""
+        usage = {'timestamp': self.timestamp.nbytes, 'spot': self.spot.nbytes, 'future': self.future.nbytes}
+        usage.update({name: values.nbytes for name, values in self.optional.items()})
+        usage.update({name: values.nbytes for name, values in self._cache.items()})
+        if self._index is not None:
+            usage['index'] = self._index.nbytes
+        return usage
+
+
+def _vm_hwm_mb():
+    """进程的 RSS 峰值（MB）；Linux 下先向 /proc/self/clear_refs 写 5 即可把峰值重置为当前 RSS"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return np.nan
+
+
+def _peak_rss_run(n_bars, compact, seed):
+    """在独立进程中运行 信号生成 + 回测，返回 (运行前 RSS, 运行期间的峰值 RSS)"""
+    import backtest
+    import strategy
+    from synthetic import generate_market_data
+
+    backtest.ENABLE_DEBUG = False
+    strategy.ENABLE_DEBUG = False
+    strategy.COMPACT_MARKET_DATA = compact
+    engine = strategy.MeanReversionStrategy()
+    engine.config()
+    engine.market_data = generate_market_data(n_bars, seed=seed)
+    # 重置峰值，排除生成合成数据时的临时内存
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    baseline = _vm_hwm_mb()
+    engine.generate_signals()
+    backtest.run_backtest(engine.market_data)
+    return baseline, _vm_hwm_mb()
+
+
+def benchmark_memory(n_bars=5_000_000, seed=0) -> dict:
+    """分别在新进程中测量原 DataFrame 方式与紧凑方式的峰值 RSS（MB，依赖 Linux /proc）"""
+    import multiprocessing
+
+    result = {'bars': n_bars}
+    context = multiprocessing.get_context('spawn')
+    for name, compact in (('dataframe', False), ('compact', True)):
+        with context.Pool(1) as pool:
+            baseline, peak = pool.apply(_peak_rss_run, (n_bars, compact, seed))
+        result[f'{name}_peak_rss_mb'] = peak
+        result[f'{name}_increase_mb'] = peak - baseline
+    return result
+
+
+if __name__ == '__main__':
+    for key, value in benchmark_memory().items():
+        print(f'{key}: {value}')
@@ -0,0 +1,279 @@
+import numpy as np
+import pandas as pd
+
+SECONDS_PER_YEAR = 365.25 * 24 * 3600
+
+
+def periods_per_year(index) -> float:
+    """根据时间索引的平均 bar 间隔推算每年的 bar 数，用于年化"""
+    if len(index) < 2:
+        return np.nan
+    span = (index[-1] - index[0]).total_seconds()
+    return SECONDS_PER_YEAR * (len(index) - 1) / span if span > 0 else np.nan
+
+
+def bar_returns(equity: np.ndarray) -> np.ndarray:
+    """逐 bar 的简单收益率"""
+    equity = np.asarray(equity, dtype=np.float64)
+    return equity[1:] / equity[:-1] - 1
+
+
+def drawdown_stats(index, equity: np.ndarray) -> dict:
+    """
+    一次向量化扫描计算回撤深度、持续时间与修复时间。
+
+    返回:
+        max_drawdown: 最大回撤（%，负数）
+        max_drawdown_duration: 最长的水下时间（h，从前高到收复或序列结束）
+        max_drawdown_recovery: 最大回撤从谷底到收复前高的时间（h），未收复为 NaN
+        peak_time / trough_time / recovery_time: 最大回撤的前高、谷底与收复时间
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    n = equity.shape[0]
+    positions = np.arange(n)
+    peak = np.maximum.accumulate(equity)
+    drawdown = equity / peak - 1
+    # 每个 bar 对应的最近一次前高位置
+    peak_pos = np.maximum.accumulate(np.where(equity >= peak, positions, 0))
+    index = pd.DatetimeIndex(index)
+    hours = ((index - index[0]) / pd.Timedelta(hours=1)).to_numpy() if n else np.empty(0)
+
+    trough = int(np.argmin(drawdown)) if n else 0
+    if n == 0 or drawdown[trough] >= 0:
+        return {'max_drawdown': 0.0, 'max_drawdown_duration': 0.0, 'max_drawdown_recovery': 0.0,
+                'peak_time': None, 'trough_time': None, 'recovery_time': None}
+
+    recovered = equity[trough:] >= peak[trough]
+    if recovered.any():
+        recovery = trough + int(np.argmax(recovered))
+        recovery_hours = hours[recovery] - hours[trough]
+        recovery_time = index[recovery]
+    else:
+        recovery_hours = np.nan
+        recovery_time = None
+
+    # 水下时长：当前 bar 距最近前高的时间，取最大值即最长回撤持续时间
+    underwater = hours - hours[peak_pos]
+    return {
+        'max_drawdown': float(drawdown[trough] * 100),
+        'max_drawdown_duration': float(underwater.max()),
+        'max_drawdown_recovery': float(recovery_hours),
+        'peak_time': index[peak_pos[trough]],
+        'trough_time': index[trough],
+        'recovery_time': recovery_time,
+    }
+
+
+def performance_stats(index, equity: np.ndarray, position: np.ndarray = None, traded: float = 0.0) -> dict:
+    """
+    基于逐 bar 盯市资金曲线的绩效指标（全部向量化）。
+
+    参数:
+        index: 与 equity 等长的时间索引
+        equity: 逐 bar 盯市资金
+        position: 逐 bar 持仓方向（0 为空仓），用于持仓时间占比
+        traded: 回测期间的总成交金额（开仓 + 平仓），用于换手率
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    ppy = periods_per_year(index)
+    years = (index[-1] - index[0]).total_seconds() / SECONDS_PER_YEAR if len(index) > 1 else 0.0
+
+    returns = bar_returns(equity)
+    mean = returns.mean() if returns.size else np.nan
+    std = returns.std(ddof=1) if returns.size > 1 else np.nan
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2)) if returns.size else np.nan
+    sharpe = mean / std * np.sqrt(ppy) if std > 0 else np.nan
+    sortino = mean / downside * np.sqrt(ppy) if downside > 0 else np.nan
+
+    annualized_return = ((equity[-1] / equity[0]) ** (1 / years) - 1) * 100 if years > 0 else np.nan
+    stats = drawdown_stats(index, equity)
+    calmar = annualized_return / -stats['max_drawdown'] if stats['max_drawdown'] < 0 else np.nan
+
+    exposure = np.nan
+    if position is not None and len(position):
+        exposure = np.count_nonzero(position) / len(position) * 100
+    turnover = traded / equity.mean() / years if years > 0 else np.nan
+
+    stats.update({
+        'annualized_return': annualized_return,
+        'annualized_volatility': std * np.sqrt(ppy) * 100 if std == std else np.nan,
+        'sharpe': sharpe,
+        'sortino': sortino,
+        'calmar': calmar,
+        'exposure': exposure,
+        'turnover': turnover,
+    })
+    return stats
+
+
+def rolling_stats(index, equity, window, position=None) -> pd.DataFrame:
+    """
+    滚动窗口版本的绩效指标，适合长周期回测观察指标随时间的变化。
+
+    window 为 bar 数，或 '30d' 之类的时间长度；均基于 pandas rolling，整体 O(n)。
+    """
+    equity = pd.Series(np.asarray(equity, dtype=np.float64), index=pd.DatetimeIndex(index))
+    ppy = periods_per_year(equity.index)
+    returns = equity.pct_change()
+    rolling = returns.rolling(window)
+    mean = rolling.mean()
+    std = rolling.std()
+    downside = np.sqrt((returns.clip(upper=0.0) ** 2).rolling(window).mean())
+    peak = equity.rolling(window, min_periods=1).max()
+    log_growth = np.log1p(returns).rolling(window).sum()
+
+    frame = pd.DataFrame({
+        'return': np.expm1(log_growth) * 100,
+        'volatility': std * np.sqrt(ppy) * 100,
+        'sharpe': mean / std.where(std > 0) * np.sqrt(ppy),
+        'sortino': mean / downside.where(downside > 0) * np.sqrt(ppy),
+        # 相对窗口内最高点的回撤
+        'drawdown': (equity / peak - 1) * 100,
+    })
+    if position is not None:
+        frame['exposure'] = pd.Series(np.asarray(position) != 0, index=equity.index).rolling(window).mean() * 100
+    return frame
+
+
+class StreamingStats:
+    """
+    分块累积的 performance_stats：按时间顺序逐块 update，result 返回与一次性计算相同结构的字典，内存与总 bar 数无关。
+
+    回撤、年化收益与持仓占比和一次性计算逐位一致；收益率均值/标准差按块合并（Chan 公式），
+    资金均值按块求和，夏普、波动率、换手率与一次性计算只差浮点舍入误差。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.start = self.end = None
+        self.first_equity = self.last_equity = np.nan
+        self.equity_sum = 0.0
+        self.exposed = 0
+        self.with_position = True
+        # 收益率的个数、均值、离差平方和与下行平方和
+        self.n_returns = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.downside_sq = 0.0
+        # 回撤：当前前高及其时间，最大回撤的谷底、对应前高与收复时间
+        self.peak = -np.inf
+        self.peak_time = None
+        self.peak_hours = 0.0
+        self.max_underwater = 0.0
+        self.trough_drawdown = np.inf
+        self.trough = None
+        self.recovered = True
+
+    def update(self, index, equity: np.ndarray, position: np.ndarray = None):
+        equity = np.asarray(equity, dtype=np.float64)
+        m = equity.shape[0]
+        if m == 0:
+            return
+        index = pd.DatetimeIndex(index)
+        if self.start is None:
+            self.start = index[0]
+            self.first_equity = equity[0]
+
+        returns = bar_returns(equity if self.count == 0 else np.concatenate([[self.last_equity], equity]))
+        if returns.size:
+            mean = returns.mean()
+            m2 = float(((returns - mean) ** 2).sum())
+            total = self.n_returns + returns.size
+            delta = mean - self.mean
+            self.mean += delta * returns.size / total
+            self.m2 += m2 + delta ** 2 * self.n_returns * returns.size / total
+            self.n_returns = total
+            self.downside_sq += float((np.minimum(returns, 0.0) ** 2).sum())
+
+        self._update_drawdown(index, equity)
+
+        self.count += m
+        self.end = index[-1]
+        self.last_equity = equity[-1]
+        self.equity_sum += float(equity.sum())
+        if position is None:
+            self.with_position = False
+        else:
+            self.exposed += np.count_nonzero(position)
+
+    def _update_drawdown(self, index, equity):
+        """与 drawdown_stats 相同的逐 bar 量，前高、谷底与收复状态跨块延续"""
+        positions = np.arange(equity.shape[0])
+        peak = np.maximum(np.maximum.accumulate(equity), self.peak)
+        drawdown = equity / peak - 1
+        # 块内最近一次前高的位置，-1 表示前高在之前的块中
+        peak_pos = np.maximum.accumulate(np.where(equity >= peak, positions, -1))
+        hours = ((index - self.start) / pd.Timedelta(hours=1)).to_numpy()
+        peak_hours = np.where(peak_pos >= 0, hours[np.maximum(peak_pos, 0)], self.peak_hours)
+        self.max_underwater = max(self.max_underwater, float((hours - peak_hours).max()))
+
+        trough = int(np.argmin(drawdown))
+        if drawdown[trough] < self.trough_drawdown:
+            self.trough_drawdown = drawdown[trough]
+            self.trough = {
+                'peak': peak[trough],
+                'hours': hours[trough],
+                'peak_time': index[peak_pos[trough]] if peak_pos[trough] >= 0 else self.peak_time,
+                'trough_time': index[trough],
+                'recovery_hours': np.nan,
+                'recovery_time': None,
+            }
+            self.recovered = False
+            start = trough
+        else:
+            start = 0
+        if not self.recovered:
+            recovered = equity[start:] >= self.trough['peak']
+            if recovered.any():
+                recovery = start + int(np.argmax(recovered))
+                self.trough['recovery_hours'] = hours[recovery] - self.trough['hours']
+                self.trough['recovery_time'] = index[recovery]
+                self.recovered = True
+
+        self.peak = peak[-1]
+        if peak_pos[-1] >= 0:
+            self.peak_hours = hours[peak_pos[-1]]
+            self.peak_time = index[peak_pos[-1]]
+
+    def drawdown_stats(self) -> dict:
+        if self.count == 0 or self.trough_drawdown >= 0:
+            return {'max_drawdown': 0.0, 'max_drawdown_duration': 0.0, 'max_drawdown_recovery': 0.0,
+                    'peak_time': None, 'trough_time': None, 'recovery_time': None}
+        return {
+            'max_drawdown': float(self.trough_drawdown * 100),
+            'max_drawdown_duration': self.max_underwater,
+            'max_drawdown_recovery': float(self.trough['recovery_hours']),
+            'peak_time': self.trough['peak_time'],
+            'trough_time': self.trough['trough_time'],
+            'recovery_time': self.trough['recovery_time'],
+        }
+
+    def result(self, traded: float = 0.0) -> dict:
+        """与 performance_stats(index, equity, position, traded) 相同的字典"""
+        span = (self.end - self.start).total_seconds() if self.count > 1 else 0.0
+        ppy = SECONDS_PER_YEAR * (self.count - 1) / span if span > 0 else np.nan
+        years = span / SECONDS_PER_YEAR
+
+        mean = self.mean if self.n_returns else np.nan
+        std = np.sqrt(self.m2 / (self.n_returns - 1)) if self.n_returns > 1 else np.nan
+        downside = np.sqrt(self.downside_sq / self.n_returns) if self.n_returns else np.nan
+        sharpe = mean / std * np.sqrt(ppy) if std > 0 else np.nan
+        sortino = mean / downside * np.sqrt(ppy) if downside > 0 else np.nan
+
+        annualized_return = ((self.last_equity / self.first_equity) ** (1 / years) - 1) * 100 if years > 0 else np.nan
+        stats = self.drawdown_stats()
+        calmar = annualized_return / -stats['max_drawdown'] if stats['max_drawdown'] < 0 else np.nan
+
+        exposure = self.exposed / self.count * 100 if self.with_position and self.count else np.nan
+        turnover = traded / (self.equity_sum / self.count) / years if years > 0 else np.nan
+
+        stats.update({
+            'annualized_return': annualized_return,
+            'annualized_volatility': std * np.sqrt(ppy) * 100 if std == std else np.nan,
+            'sharpe': sharpe,
+            'sortino': sortino,
+            'calmar': calmar,
+            'exposure': exposure,
+            'turnover': turnover,
+        })
+        return stats
@@ -0,0 +1,132 @@
+import math
+import numpy as np
+import pandas as pd
+
+from strategy import VOLATILITY_WINDOW
+
+
+class RollingStats:
+    """固定窗口的滚动均值/样本标准差：环形缓冲 + Welford 增删，每次更新 O(1)"""
+
+    def __init__(self, window: int, resync_every: int = None):
+        self.window = window
+        self.buffer = np.zeros(window, dtype=np.float64)
+        self.pos = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # 每隔一段时间用缓冲区精确重算一次，防止长时间增删累积浮点误差（均摊后仍为 O(1)）
+        self.resync_every = resync_every or max(window, 1000)
+        self.updates = 0
+
+    def update(self, x: float) -> tuple:
+        """加入新值，返回 (mean, std)；窗口未满时与 pandas rolling 一致返回 NaN"""
+        if self.count < self.window:
+            self.count += 1
+            delta = x - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (x - self.mean)
+        else:
+            old = self.buffer[self.pos]
+            new_mean = self.mean + (x - old) / self.window
+            self.m2 += (x - old) * (x - new_mean + old - self.mean)
+            self.mean = new_mean
+        self.buffer[self.pos] = x
+        self.pos = (self.pos + 1) % self.window
+
+        self.updates += 1
+        if self.updates % self.resync_every == 0 and self.count == self.window:
+            self.mean = float(self.buffer.mean())
+            self.m2 = float(((self.buffer - self.mean) ** 2).sum())
+
+        if self.count < self.window:
+            return math.nan, math.nan
+        std = math.sqrt(max(self.m2, 0.0) / (self.window - 1)) if self.window > 1 else math.nan
+        return self.mean, std
+
+
+class OnlineSignalEngine:
+    """
+    逐 bar 增量信号引擎，与 MeanReversionStrategy.generate_signals 的批量计算逻辑一致。
+
+    每来一根现货/合约 K 线调用一次 update，常数时间输出 premium_pct、zscore、volatility 与 signal。
+    """
+
+    def __init__(self, zscore_window=120, zscore_threshold=2.1, min_volatility=0.05,
+                 volatility_window=VOLATILITY_WINDOW):
+        self.zscore_window = zscore_window
+        self.zscore_threshold = zscore_threshold
+        self.min_volatility = min_volatility
+        self.zscore_stats = RollingStats(zscore_window)
+        self.volatility_stats = RollingStats(volatility_window)
+
+    @classmethod
+    def from_strategy(cls, strategy):
+        """使用已 config 的 MeanReversionStrategy 的参数"""
+        return cls(zscore_window=strategy.zscore_window, zscore_threshold=strategy.zscore_threshold,
+                   min_volatility=strategy.min_volatility)
+
+    def update(self, spot: float, future: float) -> dict:
+        premium_pct = (spot - future) / spot * 100
+        mean, std = self.zscore_stats.update(premium_pct)
+        _, volatility = self.volatility_stats.update(premium_pct)
+        zscore = (premium_pct - mean) / std if std == std and std != 0 else math.nan
+
+        # 原始信号：溢价率高于阈值做空溢价，低于阈值做多溢价
+        signal = 0
+        if zscore > self.zscore_threshold:
+            signal = -1
+        elif zscore < -self.zscore_threshold:
+            signal = 1
+        # 过滤低波动时段（NaN 比较为 False，与批量计算一致）
+        if volatility < self.min_volatility:
+            signal = 0
+        return {'premium_pct': premium_pct, 'zscore': zscore, 'volatility': volatility, 'signal': signal}
+
+    def run(self, spot, future) -> pd.DataFrame:
+        """按顺序把整段序列喂给引擎，便于与批量结果对照"""
+        rows = [self.update(s, f) for s, f in zip(np.asarray(spot, dtype=np.float64).tolist(),
+                                                  np.asarray(future, dtype=np.float64).tolist())]
+        return pd.DataFrame(rows)
+
+
+def benchmark(n=200_000, zscore_window=120, zscore_threshold=2.1, min_volatility=0.05, seed=0):
+    """对比批量 pandas 结果的最大误差，并统计单 bar 更新延迟（微秒）"""
+    import time
+    from strategy import compute_premium_pct, rolling_zscore, compute_volatility, compute_raw_signal, \
+        filter_low_volatility
+    from synthetic import generate_market_data
+
+    market_data = generate_market_data(n, seed=seed)
+    spot = market_data['spot'].to_numpy()
+    future = market_data['future'].to_numpy()
+
+    premium_pct = pd.Series(compute_premium_pct(spot, future))
+    _, _, zscore = rolling_zscore(premium_pct, zscore_window)
+    volatility = compute_volatility(premium_pct)
+    signal = filter_low_volatility(compute_raw_signal(zscore, zscore_threshold), volatility, min_volatility)
+
+    engine = OnlineSignalEngine(zscore_window, zscore_threshold, min_volatility)
+    latencies = np.empty(n)
+    rows = []
+    clock = time.perf_counter_ns
+    for i, (s, f) in enumerate(zip(spot.tolist(), future.tolist())):
+        start = clock()
+        rows.append(engine.update(s, f))
+        latencies[i] = clock() - start
+    online = pd.DataFrame(rows)
+
+    return {
+        'bars': n,
+        'zscore_max_abs_err': float(np.nanmax(np.abs(online['zscore'].to_numpy() - zscore.to_numpy()))),
+        'volatility_max_abs_err': float(np.nanmax(np.abs(online['volatility'].to_numpy() - volatility.to_numpy()))),
+        'signal_mismatches': int((online['signal'].to_numpy() != signal).sum()),
+        'latency_us_p50': float(np.percentile(latencies, 50) / 1000),
+        'latency_us_p99': float(np.percentile(latencies, 99) / 1000),
+        'latency_us_max': float(latencies.max() / 1000),
+    }
+
+
+if __name__ == '__main__':
+    for key, value in benchmark().items():
+        print(f'{key}: {value}')
@@ -0,0 +1,250 @@
+import logging
+import numpy as np
+import pandas as pd
+
+import backtest
+from backtest import backtest_arrays, INITIAL_CAPITAL
+from strategy import VOLATILITY_WINDOW
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba 为可选依赖，未安装时使用 numpy 累加和实现
+    njit = None
+
+
+def _rolling_mean_std_kernel(x, window, mean, std):
+    """逐列单次遍历的滚动和/平方和，列之间并行"""
+    n, k = x.shape
+    for j in prange(k):
+        # 以首个有效值为中心，降低大数相减带来的精度损失
+        center = 0.0
+        for i in range(n):
+            if not np.isnan(x[i, j]):
+                center = x[i, j]
+                break
+        s = 0.0
+        sq = 0.0
+        count = 0
+        for i in range(n):
+            v = x[i, j]
+            if not np.isnan(v):
+                d = v - center
+                s += d
+                sq += d * d
+                count += 1
+            if i >= window:
+                old = x[i - window, j]
+                if not np.isnan(old):
+                    d = old - center
+                    s -= d
+                    sq -= d * d
+                    count -= 1
+            if i >= window - 1 and count == window:
+                m = s / window
+                mean[i, j] = m + center
+                if window > 1:
+                    var = (sq - s * m) / (window - 1)
+                    std[i, j] = np.sqrt(var) if var > 0 else 0.0
+                else:
+                    std[i, j] = np.nan
+            else:
+                mean[i, j] = np.nan
+                std[i, j] = np.nan
+
+
+_jit_rolling = njit(parallel=True, cache=True)(_rolling_mean_std_kernel) if njit is not None else None
+
+
+def rolling_mean_std_2d(x: np.ndarray, window: int) -> tuple:
+    """
+    按列计算固定窗口的滚动均值与样本标准差（ddof=1），一次累加和完成所有列。
+
+    与 pandas rolling(window) 一致：窗口内不足 window 个有效值（含 NaN）时输出 NaN。
+    面板按列优先（Fortran order）存放时每个品种的序列连续，累加和沿时间轴不跨步。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if backtest.ENABLE_JIT and _jit_rolling is not None:
+        mean = np.empty_like(x)
+        std = np.empty_like(x)
+        _jit_rolling(x, window, mean, std)
+        return mean, std
+
+    valid = ~np.isnan(x)
+    has_nan = not valid.all()
+    # 先减去每列首个有效值再累加，降低大数相减带来的精度损失
+    first = np.argmax(valid, axis=0)
+    center = x[first, np.arange(x.shape[1])]
+    center = np.where(np.isnan(center), 0.0, center)
+    y = x - center
+    if has_nan:
+        y[~valid] = 0.0
+
+    mean = np.full_like(y, np.nan)
+    std = np.full_like(y, np.nan)
+    if x.shape[0] < window:
+        return mean, std
+
+    def window_sum(values):
+        csum = np.cumsum(values, axis=0)
+        total = csum[window - 1:].copy(order='K')
+        total[1:] -= csum[:-window]
+        return total
+
+    s = window_sum(y)
+    sq = window_sum(y * y)
+    window_mean = s / window
+    if window > 1:
+        var = sq - s * window_mean
+        var /= window - 1
+        np.maximum(var, 0.0, out=var)
+        std[window - 1:] = np.sqrt(var)
+    mean[window - 1:] = window_mean + center
+    if has_nan:
+        full = window_sum(valid.astype(np.float64)) == window
+        mean[window - 1:][~full] = np.nan
+        std[window - 1:][~full] = np.nan
+    return mean, std
+
+
+def panel_signals(spot: np.ndarray, future: np.ndarray, zscore_window=120, zscore_threshold=2.1,
+                  min_volatility=0.05, volatility_window=VOLATILITY_WINDOW) -> dict:
+    """对 (bars × symbols) 的价格面板批量计算溢价率、zscore、波动率与信号"""
+    premium_pct = (spot - future) / spot * 100
+    mean, std = rolling_mean_std_2d(premium_pct, zscore_window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zscore = (premium_pct - mean) / std
+    _, volatility = rolling_mean_std_2d(premium_pct, volatility_window)
+
+    signal = np.zeros(premium_pct.shape, dtype=np.int8, order='F')
+    signal[zscore > zscore_threshold] = -1  # 做空溢价：做空现货、做多合约
+    signal[zscore < -zscore_threshold] = 1  # 做多溢价：做多现货、做空合约
+    signal[volatility < min_volatility] = 0  # 过滤低波动时段
+    return {'premium_pct': premium_pct, 'mean_premium_pct': mean, 'std': std,
+            'zscore': zscore, 'volatility': volatility, 'signal': signal}
+
+
+def run_backtest_panel(index, spot, future, signal, symbols, initial_capital=INITIAL_CAPITAL, **params) -> tuple:
+    """
+    对面板中的每个品种分别回测。
+
+    返回 (positions, metrics)：positions 为 {symbol: position_history}，
+    metrics 为每个品种一行的指标表；params 同 run_backtest 的回测参数。
+    """
+    index = pd.DatetimeIndex(index)
+    positions = {}
+    rows = []
+    for j, symbol in enumerate(symbols):
+        spot_j, future_j, signal_j, index_j = spot[:, j], future[:, j], signal[:, j], index
+        # 只在现货、合约都有报价的 bar 上回测
+        valid = ~(np.isnan(spot_j) | np.isnan(future_j))
+        if not valid.all():
+            spot_j, future_j, signal_j, index_j = spot_j[valid], future_j[valid], signal_j[valid], index[valid]
+        position_history, metrics = backtest_arrays(
+            index_j, spot_j, future_j, signal_j,
+            initial_capital=initial_capital, raw_metrics=True, **params)
+        positions[symbol] = position_history
+        if not metrics:
+            metrics = {"初始资金": initial_capital, "最终资金": initial_capital, "交易次数": 0}
+        rows.append({'symbol': symbol, **metrics})
+    return positions, pd.DataFrame(rows).set_index('symbol')
+
+
+class PanelStrategy:
+    """多品种批量版均值回归策略：现货、合约收盘价存为 (bars × symbols) 面板"""
+
+    def __init__(self):
+        pass
+
+    def config(self, symbols=('BTC/USDT',), timeframe='5m', range='1y', start_time='2024-01-01 00:00:00',
+               zscore_window=120, zscore_threshold=2.1, min_volatility=0.05):
+        self.SYMBOLS = list(symbols)
+        self.TIMEFRAME = timeframe
+        self.RANGE = range
+        self.START_TIME = start_time
+
+        self.zscore_window = zscore_window        # 窗口
+        self.zscore_threshold = zscore_threshold    # 阈值
+        self.min_volatility = min_volatility    # 最小波动率
+
+    def load_data(self):
+        """并发下载全部品种的现货与合约数据，并对齐为面板"""
+        from datafetcher import DataFetcher
+
+        fetcher = DataFetcher()
+        request = dict(start_time=self.START_TIME, range=self.RANGE, timeframe=self.TIMEFRAME)
+        requests = [dict(request, symbol=symbol, contract_type=contract_type)
+                    for symbol in self.SYMBOLS for contract_type in ('spot', 'future')]
+        frames = fetcher.fetch_many(requests)
+        spot = pd.concat({s: frames[2 * i]['close'] for i, s in enumerate(self.SYMBOLS)}, axis=1)
+        future = pd.concat({s: frames[2 * i + 1]['close'] for i, s in enumerate(self.SYMBOLS)}, axis=1)
+        # 单个品种内部仍按现货、合约同时存在对齐
+        spot = spot.where(future.notna())
+        future = future.where(spot.notna())
+        self.load_panel(spot.index, spot.to_numpy(), future.to_numpy(), self.SYMBOLS)
+
+    def load_panel(self, index, spot, future, symbols):
+        """直接导入已对齐的面板数据"""
+        self.index = pd.DatetimeIndex(index)
+        # 列优先存放：每个品种的时间序列在内存中连续
+        self.spot = np.asfortranarray(spot, dtype=np.float64)
+        self.future = np.asfortranarray(future, dtype=np.float64)
+        self.SYMBOLS = list(symbols)
+
+    def generate_signals(self):
+        """一次性计算全部品种的信号"""
+        self.signals = panel_signals(self.spot, self.future, self.zscore_window,
+                                     self.zscore_threshold, self.min_volatility)
+        return self.signals
+
+    def run_backtest(self, **params):
+        return run_backtest_panel(self.index, self.spot, self.future, self.signals['signal'],
+                                  self.SYMBOLS, **params)
+
+
+def benchmark(n_bars=105_120, symbol_counts=(1, 10, 50), seed=0):
+    """对比面板批量路径与逐品种循环 MeanReversionStrategy 的耗时（秒）"""
+    import time
+    from strategy import MeanReversionStrategy
+    from synthetic import generate_panel
+    import strategy
+
+    debug = strategy.ENABLE_DEBUG, backtest.ENABLE_DEBUG
+    strategy.ENABLE_DEBUG = backtest.ENABLE_DEBUG = False
+    results = []
+    try:
+        for n_symbols in symbol_counts:
+            index, spot, future = generate_panel(n_bars, n_symbols, seed=seed + n_symbols)
+            symbols = [f'SYM{j}/USDT' for j in range(n_symbols)]
+            # 预热 JIT，不计入耗时
+            warmup = panel_signals(np.asfortranarray(spot[:1000]), np.asfortranarray(future[:1000]))
+            run_backtest_panel(index[:1000], spot[:1000], future[:1000], warmup['signal'], symbols)
+
+            start = time.perf_counter()
+            engine = PanelStrategy()
+            engine.config(symbols=symbols)
+            engine.load_panel(index, spot, future, symbols)
+            engine.generate_signals()
+            _, panel_metrics = engine.run_backtest()
+            panel_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            mismatches = 0
+            for j, symbol in enumerate(symbols):
+                single = MeanReversionStrategy()
+                single.config(symbol=symbol)
+                single.market_data = pd.DataFrame({'spot': spot[:, j], 'future': future[:, j]}, index=index)
+                single.generate_signals()
+                backtest.run_backtest(single.market_data)
+                mismatches += int((single.market_data['signal'].to_numpy() != engine.signals['signal'][:, j]).sum())
+            loop_time = time.perf_counter() - start
+
+            results.append({'symbols': n_symbols, 'bars': n_bars, 'panel_s': panel_time, 'loop_s': loop_time,
+                            'speedup': loop_time / panel_time, 'signal_mismatches': mismatches})
+            logging.info(results[-1])
+    finally:
+        strategy.ENABLE_DEBUG, backtest.ENABLE_DEBUG = debug
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    print(benchmark().to_string())
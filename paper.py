@@ -0,0 +1,376 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+import backtest
+from backtest import CLOSE_TYPES
+from online import OnlineSignalEngine
+
+LATENCY_PERCENTILES = (50, 90, 99)
+MARKETS = ('spot', 'future')
+
+
+class PaperBroker:
+    """
+    逐 bar 模拟撮合，开仓/平仓规则与 backtest._backtest_kernel 完全相同。
+
+    成交成本由 backtest.cost_arrays 按本 bar 的价格与成交量计算（入场取入场 bar、出场取当前 bar 的成本），
+    启用资金费时持仓期间按本 bar 结算的费率累计资金费。
+    每次 on_bar 返回本 bar 的成交记录（开仓或平仓），无成交时返回 None。
+    """
+
+    def __init__(self, initial_capital=None, leverage=None, take_profit=None, stop_loss=None,
+                 position_ratio=None, enable_fee=None, enable_slippage=None, enable_funding=None):
+        # 未指定的参数在构造时取 backtest 模块的当前配置
+        self.leverage = backtest._setting(leverage, 'LEVERAGE')
+        self.take_profit = backtest._setting(take_profit, 'TAKE_PROFIT')
+        self.stop_loss = backtest._setting(stop_loss, 'STOP_LOSS')
+        self.position_ratio = backtest._setting(position_ratio, 'POSITION_RATIO')
+        self.enable_fee = backtest._setting(enable_fee, 'ENABLE_FEE')
+        self.enable_slippage = backtest._setting(enable_slippage, 'ENABLE_SLIPPAGE')
+        self.enable_funding = backtest._setting(enable_funding, 'ENABLE_FUNDING')
+
+        self.initial_capital = backtest._setting(initial_capital, 'INITIAL_CAPITAL')
+        # 与 backtest_arrays 相同，下单金额按初始资金估计
+        self.order_notional = self.initial_capital * self.position_ratio * 0.5
+        self.capital = float(self.initial_capital)
+        self.direction = 0
+        self.size = 0.0
+        self.entry = None
+        self.funding_pnl = 0.0
+        self.fills = []
+        self.trades = []
+
+    def _costs(self, spot, future, spot_volume, future_volume, funding_rate):
+        """本 bar 的 (现货成本, 合约成本, 资金费率)"""
+        volumes = {} if spot_volume is None or future_volume is None else \
+            {'spot_volume': [spot_volume], 'future_volume': [future_volume]}
+        cost_spot, cost_future, funding = backtest.cost_arrays(
+            1, self.enable_fee, self.enable_slippage, self.enable_funding, spot=[spot], future=[future],
+            funding_rate=[funding_rate], order_notional=self.order_notional, leverage=self.leverage, **volumes)
+        return float(cost_spot[0]), float(cost_future[0]), float(funding[0])
+
+    def _pnl(self, spot, future, cost_spot, cost_future):
+        entry = self.entry
+        if self.direction == 1:
+            spot_pnl = (spot / entry['spot']) * ((1 - entry['cost_spot']) * (1 - cost_spot)) - 1
+            future_pnl = (1 - entry['cost_future']) - (future / entry['future']) / (1 - cost_future)
+        else:
+            spot_pnl = (1 - entry['cost_spot']) - (spot / entry['spot']) / (1 - cost_spot)
+            future_pnl = (future / entry['future']) * ((1 - entry['cost_future']) * (1 - cost_future)) - 1
+        return spot_pnl * 0.5 + future_pnl * 0.5 * self.leverage + self.funding_pnl
+
+    def on_bar(self, time, spot, future, signal, spot_volume=None, future_volume=None, funding_rate=0.0):
+        """
+        处理一根对齐的 bar；spot_volume/future_volume 为本 bar 成交量（启用滑点时按成交额计算滑点），
+        funding_rate 为本 bar 结算的资金费率（无结算为 0）
+        """
+        cost_spot, cost_future, funding = self._costs(spot, future, spot_volume, future_volume, funding_rate)
+        if self.direction != 0:
+            if funding != 0:
+                self.funding_pnl += self.direction * funding * 0.5 * self.leverage * future / self.entry['future']
+            pnl = self._pnl(spot, future, cost_spot, cost_future)
+            code = 0
+            if pnl < -1:
+                code = 1
+            elif pnl >= self.take_profit:
+                code = 2
+            elif pnl <= -self.stop_loss:
+                code = 3
+            elif signal == -self.direction and pnl > 0:
+                code = 4
+            if code == 0:
+                return None
+            self.capital += (1 + pnl) * self.size
+            fill = {'time': time, 'action': 'close', 'direction': self.direction, 'spot': spot, 'future': future,
+                    'size': self.size, 'pnl': pnl, 'close_type': CLOSE_TYPES[code], 'capital': self.capital}
+            self.trades.append({
+                'initial_capital': self.entry['capital'],
+                'type': 'long' if self.direction == 1 else 'short',
+                'entry_time': self.entry['time'],
+                'leverage': self.leverage,
+                'pnl': pnl * 100,
+                'exit_time': time,
+                'duration': (time - self.entry['time']).total_seconds() / 3600,
+                'close_type': CLOSE_TYPES[code],
+                'final_capital': self.capital,
+            })
+            self.direction = 0
+        elif signal != 0:
+            self.direction = int(signal)
+            self.size = self.capital * self.position_ratio
+            self.entry = {'time': time, 'spot': spot, 'future': future, 'capital': self.capital,
+                          'cost_spot': cost_spot, 'cost_future': cost_future}
+            self.funding_pnl = 0.0
+            self.capital -= self.size
+            fill = {'time': time, 'action': 'open', 'direction': self.direction, 'spot': spot, 'future': future,
+                    'size': self.size, 'pnl': None, 'close_type': None, 'capital': self.capital}
+        else:
+            return None
+        self.fills.append(fill)
+        return fill
+
+    def position_history(self) -> pd.DataFrame:
+        """与 run_backtest 相同结构的已平仓交易记录"""
+        return pd.DataFrame(self.trades)
+
+
+class BarAligner:
+    """
+    按时间戳对齐到达的现货/合约 K 线：两条腿都到齐才输出，等价于 pd.merge(how='inner')。
+
+    每条腿内部按时间顺序到达，因此比最新已对齐时间更早的未配对 K 线不可能再配对，直接丢弃。
+    """
+
+    def __init__(self, markets=MARKETS):
+        self.markets = markets
+        self.pending = {}
+        self.last_emitted = None
+
+    def add(self, market, timestamp, bar):
+        """加入一条腿的 K 线，两条腿到齐时返回 {market: bar}，否则返回 None"""
+        if self.last_emitted is not None and timestamp <= self.last_emitted:
+            return None
+        legs = self.pending.setdefault(timestamp, {})
+        legs[market] = bar
+        if len(legs) < len(self.markets):
+            return None
+        del self.pending[timestamp]
+        self.last_emitted = timestamp
+        for stale in [ts for ts in self.pending if ts < timestamp]:
+            del self.pending[stale]
+        return legs
+
+
+class ReplayServer:
+    """
+    本地行情回放服务器，代替交易所推送已缓存的现货/合约 K 线。
+
+    每个连接收到按时间顺序的 JSON 行 {"market", "timestamp", "open", ..., "volume", "sent_ns"}，
+    最后一行为 {"type": "end"}。speed 为相对真实时间的倍速（如 60 表示 5m K 线每 5 秒一根），
+    None 或 0 表示尽快发送；shuffle_legs=True 时同一根 K 线两条腿的发送顺序随机，用于检验对齐逻辑。
+    """
+
+    def __init__(self, spot: pd.DataFrame, future: pd.DataFrame, speed=None, host='127.0.0.1', port=0,
+                 shuffle_legs=False, seed=None):
+        self.frames = {'spot': spot, 'future': future}
+        self.speed = speed
+        self.host = host
+        self.port = port
+        self.shuffle_legs = shuffle_legs
+        self.random = random.Random(seed)
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def _events(self):
+        """按时间戳合并两条腿的 K 线，生成 (timestamp_ms, [(market, 行数据), ...])"""
+        columns = {}
+        for market, df in self.frames.items():
+            timestamp = df.index.values.astype('datetime64[ms]').astype(np.int64)
+            columns[market] = (timestamp, df[['open', 'high', 'low', 'close', 'volume']].to_numpy().tolist())
+        all_timestamps = np.union1d(columns['spot'][0], columns['future'][0])
+        positions = {market: np.searchsorted(ts, all_timestamps) for market, (ts, _) in columns.items()}
+        for i, timestamp in enumerate(all_timestamps.tolist()):
+            legs = []
+            for market, (ts, rows) in columns.items():
+                j = positions[market][i]
+                if j < len(ts) and ts[j] == timestamp:
+                    legs.append((market, rows[j]))
+            yield timestamp, legs
+
+    async def _handle(self, reader, writer):
+        previous = None
+        try:
+            for timestamp, legs in self._events():
+                if self.speed and previous is not None:
+                    await asyncio.sleep((timestamp - previous) / 1000 / self.speed)
+                previous = timestamp
+                if self.shuffle_legs:
+                    self.random.shuffle(legs)
+                for market, (o, h, l, c, v) in legs:
+                    message = {'market': market, 'timestamp': timestamp, 'open': o, 'high': h, 'low': l,
+                               'close': c, 'volume': v, 'sent_ns': time.time_ns()}
+                    writer.write(json.dumps(message).encode() + b'\n')
+                await writer.drain()
+            writer.write(b'{"type": "end"}\n')
+            await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            logging.warning("回放客户端已断开")
+        finally:
+            writer.close()
+
+
+class PaperTrader:
+    """
+    异步模拟交易：订阅现货/合约 K 线流，对齐后驱动增量信号引擎与模拟撮合，并统计决策延迟。
+
+    延迟口径:
+        bar_close_to_decision: 两条腿中较晚的 K 线收盘推送时刻（服务器 sent_ns）到完成下单决策的时间
+        receive_to_decision: 本地收到配对 K 线到完成决策的时间（仅本进程处理耗时）
+
+    尽速回放（speed=None）时推送快于消费，bar_close_to_decision 会包含排队时间，测量延迟应设置 speed。
+    funding 为资金费率结算记录（以结算时间为索引的 Series，如 DataFetcher.fetch_funding 的结果），
+    按 backtest.funding_per_bar 的规则计入结算时刻及之后的第一根对齐 bar。
+    """
+
+    def __init__(self, engine: OnlineSignalEngine, broker: PaperBroker, funding: pd.Series = None):
+        self.engine = engine
+        self.broker = broker
+        funding = funding.sort_index() if funding is not None else pd.Series(dtype=np.float64)
+        self.funding_times = funding.index.values.astype('datetime64[ms]').astype(np.int64)
+        self.funding_rates = funding.to_numpy(dtype=np.float64)
+        self.funding_pos = 0
+        self.aligner = BarAligner()
+        self.bar_close_latency = []
+        self.receive_latency = []
+        self.bars = 0
+        self.signals = []
+
+    def _funding_at(self, timestamp) -> float:
+        """本 bar 结算的资金费率之和：首根 bar 只计入不早于它的结算，之后计入上一根 bar 之后的结算"""
+        if self.bars == 0:
+            self.funding_pos = int(np.searchsorted(self.funding_times, timestamp, side='left'))
+        end = int(np.searchsorted(self.funding_times, timestamp, side='right'))
+        rate = float(self.funding_rates[self.funding_pos:end].sum()) if end > self.funding_pos else 0.0
+        self.funding_pos = max(self.funding_pos, end)
+        return rate
+
+    def on_message(self, message, received_ns):
+        """处理一条 K 线推送；两条腿到齐时做出决策并返回成交记录"""
+        legs = self.aligner.add(message['market'], message['timestamp'], message)
+        if legs is None:
+            return None
+        spot, future = legs['spot'], legs['future']
+        result = self.engine.update(spot['close'], future['close'])
+        bar_time = pd.Timestamp(message['timestamp'], unit='ms')
+        fill = self.broker.on_bar(bar_time, spot['close'], future['close'], result['signal'],
+                                  spot['volume'], future['volume'], self._funding_at(message['timestamp']))
+        decided_ns = time.time_ns()
+        self.bar_close_latency.append(decided_ns - max(spot['sent_ns'], future['sent_ns']))
+        self.receive_latency.append(decided_ns - received_ns)
+        self.signals.append(result['signal'])
+        self.bars += 1
+        if fill is not None:
+            logging.debug(f"模拟成交: {fill}")
+        return fill
+
+    async def run(self, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=2**20)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                received_ns = time.time_ns()
+                message = json.loads(line)
+                if message.get('type') == 'end':
+                    break
+                self.on_message(message, received_ns)
+        finally:
+            writer.close()
+        return self.report()
+
+    def report(self) -> dict:
+        def percentiles(samples):
+            if not samples:
+                return {}
+            us = np.asarray(samples, dtype=np.float64) / 1000
+            stats = {f'p{p}': float(np.percentile(us, p)) for p in LATENCY_PERCENTILES}
+            stats['max'] = float(us.max())
+            return stats
+
+        return {
+            'bars': self.bars,
+            'fills': len(self.broker.fills),
+            'trades': len(self.broker.trades),
+            'capital': self.broker.capital,
+            'bar_close_to_decision_us': percentiles(self.bar_close_latency),
+            'receive_to_decision_us': percentiles(self.receive_latency),
+        }
+
+
+async def replay_paper_trading(spot: pd.DataFrame, future: pd.DataFrame, engine: OnlineSignalEngine = None,
+                               broker: PaperBroker = None, speed=None, shuffle_legs=True,
+                               funding: pd.Series = None) -> tuple:
+    """在同一事件循环中启动回放服务器并运行模拟交易，返回 (trader, report)"""
+    engine = engine or OnlineSignalEngine()
+    broker = broker or PaperBroker()
+    server = ReplayServer(spot, future, speed=speed, shuffle_legs=shuffle_legs)
+    port = await server.start()
+    trader = PaperTrader(engine, broker, funding)
+    try:
+        report = await trader.run(server.host, port)
+    finally:
+        await server.close()
+    return trader, report
+
+
+def check_parity(spot: pd.DataFrame, future: pd.DataFrame, engine_params=None, funding: pd.Series = None) -> dict:
+    """尽速回放后与批量信号 + run_backtest 的结果对照，返回信号差异数与交易记录是否一致"""
+    from alignment import align_legs
+    from strategy import signals_from_prices, _leg
+
+    engine_params = engine_params or {'zscore_window': 120, 'zscore_threshold': 2.1, 'min_volatility': 0.05}
+    trader, report = asyncio.run(replay_paper_trading(spot, future, OnlineSignalEngine(**engine_params),
+                                                      funding=funding))
+    # 与 strategy.load_data 相同的行情结构：收盘价、成交量与逐 bar 资金费率
+    market_data, _ = align_legs({'spot': _leg(spot, 'spot'), 'future': _leg(future, 'future')}, policy='inner')
+    market_data['funding_rate'] = backtest.funding_per_bar(market_data.index, funding)
+    market_data['signal'] = signals_from_prices(market_data['spot'].to_numpy(), market_data['future'].to_numpy(),
+                                                **engine_params)
+    debug = backtest.ENABLE_DEBUG
+    backtest.ENABLE_DEBUG = False
+    try:
+        expected, _ = backtest.run_backtest(market_data)
+    finally:
+        backtest.ENABLE_DEBUG = debug
+    actual = trader.broker.position_history()
+    same = len(actual) == len(expected) and (
+        expected.empty or np.allclose(actual['final_capital'].to_numpy(), expected['final_capital'].to_numpy()))
+    return {
+        'signal_mismatches': int((np.asarray(trader.signals) != market_data['signal'].to_numpy()).sum()),
+        'trades_match': bool(same),
+        **report,
+    }
+
+
+if __name__ == '__main__':
+    from datafetcher import DataFetcher
+    from strategy import MeanReversionStrategy
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    strategy = MeanReversionStrategy()
+    strategy.config(range='30d')
+    request = dict(symbol=strategy.SYMBOL, start_time=strategy.START_TIME, range=strategy.RANGE,
+                   timeframe=strategy.TIMEFRAME)
+    # 回放 database/ 中已缓存的数据（缓存已覆盖时不会产生网络请求）
+    fetcher = DataFetcher()
+    spot, future = fetcher.fetch_many([dict(request, contract_type='spot'), dict(request, contract_type='future')])
+    funding = fetcher.fetch_funding(symbol=strategy.SYMBOL, start_time=strategy.START_TIME, range=strategy.RANGE)
+    result = check_parity(spot, future, {'zscore_window': strategy.zscore_window,
+                                         'zscore_threshold': strategy.zscore_threshold,
+                                         'min_volatility': strategy.min_volatility}, funding)
+    for key, value in result.items():
+        print(f'{key}: {value}')
+
+    # 按节奏回放最近 2000 根 K 线（每根间隔约 2ms）测量决策延迟
+    timeframe_ms = DataFetcher()._timeframe_to_ms(strategy.TIMEFRAME)
+    _, report = asyncio.run(replay_paper_trading(spot.iloc[-2000:], future.iloc[-2000:],
+                                                 OnlineSignalEngine.from_strategy(strategy),
+                                                 speed=timeframe_ms / 2))
+    print(f"bar_close_to_decision_us: {report['bar_close_to_decision_us']}")
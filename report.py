@@ -0,0 +1,213 @@
+import html
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# 直接使用 Figure 而非 pyplot：不经过全局状态机与交互后端，savefig 按格式选择 Agg/SVG 渲染器
+from matplotlib.figure import Figure
+import numpy as np
+import pandas as pd
+
+from backtest import backtest_arrays, INITIAL_CAPITAL
+from strategy import compute_premium_pct, rolling_zscore, compute_volatility, compute_raw_signal, \
+    filter_low_volatility
+from sweep import SharedMarketData, _attach, _split_params, _cost_kwargs, SIGNAL_PARAMS, BACKTEST_PARAMS
+from visualizer import Visualizer
+
+REPORT_DIR = 'reports'
+FIGSIZE = (15, 4)    # 每个图表面板的尺寸
+DPI = 100
+
+# worker 进程内的共享数据、Visualizer 与复用的 Figure
+_shared = {}
+
+
+def _init_worker(handles: dict, visualizer: Visualizer):
+    _shared.update(_attach(handles))
+    _shared['visualizer'] = visualizer
+    _shared['figure'] = Figure(dpi=DPI)
+    visualizer._configure_plot()
+
+
+def _report_frame(arrays, signal_params) -> pd.DataFrame:
+    """重建图表所需的列（与 generate_signals 的输出列同名）"""
+    premium_pct = pd.Series(compute_premium_pct(arrays['spot'], arrays['future']))
+    mean, _, zscore = rolling_zscore(premium_pct, signal_params['zscore_window'])
+    raw_signal = compute_raw_signal(zscore, signal_params['zscore_threshold'])
+    signal = filter_low_volatility(raw_signal, compute_volatility(premium_pct), signal_params['min_volatility'])
+    return pd.DataFrame({
+        'spot': arrays['spot'],
+        'future': arrays['future'],
+        'premium': arrays['spot'] - arrays['future'],
+        'premium_pct': premium_pct.to_numpy(),
+        'mean_premium_pct': mean.to_numpy(),
+        'signal': signal,
+    }, index=arrays['index'])
+
+
+def _render(name, params, out_dir, formats, charts, initial_capital) -> dict:
+    """回测一组参数并把注册的图表渲染为图片，返回索引页所需的条目"""
+    arrays = _shared['arrays']
+    visualizer = _shared['visualizer']
+    signal_params, backtest_params = _split_params(params)
+    market_data = _report_frame(arrays, signal_params)
+    position_history, metrics = backtest_arrays(
+        market_data.index, arrays['spot'], arrays['future'], market_data['signal'].to_numpy(),
+        initial_capital=initial_capital, raw_metrics=True, **_cost_kwargs(arrays), **backtest_params)
+    if not metrics:
+        # 与 run_sweep 相同：没有交易的组合也有可排序的指标
+        metrics = {"初始资金": initial_capital, "最终资金": initial_capital, "交易次数": 0}
+
+    # 复用同一个 Figure：清空后重画，省去每张图重新创建 Figure/Canvas 的开销
+    charts = list(charts or visualizer.charts)
+    fig = _shared['figure']
+    fig.clear()
+    fig.set_size_inches(FIGSIZE[0], FIGSIZE[1] * len(charts))
+    visualizer.draw_charts(fig, market_data, position_history, charts)
+    files = []
+    for fmt in formats:
+        path = os.path.join(out_dir, f'{name}.{fmt}')
+        fig.savefig(path, format=fmt)
+        files.append(os.path.basename(path))
+    return {'name': name, 'params': params, 'metrics': metrics, 'files': files, 'charts': len(charts)}
+
+
+def _union_keys(dicts) -> list:
+    """多个字典的键按首次出现的顺序合并"""
+    return list(dict.fromkeys(key for d in dicts for key in d))
+
+
+def _metric_cell(value) -> str:
+    if value is None:
+        return '<td></td>'
+    if isinstance(value, (int, float, np.number)):
+        return f'<td>{value:.4g}</td>'
+    return f'<td>{html.escape(str(value))}</td>'
+
+
+def write_index(out_dir, entries, sort_by=None) -> str:
+    """生成汇总页：每个报告一行参数与指标，并内嵌图片链接；表头取所有报告的参数与指标的并集，缺失的单元格留空"""
+    param_keys = _union_keys(entry['params'] for entry in entries)
+    metric_keys = _union_keys(entry['metrics'] for entry in entries)
+    rows = []
+    for entry in entries:
+        cells = ''.join(f'<td>{html.escape(str(entry["params"][k]))}</td>' if k in entry['params'] else '<td></td>'
+                        for k in param_keys)
+        metrics = ''.join(_metric_cell(entry['metrics'].get(k)) for k in metric_keys)
+        images = ''.join(f'<a href="{html.escape(f)}"><img src="{html.escape(f)}" width="480"></a>'
+                         for f in entry['files'] if not f.endswith('.svg')) or \
+            ''.join(f'<a href="{html.escape(f)}">{html.escape(f)}</a> ' for f in entry['files'])
+        rows.append(f'<tr><td>{html.escape(entry["name"])}</td>{cells}{metrics}<td>{images}</td></tr>')
+    header = ''
+    if entries:
+        columns = ['报告', *param_keys, *metric_keys, '图表']
+        header = '<tr>' + ''.join(f'<th>{html.escape(str(c))}</th>' for c in columns) + '</tr>'
+    title = f'回测报告（按 {sort_by} 排序）' if sort_by else '回测报告'
+    page = (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title>'
+            '<style>table{border-collapse:collapse;font-size:12px}td,th{border:1px solid #ccc;padding:2px 6px}'
+            '</style></head><body>'
+            f'<h1>{title}</h1><table>{header}{"".join(rows)}</table></body></html>')
+    path = os.path.join(out_dir, 'index.html')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return path
+
+
+def render_reports(market_data: pd.DataFrame, params: list, out_dir=REPORT_DIR, visualizer: Visualizer = None,
+                   charts=None, formats=('png',), n_jobs=None, initial_capital=INITIAL_CAPITAL,
+                   sort_by=None) -> dict:
+    """
+    在进程池中无界面批量渲染多组参数的回测报告。
+
+    参数:
+        market_data: 含 spot/future 列、按时间对齐的 DataFrame（价格序列通过共享内存传给 worker）
+        params: 参数字典列表，如 run_sweep 结果中排名靠前的若干行
+        visualizer: 已 link_strategy 的 Visualizer，自定义图表须为可 pickle 的函数（不能是 lambda）
+        charts: 要绘制的图表键，默认全部注册的图表
+        formats: 输出格式，如 ('png', 'svg')
+
+    返回 {'index': 汇总页路径, 'entries': [...], 'seconds': 耗时, 'charts_per_s': 吞吐}
+    """
+    if visualizer is None:
+        raise ValueError("需要传入已 link_strategy 的 Visualizer。")
+    os.makedirs(out_dir, exist_ok=True)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    tasks = [(f'report_{i:04d}', p, out_dir, tuple(formats), charts, initial_capital) for i, p in enumerate(params)]
+    logging.info(f"批量渲染: {len(tasks)} 份报告, {n_jobs} 个进程")
+
+    start = time.perf_counter()
+    with SharedMarketData(market_data) as shared:
+        if n_jobs == 1:
+            _init_worker(shared.handles(), visualizer)
+            try:
+                entries = [_render(*task) for task in tasks]
+            finally:
+                _shared.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                     initargs=(shared.handles(), visualizer)) as pool:
+                entries = list(pool.map(_render, *zip(*tasks)))
+    seconds = time.perf_counter() - start
+
+    if sort_by:
+        entries.sort(key=lambda e: -np.inf if e['metrics'].get(sort_by) is None else e['metrics'][sort_by],
+                     reverse=True)
+    n_charts = sum(entry['charts'] for entry in entries)
+    return {
+        'index': write_index(out_dir, entries, sort_by),
+        'entries': entries,
+        'seconds': seconds,
+        'charts_per_s': n_charts / seconds if seconds > 0 else np.nan,
+    }
+
+
+def sweep_params(results: pd.DataFrame, top=20, sort_by='最终资金') -> list:
+    """从 run_sweep 的结果表中取排名靠前的参数组合"""
+    keys = [k for k in (*SIGNAL_PARAMS, *BACKTEST_PARAMS) if k in results.columns]
+    # to_dict('records') 按列保留 dtype，整数参数（如 zscore_window）不会被转成浮点
+    return results.sort_values(sort_by, ascending=False).head(top)[keys].to_dict('records')
+
+
+def benchmark(n_bars=100_000, n_reports=16, n_jobs=None, formats=('png',), seed=0) -> dict:
+    """合成数据上的批量渲染吞吐（图表/秒）"""
+    import tempfile
+    import visualizer as visualizer_module
+    from strategy import MeanReversionStrategy
+    from sweep import param_sample
+    from synthetic import generate_market_data
+
+    visualizer_module.ENABLE_DEBUG = False
+    market_data = generate_market_data(n_bars, seed=seed)
+    engine = MeanReversionStrategy()
+    engine.config()
+    visualizer = Visualizer()
+    visualizer.link_strategy(engine)
+    params = param_sample({'zscore_window': (60, 240), 'zscore_threshold': (1.8, 3.0)}, n_reports, seed=seed)
+    with tempfile.TemporaryDirectory() as out_dir:
+        result = render_reports(market_data, params, out_dir, visualizer, formats=formats, n_jobs=n_jobs)
+    return {'bars': n_bars, 'reports': n_reports, 'seconds': result['seconds'],
+            'charts_per_s': result['charts_per_s']}
+
+
+if __name__ == '__main__':
+    from strategy import MeanReversionStrategy
+    from sweep import run_sweep, param_grid
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    engine = MeanReversionStrategy()
+    engine.config()
+    engine.load_data()
+    visualizer = Visualizer()
+    visualizer.link_strategy(engine)
+
+    space = {
+        'zscore_window': [60, 120, 240],
+        'zscore_threshold': [1.8, 2.1, 2.5],
+        'take_profit': [0.01, 0.02],
+    }
+    results = run_sweep(engine.market_data, param_grid(space))
+    report = render_reports(engine.market_data, sweep_params(results, top=10), visualizer=visualizer,
+                            formats=('png', 'svg'), sort_by='最终资金')
+    print(f"报告索引: {report['index']}，{report['charts_per_s']:.2f} 图表/秒")
@@ -0,0 +1,242 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from metrics import periods_per_year, SECONDS_PER_YEAR
+
+CONFIDENCE = 0.95
+CHUNK_SIZE = 10_000    # 每个任务的重采样次数
+CHUNK_ELEMENTS = 4_000_000    # 逐笔重采样时每个任务的样本矩阵元素上限，控制内存
+STATS_ROWS = 4096      # 计算块统计量时每批处理的起点数，控制临时内存
+
+# worker 进程内的块统计量
+_tables = {}
+
+
+def _window_stats(log_growth: np.ndarray, returns: np.ndarray, length: int) -> dict:
+    """
+    以每个位置为起点、长度为 length 的（循环）块的统计量，重采样时按块拼接即可得到整条路径的结果。
+
+    total: 块内对数增长之和；peak/trough: 块内累计对数增长的最大/最小前缀（含起点 0）；
+    drawdown: 块内最大回撤（对数）；sum/sum_sq: 收益率之和与平方和（用于夏普）
+    """
+    n = len(returns)
+    wrapped_log = np.concatenate([log_growth, log_growth[:length]])
+    wrapped_ret = np.concatenate([returns, returns[:length]])
+    cum_log = np.concatenate([[0.0], np.cumsum(wrapped_log)])
+    cum_ret = np.concatenate([[0.0], np.cumsum(wrapped_ret)])
+    cum_sq = np.concatenate([[0.0], np.cumsum(wrapped_ret ** 2)])
+    starts = np.arange(n)
+
+    table = {
+        'total': cum_log[starts + length] - cum_log[starts],
+        'sum': cum_ret[starts + length] - cum_ret[starts],
+        'sum_sq': cum_sq[starts + length] - cum_sq[starts],
+        'peak': np.empty(n),
+        'trough': np.empty(n),
+        'drawdown': np.empty(n),
+    }
+    windows = np.lib.stride_tricks.sliding_window_view(cum_log, length + 1)
+    for lo in range(0, n, STATS_ROWS):
+        hi = min(lo + STATS_ROWS, n)
+        path = windows[lo:hi] - cum_log[lo:hi, None]
+        running_peak = np.maximum.accumulate(path, axis=1)
+        table['peak'][lo:hi] = running_peak[:, -1]
+        table['trough'][lo:hi] = path.min(axis=1)
+        table['drawdown'][lo:hi] = (running_peak - path).max(axis=1)
+    return table
+
+
+def _block_tables(returns: np.ndarray, block: int) -> dict:
+    returns = np.asarray(returns, dtype=np.float64)
+    log_growth = np.log1p(returns)
+    block = max(1, min(block, len(returns)))
+    tables = {'block': block, 'n': len(returns), 'full': _window_stats(log_growth, returns, block)}
+    rest = len(returns) % block
+    if rest:
+        tables['rest'] = _window_stats(log_growth, returns, rest)
+    return tables
+
+
+def _init_worker(tables: dict):
+    _tables.update(tables)
+
+
+def _combine(draws, table, state):
+    """把一列块（每个重采样一个块）接到各自路径末尾，更新累计增长、历史高点、最大回撤与收益和"""
+    level, peak, drawdown, total, total_sq = state
+    drawdown = np.maximum(drawdown, table['drawdown'][draws])
+    drawdown = np.maximum(drawdown, peak - (level + table['trough'][draws]))
+    peak = np.maximum(peak, level + table['peak'][draws])
+    level = level + table['total'][draws]
+    return level, peak, drawdown, total + table['sum'][draws], total_sq + table['sum_sq'][draws]
+
+
+def _resample_bars(n_resamples: int, seed) -> np.ndarray:
+    """循环块自助法：返回 (n_resamples, 4) 的 [总对数增长, 最大回撤(对数), 收益和, 收益平方和]"""
+    rng = np.random.default_rng(seed)
+    n, block = _tables['n'], _tables['block']
+    state = (np.zeros(n_resamples), np.zeros(n_resamples), np.zeros(n_resamples),
+             np.zeros(n_resamples), np.zeros(n_resamples))
+    for _ in range(n // block):
+        state = _combine(rng.integers(0, n, n_resamples), _tables['full'], state)
+    if 'rest' in _tables:
+        state = _combine(rng.integers(0, n, n_resamples), _tables['rest'], state)
+    level, _, drawdown, total, total_sq = state
+    return np.column_stack([level, drawdown, total, total_sq])
+
+
+def _resample_trades(trade_returns: np.ndarray, method: str, n_resamples: int, seed) -> np.ndarray:
+    """逐笔交易的置换/自助重采样，返回与 _resample_bars 相同列的结果"""
+    rng = np.random.default_rng(seed)
+    k = len(trade_returns)
+    if method == 'permutation':
+        samples = rng.permuted(np.broadcast_to(trade_returns, (n_resamples, k)), axis=1)
+    else:
+        samples = trade_returns[rng.integers(0, k, (n_resamples, k))]
+    path = np.cumsum(np.log1p(samples), axis=1)
+    peak = np.maximum(np.maximum.accumulate(path, axis=1), 0.0)
+    drawdown = (peak - path).max(axis=1)
+    return np.column_stack([path[:, -1], drawdown, samples.sum(axis=1), (samples ** 2).sum(axis=1)])
+
+
+def _run_chunks(func, args, n_resamples, n_jobs, seed, initializer=None, initargs=(),
+                chunk_size=CHUNK_SIZE) -> np.ndarray:
+    """按 chunk_size 切分重采样任务，各块使用独立的随机数子序列，在进程池中并行"""
+    sizes = [min(chunk_size, n_resamples - lo) for lo in range(0, n_resamples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(sizes))
+    if n_jobs == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        try:
+            results = [func(*args, size, s) for size, s in zip(sizes, seeds)]
+        finally:
+            _tables.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=initializer, initargs=initargs) as pool:
+            futures = [pool.submit(func, *args, size, s) for size, s in zip(sizes, seeds)]
+            results = [future.result() for future in futures]
+    return np.concatenate(results)
+
+
+def _summarize(raw: np.ndarray, observed: np.ndarray, count: int, initial_capital, annualization,
+               confidence) -> tuple:
+    """把 [总对数增长, 最大回撤, 收益和, 收益平方和] 转换为指标并计算置信区间"""
+    def to_metrics(values):
+        values = np.atleast_2d(values)
+        mean = values[:, 2] / count
+        var = (values[:, 3] - count * mean ** 2) / (count - 1) if count > 1 else np.full(len(values), np.nan)
+        std = np.sqrt(np.maximum(var, 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe = np.where(std > 0, mean / std * np.sqrt(annualization), np.nan)
+        return pd.DataFrame({
+            '最终资金': initial_capital * np.exp(values[:, 0]),
+            '最大回撤': np.expm1(-values[:, 1]) * 100,
+            '夏普比率': sharpe,
+        })
+
+    samples = to_metrics(raw)
+    observed = to_metrics(observed).iloc[0]
+    alpha = (1 - confidence) / 2
+    summary = pd.DataFrame({
+        '实际值': observed,
+        '均值': samples.mean(),
+        '标准差': samples.std(),
+        f'{alpha * 100:g}%': samples.quantile(alpha),
+        '中位数': samples.median(),
+        f'{(1 - alpha) * 100:g}%': samples.quantile(1 - alpha),
+        # 重采样结果不优于实际值的比例
+        '分位': [(samples[col] <= observed[col]).mean() for col in samples.columns],
+    })
+    return summary, samples
+
+
+def _observed(returns: np.ndarray) -> np.ndarray:
+    path = np.cumsum(np.log1p(returns))
+    peak = np.maximum(np.maximum.accumulate(path), 0.0)
+    return np.array([path[-1], (peak - path).max(), returns.sum(), (returns ** 2).sum()])
+
+
+def bootstrap_bars(index, equity, n_resamples=100_000, block=288, n_jobs=None, seed=None,
+                   initial_capital=None, confidence=CONFIDENCE) -> tuple:
+    """
+    对逐 bar 盯市资金曲线的收益率做循环块自助重采样（block=1 即普通自助法）。
+
+    参数:
+        index / equity: run_backtest(..., return_equity=True) 返回的资金曲线
+        block: 块长度（bar 数），保留块内的自相关与持仓结构，默认 288 根 5m K 线即 1 天
+
+    返回 (summary, samples)：summary 为最终资金、最大回撤、夏普比率的实际值与置信区间，
+    samples 为每次重采样的指标。每次重采样只在 n/block 个块统计量上拼接，与序列长度无关。
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    returns = equity[1:] / equity[:-1] - 1
+    initial_capital = equity[0] if initial_capital is None else initial_capital
+    tables = _block_tables(returns, block)
+    logging.info(f"块自助法: {n_resamples} 次重采样, {len(returns)} 个收益率, 块长 {tables['block']}")
+    raw = _run_chunks(_resample_bars, (), n_resamples, n_jobs, seed, _init_worker, (tables,))
+    return _summarize(raw, _observed(returns), len(returns), initial_capital, periods_per_year(index), confidence)
+
+
+def bootstrap_trades(position_history: pd.DataFrame, n_resamples=100_000, method='permutation', n_jobs=None,
+                     seed=None, confidence=CONFIDENCE) -> tuple:
+    """
+    逐笔交易的稳健性分析。
+
+    method: 'permutation' - 打乱交易顺序（最终资金不变，考察回撤对顺序的敏感性）；
+            'bootstrap'   - 有放回地重采样交易
+    夏普比率按每年交易笔数年化。返回值同 bootstrap_bars。
+    """
+    if method not in ('permutation', 'bootstrap'):
+        raise ValueError("无效的 method 参数，请使用 'permutation' 或 'bootstrap'。")
+    # 资金只在平仓时变化，单笔交易对总资金的收益率 = 平仓后资金 / 开仓前资金 - 1
+    returns = (position_history['final_capital'] / position_history['initial_capital'] - 1).to_numpy()
+    span = (position_history['exit_time'].iloc[-1] - position_history['entry_time'].iloc[0]).total_seconds()
+    trades_per_year = len(returns) / (span / SECONDS_PER_YEAR) if span > 0 else np.nan
+    chunk_size = max(1, min(CHUNK_SIZE, CHUNK_ELEMENTS // len(returns)))
+    raw = _run_chunks(_resample_trades, (returns, method), n_resamples, n_jobs, seed, chunk_size=chunk_size)
+    return _summarize(raw, _observed(returns), len(returns), position_history['initial_capital'].iloc[0],
+                      trades_per_year, confidence)
+
+
+def benchmark(n_bars=105_120, n_resamples=100_000, block=288, n_jobs=None, seed=0) -> dict:
+    """一年 5m 合成数据上的块自助法耗时"""
+    import time
+    import backtest
+    from strategy import signals_from_prices
+    from synthetic import generate_market_data
+
+    market_data = generate_market_data(n_bars, seed=seed)
+    signal = signals_from_prices(market_data['spot'].to_numpy(), market_data['future'].to_numpy(),
+                                 zscore_window=120, zscore_threshold=2.1, min_volatility=0.0)
+    _, _, equity = backtest.backtest_arrays(market_data.index, market_data['spot'], market_data['future'], signal,
+                                            return_equity=True)
+    start = time.perf_counter()
+    summary, _ = bootstrap_bars(equity.index, equity['equity'], n_resamples, block, n_jobs, seed)
+    return {'bars': n_bars, 'resamples': n_resamples, 'seconds': time.perf_counter() - start, 'summary': summary}
+
+
+if __name__ == '__main__':
+    import backtest
+    from strategy import MeanReversionStrategy
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    engine = MeanReversionStrategy()
+    engine.config()
+    engine.load_data()
+    engine.generate_signals()
+    position_history, metrics, equity = backtest.run_backtest(engine.market_data, return_equity=True)
+
+    summary, _ = bootstrap_bars(equity.index, equity['equity'], n_resamples=100_000)
+    print('逐 bar 块自助法:')
+    print(summary.to_string())
+    if not position_history.empty:
+        for method in ('permutation', 'bootstrap'):
+            summary, _ = bootstrap_trades(position_history, n_resamples=100_000, method=method)
+            print(f'逐笔交易 {method}:')
+            print(summary.to_string())
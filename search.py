@@ -0,0 +1,203 @@
+import logging
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtest import INITIAL_CAPITAL
+from sweep import run_sweep, param_sample, _split_params, SIGNAL_PARAMS, BACKTEST_PARAMS
+
+ETA = 3                 # 每一轮保留 1/ETA 的候选，下一轮数据长度乘以 ETA
+MIN_BARS = 5000         # 第一轮的最少 bar 数，需远大于 2 * zscore_window
+OBJECTIVE = '最终资金'
+PARAM_KEYS = tuple(SIGNAL_PARAMS) + tuple(BACKTEST_PARAMS)
+
+
+def _normalize(params: list) -> list:
+    """补全默认值并去重，保持原顺序"""
+    seen = set()
+    candidates = []
+    for p in params:
+        signal_params, backtest_params = _split_params(p)
+        full = {**signal_params, **backtest_params}
+        key = tuple(full.items())
+        if key not in seen:
+            seen.add(key)
+            candidates.append(full)
+    return candidates
+
+
+def _scores(results: pd.DataFrame, objective) -> dict:
+    """参数 → 目标值；没有交易或指标为 NaN 的组合排在最后"""
+    if objective not in results:
+        raise ValueError(f"未知的目标指标: {objective}")
+    scores = results[objective].astype(np.float64).fillna(-np.inf).to_numpy()
+    keys = zip(*(results[k].tolist() for k in PARAM_KEYS))
+    return {tuple(zip(PARAM_KEYS, key)): score for key, score in zip(keys, scores)}
+
+
+def _rung_bars(n_bars, n_rungs, eta, min_bars) -> list:
+    """各轮的数据长度：最后一轮为全部数据，之前每轮除以 eta，不少于 min_bars"""
+    return [n_bars if r == n_rungs - 1 else min(n_bars, max(min_bars, int(n_bars * eta ** (r - n_rungs + 1))))
+            for r in range(n_rungs)]
+
+
+def successive_halving(market_data: pd.DataFrame, params: list, objective=OBJECTIVE, eta=ETA, min_bars=MIN_BARS,
+                       n_rungs=None, n_jobs=None, initial_capital=INITIAL_CAPITAL) -> tuple:
+    """
+    逐轮淘汰的参数搜索：先在较短的前缀上评估全部候选，只保留前 1/eta 进入下一轮，幸存者获得 eta 倍长的数据，
+    最后一轮在完整数据上评估。
+
+    参数:
+        market_data: 含 spot/future 列、按时间对齐的 DataFrame
+        params: 候选参数列表（sweep.param_grid / param_sample 的输出）
+        objective: 排序指标（raw 指标字典中的键，越大越好）
+        n_rungs: 轮数，默认使第一轮的候选数约为最后一轮的 eta^(n_rungs-1) 倍，且第一轮不少于 min_bars 根 bar
+
+    前缀而非随机抽样的子集：滚动窗口与持仓状态依赖连续的 bar，前缀上的信号与完整数据上的对应部分相同。
+    返回 (history, report)：history 为每轮每组参数一行的指标表（rung/bars 列为轮次与数据长度），
+    report 含最优参数、各轮的候选数与数据长度，以及以 bar × 参数组 计的计算量与完整网格搜索的对比。
+    """
+    candidates = _normalize(params)
+    n_bars = len(market_data)
+    if n_rungs is None:
+        n_rungs = max(1, int(math.log(len(candidates), eta) + 1e-9) + 1)
+        while n_rungs > 1 and n_bars * eta ** (1 - n_rungs) < min_bars:
+            n_rungs -= 1
+    bars = _rung_bars(n_bars, n_rungs, eta, min_bars)
+    logging.info(f"逐轮淘汰搜索: {len(candidates)} 组候选, {n_rungs} 轮, 数据长度 {bars}")
+
+    history = []
+    rungs = []
+    survivors = candidates
+    for rung, rung_bars in enumerate(bars):
+        start = time.perf_counter()
+        results = run_sweep(market_data.iloc[:rung_bars], survivors, n_jobs=n_jobs, initial_capital=initial_capital)
+        scores = _scores(results, objective)
+        ranked = sorted(survivors, key=lambda p: -scores[tuple(p.items())])
+        results.insert(0, 'rung', rung)
+        results.insert(1, 'bars', rung_bars)
+        history.append(results)
+        rungs.append({'rung': rung, 'configs': len(survivors), 'bars': rung_bars,
+                      'seconds': time.perf_counter() - start})
+        if rung < n_rungs - 1:
+            survivors = ranked[:max(1, math.ceil(len(survivors) / eta))]
+
+    best = ranked[0]
+    bar_evals = sum(r['configs'] * r['bars'] for r in rungs)
+    grid_bar_evals = len(candidates) * n_bars
+    report = {
+        'best': best,
+        'best_score': scores[tuple(best.items())],
+        'rungs': rungs,
+        'candidates': len(candidates),
+        'bar_evals': bar_evals,
+        'grid_bar_evals': grid_bar_evals,
+        'saved': 1 - bar_evals / grid_bar_evals,
+        'seconds': sum(r['seconds'] for r in rungs),
+    }
+    return pd.concat(history, ignore_index=True), report
+
+
+def hyperband(market_data: pd.DataFrame, space: dict, objective=OBJECTIVE, eta=ETA, min_bars=MIN_BARS,
+              max_brackets=None, n_jobs=None, initial_capital=INITIAL_CAPITAL, seed=None) -> tuple:
+    """
+    Hyperband：用不同的 (候选数, 起始数据长度) 组合运行多次逐轮淘汰，
+    兼顾“多候选、短数据”的激进淘汰与“少候选、长数据”的保守评估。
+
+    参数:
+        space: 参数空间，格式同 sweep.param_sample（列表等概率抽取，(low, high) 均匀抽取）
+        max_brackets: 最多的 bracket 数，默认由数据长度与 min_bars 决定
+
+    返回值同 successive_halving，history 多一列 bracket；所有 bracket 的最后一轮都在完整数据上，直接比较得出最优参数。
+    """
+    rng = np.random.default_rng(seed)
+    n_bars = len(market_data)
+    s_max = max(0, int(math.log(n_bars / min_bars, eta) + 1e-9)) if n_bars > min_bars else 0
+    if max_brackets is not None:
+        s_max = min(s_max, max_brackets - 1)
+
+    history = []
+    reports = []
+    for s in range(s_max, -1, -1):
+        n_configs = math.ceil((s_max + 1) / (s + 1) * eta ** s)
+        params = param_sample(space, n_configs, seed=rng.integers(2 ** 32))
+        results, report = successive_halving(market_data, params, objective=objective, eta=eta, min_bars=min_bars,
+                                             n_rungs=s + 1, n_jobs=n_jobs, initial_capital=initial_capital)
+        results.insert(0, 'bracket', s)
+        history.append(results)
+        reports.append(report)
+
+    best = max(reports, key=lambda r: r['best_score'])
+    bar_evals = sum(r['bar_evals'] for r in reports)
+    grid_bar_evals = sum(r['grid_bar_evals'] for r in reports)
+    report = {
+        'best': best['best'],
+        'best_score': best['best_score'],
+        'brackets': [{'bracket': len(reports) - 1 - i, 'candidates': r['candidates'], 'rungs': r['rungs']}
+                     for i, r in enumerate(reports)],
+        'candidates': sum(r['candidates'] for r in reports),
+        'bar_evals': bar_evals,
+        'grid_bar_evals': grid_bar_evals,
+        'saved': 1 - bar_evals / grid_bar_evals,
+        'seconds': sum(r['seconds'] for r in reports),
+    }
+    return pd.concat(history, ignore_index=True), report
+
+
+def compare_with_grid(market_data: pd.DataFrame, history: pd.DataFrame, report: dict, objective=OBJECTIVE,
+                      n_jobs=None, initial_capital=INITIAL_CAPITAL) -> dict:
+    """
+    在完整数据上对搜索评估过的全部候选做一次网格扫描，检验搜索结果：
+    网格的最优参数、搜索最优在网格中的名次，以及两者的计算量（bar × 参数组）与耗时。
+    """
+    candidates = _normalize(history[list(PARAM_KEYS)].to_dict('records'))
+    start = time.perf_counter()
+    results = run_sweep(market_data, candidates, n_jobs=n_jobs, initial_capital=initial_capital)
+    grid_seconds = time.perf_counter() - start
+    scores = _scores(results, objective)
+    ranked = sorted(candidates, key=lambda p: -scores[tuple(p.items())])
+    rank = ranked.index(report['best']) + 1
+    return {
+        'grid_best': ranked[0],
+        'grid_best_score': scores[tuple(ranked[0].items())],
+        'search_best_rank': rank,
+        'same_best': ranked[0] == report['best'],
+        'search_bar_evals': report['bar_evals'],
+        'grid_bar_evals': len(candidates) * len(market_data),
+        'saved': 1 - report['bar_evals'] / (len(candidates) * len(market_data)),
+        'search_seconds': report['seconds'],
+        'grid_seconds': grid_seconds,
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [f"最优参数: {report['best']}", f"目标值: {report['best_score']}"]
+    brackets = report['brackets'] if 'brackets' in report else [{'bracket': None, 'rungs': report['rungs']}]
+    for bracket in brackets:
+        prefix = '' if bracket['bracket'] is None else f"bracket {bracket['bracket']} "
+        for r in bracket['rungs']:
+            lines.append(f"{prefix}第 {r['rung']} 轮: {r['configs']} 组 × {r['bars']} 根 bar, {r['seconds']:.2f}s")
+    lines.append(f"计算量: {report['bar_evals']:,} bar·组，完整网格 {report['grid_bar_evals']:,}，"
+                 f"节省 {report['saved'] * 100:.1f}%")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    from synthetic import generate_market_data
+    from sweep import param_grid
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    market_data = generate_market_data(200_000)
+    space = {
+        'zscore_window': [60, 120, 240],
+        'zscore_threshold': [1.5, 1.8, 2.1, 2.5],
+        'min_volatility': [0.0, 0.01, 0.03],
+        'take_profit': [0.005, 0.01, 0.02],
+        'stop_loss': [0.01, 0.02, 0.03],
+    }
+    history, report = successive_halving(market_data, param_grid(space))
+    print(format_report(report))
+    print(compare_with_grid(market_data, history, report))
@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from strategy import compute_premium_pct, rolling_zscore, compute_volatility, compute_raw_signal, \
+    filter_low_volatility, VOLATILITY_WINDOW
+
+MAX_BYTES = 512 * 1024 * 1024    # 内存缓存上限（进程池中为所有 worker 合计，见 configure_worker），超出后按 LRU 淘汰
+CACHE_DIR = None                 # 磁盘缓存目录，如 'database/signals'；None 表示只用内存
+
+
+def fingerprint(*arrays) -> str:
+    """按内容计算数组的指纹（dtype、形状与数据），作为缓存键的一部分"""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f'{array.dtype.str}{array.shape}'.encode())
+        digest.update(array.view(np.uint8).reshape(-1) if array.size else b'')
+    return digest.hexdigest()
+
+
+class SignalCache:
+    """
+    以 (数据指纹, 指标名, 参数) 为键的中间结果缓存。
+
+    内存中按字节数做 LRU 淘汰；设置 directory 后同时写入 .npy 文件，跨进程/跨运行复用。
+    缓存的数组为只读，调用方需要修改时自行复制。
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES, directory=CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(key: tuple) -> str:
+        return hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+    def get(self, key: tuple, compute) -> np.ndarray:
+        """命中则返回缓存结果，否则调用 compute() 计算并缓存"""
+        digest = self._digest(key)
+        value = self.entries.get(digest)
+        if value is not None:
+            self.entries.move_to_end(digest)
+            self.hits += 1
+            return value
+        value = self._load(digest)
+        if value is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            value = np.asarray(compute())
+            self._save(digest, value)
+        value.setflags(write=False)
+        self._put(digest, value)
+        return value
+
+    def _put(self, digest, value):
+        self.entries[digest] = value
+        self.nbytes += value.nbytes
+        self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def resize(self, max_bytes):
+        """调整内存上限，超出部分立即按 LRU 淘汰"""
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _path(self, digest) -> str:
+        return os.path.join(self.directory, digest[:2], f'{digest}.npy')
+
+    def _load(self, digest):
+        if self.directory is None:
+            return None
+        try:
+            return np.load(self._path(digest))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"信号缓存读取失败，重新计算: {e}")
+            return None
+
+    def _save(self, digest, value):
+        if self.directory is None:
+            return
+        path = self._path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                np.save(f, value)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.warning(f"信号缓存写入失败: {e}")
+
+    def clear(self):
+        """清空内存缓存（磁盘文件保留）"""
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self) -> dict:
+        return {'entries': len(self.entries), 'bytes': self.nbytes, 'hits': self.hits,
+                'disk_hits': self.disk_hits, 'misses': self.misses}
+
+    # 各中间结果只以其真正依赖的参数为键：不同 zscore_threshold 共享同一窗口的滚动均值/标准差
+    def premium_pct(self, data_key, spot, future) -> np.ndarray:
+        return self.get((data_key, 'premium_pct'), lambda: compute_premium_pct(
+            np.asarray(spot, dtype=np.float64), np.asarray(future, dtype=np.float64)))
+
+    def zscore(self, data_key, spot, future, zscore_window) -> np.ndarray:
+        """滚动均值、标准差与 zscore，形状 (3, n)"""
+        def compute():
+            mean, std, zscore = rolling_zscore(pd.Series(self.premium_pct(data_key, spot, future)), zscore_window)
+            return np.vstack([mean.to_numpy(), std.to_numpy(), zscore.to_numpy()])
+        return self.get((data_key, 'zscore', zscore_window), compute)
+
+    def volatility(self, data_key, spot, future, window=VOLATILITY_WINDOW) -> np.ndarray:
+        return self.get((data_key, 'volatility', window), lambda: compute_volatility(
+            pd.Series(self.premium_pct(data_key, spot, future)), window).to_numpy())
+
+    def sma(self, data_key, spot, future, window) -> np.ndarray:
+        return self.get((data_key, 'sma', window), lambda: pd.Series(
+            self.premium_pct(data_key, spot, future)).rolling(window=window).mean().to_numpy())
+
+    def signal(self, data_key, spot, future, zscore_window, zscore_threshold, min_volatility) -> np.ndarray:
+        def compute():
+            raw_signal = compute_raw_signal(self.zscore(data_key, spot, future, zscore_window)[2], zscore_threshold)
+            return filter_low_volatility(raw_signal, self.volatility(data_key, spot, future), min_volatility)
+        return self.get((data_key, 'signal', zscore_window, zscore_threshold, min_volatility), compute)
+
+
+# 全局缓存实例
+CACHE = SignalCache()
+
+
+def configure_worker(n_workers: int):
+    """进程池 worker 的初始化：每个 worker 各有一份缓存，上限按 worker 数均分，合计不超过 MAX_BYTES"""
+    CACHE.resize(MAX_BYTES // max(int(n_workers), 1))
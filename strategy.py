@@ -1,9 +1,14 @@
+import logging
 import pandas as pd
 import numpy as np
-from datafetcher import DataFetcher
+from instrumentation import stage, timed
+from artifacts import submit
 from datetime import datetime
 
 ENABLE_DEBUG = True
+VOLATILITY_WINDOW = 24    # 波动率滚动窗口
+COMPACT_MARKET_DATA = False    # True 时 market_data 转为 MarketFrame，派生指标按需计算
+ENABLE_SIGNAL_CACHE = True    # 按数据指纹与参数缓存溢价率、滚动统计量等中间结果（signalcache.CACHE）
 
 class MeanReversionStrategy:
     """均值回归策略"""
@@ -22,49 +27,89 @@ class MeanReversionStrategy:
 
     def load_data(self):
         """导入数据"""
+        # 交易所相关依赖（ccxt 等）只在需要下载数据时导入，回测/扫描的 worker 进程不加载
+        from datafetcher import DataFetcher
+        from alignment import align_legs, log_report
+        from backtest import funding_per_bar
 
         fetcher = DataFetcher()
-        spot = fetcher.fetch_data(symbol=self.SYMBOL, start_time=self.START_TIME, range=self.RANGE, timeframe=self.TIMEFRAME, contract_type='spot')[['close']].rename(
-            columns={'close': 'spot'})
-        future = fetcher.fetch_data(symbol=self.SYMBOL, start_time=self.START_TIME, range=self.RANGE, timeframe=self.TIMEFRAME, contract_type='future')[['close']].rename(
-            columns={'close': 'future'})
+        # 现货与合约并发下载
+        request = dict(symbol=self.SYMBOL, start_time=self.START_TIME, range=self.RANGE, timeframe=self.TIMEFRAME)
+        spot, future = fetcher.fetch_many([dict(request, contract_type='spot'), dict(request, contract_type='future')])
+        spot = _leg(spot, 'spot')
+        future = _leg(future, 'future')
 
         # 合并数据
-        self.market_data = pd.merge(spot, future, left_index=True,
-                           right_index=True, how='inner')
+        with stage('align') as align_stage:
+            self.market_data, self.alignment = align_legs({'spot': spot, 'future': future}, policy='inner')
+            align_stage.rows = len(self.market_data)
+        log_report(self.alignment)
+        # 资金费率按结算时间计入对应 bar，回测中只有启用 ENABLE_FUNDING 时才使用
+        self.funding = self._load_funding(fetcher)
+        self.market_data['funding_rate'] = funding_per_bar(self.market_data.index, self.funding)
         # 调试
         if ENABLE_DEBUG:
-            spot.to_csv('debug/spot.csv')
-            future.to_csv('debug/future.csv')
+            submit('market', 'spot', spot)
+            submit('market', 'future', future)
+
+    def _load_funding(self, fetcher):
+        try:
+            return fetcher.fetch_funding(symbol=self.SYMBOL, start_time=self.START_TIME, range=self.RANGE)
+        except Exception as e:
+            logging.warning(f"资金费率获取失败，按 0 处理: {e}")
+            return None
+
+    def iter_market_data(self, block_bars):
+        """按时间分块产出对齐后的行情（列同 load_data，分块回测用），不在内存中保留完整的 market_data"""
+        from datafetcher import DataFetcher
+        from alignment import align_legs, log_report
+        from backtest import funding_per_bar
 
+        fetcher = DataFetcher()
+        funding = self._load_funding(fetcher)
+        request = dict(symbol=self.SYMBOL, start_time=self.START_TIME, range=self.RANGE, timeframe=self.TIMEFRAME)
+        blocks = fetcher.iter_blocks(
+            [dict(request, contract_type='spot'), dict(request, contract_type='future')], block_bars)
+        last = None
+        for spot, future in blocks:
+            # 块按时间划分，逐块 inner 对齐与整体对齐的结果相同
+            block, report = align_legs({'spot': _leg(spot, 'spot'), 'future': _leg(future, 'future')},
+                                       policy='inner')
+            log_report(report)
+            if block.empty:
+                continue
+            block['funding_rate'] = funding_per_bar(block.index, funding, after=last)
+            last = block.index[-1]
+            yield block
+
+    @timed('generate_signals', rows=len)
     def generate_signals(self):
         """生成交易信号"""
 
         zscore_window = self.zscore_window
         zscore_threshold = self.zscore_threshold
 
+        if COMPACT_MARKET_DATA:
+            return self._generate_compact_signals()
+        if ENABLE_SIGNAL_CACHE:
+            return self._generate_cached_signals()
+
         # 计算溢价
         self.market_data['premium'] = self.market_data['spot'] - self.market_data['future']
 
         # 计算溢价率
-        self.market_data['premium_pct'] = (
-            # (现货价格 - 合约价格) / 现货价格
-            self.market_data['spot'] - self.market_data['future']) / self.market_data['spot'] * 100
+        self.market_data['premium_pct'] = compute_premium_pct(
+            self.market_data['spot'], self.market_data['future'])
 
         # 计算统计指标
-        self.market_data['mean_premium_pct'] = self.market_data['premium_pct'].rolling(
-            zscore_window).mean()
-        self.market_data['std'] = self.market_data['premium_pct'].rolling(
-            zscore_window).std()
-        self.market_data['zscore'] = (self.market_data['premium_pct'] -
-                             self.market_data['mean_premium_pct']) / self.market_data['std']
+        mean, std, zscore = rolling_zscore(self.market_data['premium_pct'], zscore_window)
+        self.market_data['mean_premium_pct'] = mean
+        self.market_data['std'] = std
+        self.market_data['zscore'] = zscore
 
         # 生成原始信号
-        self.market_data['raw_signal'] = 0
-        self.market_data.loc[self.market_data['zscore'] > zscore_threshold,
-                    'raw_signal'] = -1  # 溢价率高于阈值，做空溢价, 同时做空现货、做多合约
-        self.market_data.loc[self.market_data['zscore'] < -zscore_threshold,
-                    'raw_signal'] = 1  # 溢价率低于阈值，做多溢价, 同时做多现货、做空合约
+        self.market_data['raw_signal'] = compute_raw_signal(
+            self.market_data['zscore'], zscore_threshold)
 
         self.market_data['signal'] = self.market_data['raw_signal']
 
@@ -77,18 +122,110 @@ class MeanReversionStrategy:
         #     0).astype(int) * self.market_data['raw_signal']
 
         # 计算波动率
-        self.market_data['volatility'] = self.market_data['premium_pct'].rolling(24).std()
+        self.market_data['volatility'] = compute_volatility(self.market_data['premium_pct'])
 
         # 过滤低波动时段
-        self.market_data.loc[self.market_data['volatility'] <
-                    self.min_volatility, 'signal'] = 0
+        self.market_data['signal'] = filter_low_volatility(
+            self.market_data['raw_signal'], self.market_data['volatility'], self.min_volatility)
 
         # 调试
         if ENABLE_DEBUG:
-            self.market_data[['signal']].to_csv('debug/signals.csv')
+            submit('signals', 'signals', self.market_data[['signal']])
 
         return self.market_data
 
+    def _generate_cached_signals(self):
+        """与 generate_signals 输出相同的列，中间结果取自 signalcache，只重算参数变化的部分"""
+        from signalcache import CACHE, fingerprint
+
+        spot = self.market_data['spot'].to_numpy()
+        future = self.market_data['future'].to_numpy()
+        data_key = fingerprint(spot, future)
+        zscore_stats = CACHE.zscore(data_key, spot, future, self.zscore_window)
+        # 缓存中的数组只读，写入 DataFrame 时复制
+        self.market_data['premium'] = spot - future
+        self.market_data['premium_pct'] = CACHE.premium_pct(data_key, spot, future).copy()
+        self.market_data['mean_premium_pct'] = zscore_stats[0].copy()
+        self.market_data['std'] = zscore_stats[1].copy()
+        self.market_data['zscore'] = zscore_stats[2].copy()
+        self.market_data['raw_signal'] = compute_raw_signal(zscore_stats[2], self.zscore_threshold)
+        self.market_data['signal'] = CACHE.signal(data_key, spot, future, self.zscore_window,
+                                                  self.zscore_threshold, self.min_volatility).copy()
+        self.market_data['SMA'] = CACHE.sma(data_key, spot, future, 2 * self.zscore_window).copy()
+        self.market_data['volatility'] = CACHE.volatility(data_key, spot, future).copy()
+        # 调试
+        if ENABLE_DEBUG:
+            submit('signals', 'signals', self.market_data[['signal']])
+        return self.market_data
+
+    def _generate_compact_signals(self):
+        """紧凑模式：只配置参数，信号与各指标在回测/图表访问时才计算"""
+        from marketframe import MarketFrame
+
+        params = dict(zscore_window=self.zscore_window, zscore_threshold=self.zscore_threshold,
+                      min_volatility=self.min_volatility)
+        if isinstance(self.market_data, MarketFrame):
+            self.market_data.configure(**params)
+        else:
+            self.market_data = MarketFrame.from_frame(self.market_data, **params)
+        # 调试
+        if ENABLE_DEBUG:
+            submit('signals', 'signals', self.market_data[['signal']])
+        return self.market_data
+
+
+def _leg(ohlcv: pd.DataFrame, name: str) -> pd.DataFrame:
+    """K 线 → 收盘价与成交量两列（spot/spot_volume 或 future/future_volume）"""
+    return ohlcv[['close', 'volume']].rename(columns={'close': name, 'volume': f'{name}_volume'})
+
+
+def compute_premium_pct(spot, future):
+    """溢价率：(现货价格 - 合约价格) / 现货价格 * 100"""
+    return (spot - future) / spot * 100
+
+
+def rolling_zscore(premium_pct: pd.Series, zscore_window: int) -> tuple:
+    """滚动均值、标准差与 zscore"""
+    mean = premium_pct.rolling(zscore_window).mean()
+    std = premium_pct.rolling(zscore_window).std()
+    zscore = (premium_pct - mean) / std
+    return mean, std, zscore
+
+
+def compute_volatility(premium_pct: pd.Series, window: int = VOLATILITY_WINDOW) -> pd.Series:
+    """溢价率的滚动波动率"""
+    return premium_pct.rolling(window).std()
+
+
+def compute_raw_signal(zscore, zscore_threshold):
+    """溢价率高于阈值做空溢价(-1)，低于阈值做多溢价(1)"""
+    zscore = np.asarray(zscore)
+    raw_signal = np.zeros(len(zscore), dtype=np.int64)
+    raw_signal[zscore > zscore_threshold] = -1  # 同时做空现货、做多合约
+    raw_signal[zscore < -zscore_threshold] = 1  # 同时做多现货、做空合约
+    return raw_signal
+
+
+def filter_low_volatility(raw_signal, volatility, min_volatility):
+    """波动率低于 min_volatility 的时段信号置 0（波动率为 NaN 时保留原始信号）"""
+    signal = np.array(raw_signal, dtype=np.int64)
+    signal[np.asarray(volatility) < min_volatility] = 0
+    return signal
+
+
+def signals_from_prices(spot, future, zscore_window, zscore_threshold, min_volatility, cache=None,
+                        data_key=None) -> np.ndarray:
+    """不依赖 DataFrame 的信号计算，供参数扫描等批量场景使用；传入 cache 时复用其中的中间结果"""
+    if cache is not None:
+        if data_key is None:
+            from signalcache import fingerprint
+            data_key = fingerprint(spot, future)
+        return cache.signal(data_key, spot, future, zscore_window, zscore_threshold, min_volatility)
+    premium_pct = pd.Series(compute_premium_pct(np.asarray(spot), np.asarray(future)))
+    _, _, zscore = rolling_zscore(premium_pct, zscore_window)
+    raw_signal = compute_raw_signal(zscore, zscore_threshold)
+    return filter_low_volatility(raw_signal, compute_volatility(premium_pct), min_volatility)
+
 
 if __name__ == '__main__':
     engine = MeanReversionStrategy()
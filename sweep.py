@@ -0,0 +1,197 @@
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import backtest
+from backtest import backtest_arrays, _cost_columns, COST_COLUMNS, INITIAL_CAPITAL
+from strategy import signals_from_prices
+from signalcache import CACHE, fingerprint, configure_worker
+
+# 策略参数决定信号，回测参数只影响交易执行；同一组策略参数的信号在 worker 内复用
+SIGNAL_PARAMS = {'zscore_window': 120, 'zscore_threshold': 2.1, 'min_volatility': 0.05}
+# 回测参数的默认值在拆分时取 backtest 模块的当前配置（键名大写即对应的全局量）
+BACKTEST_PARAMS = ('take_profit', 'stop_loss', 'leverage', 'position_ratio')
+
+# worker 进程内的共享数据
+_shared = {}
+
+
+def param_grid(space: dict) -> list:
+    """网格参数：space 中每个键对应一个候选值列表，返回全部组合"""
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def param_sample(space: dict, n: int, seed=None) -> list:
+    """随机采样参数：列表按等概率抽取，(low, high) 元组按均匀分布抽取，可调用对象接收 rng"""
+    rng = np.random.default_rng(seed)
+    samples = []
+    for _ in range(n):
+        params = {}
+        for key, spec in space.items():
+            if callable(spec):
+                params[key] = spec(rng)
+            elif isinstance(spec, tuple):
+                low, high = spec
+                if isinstance(low, int) and isinstance(high, int):
+                    params[key] = int(rng.integers(low, high + 1))
+                else:
+                    params[key] = float(rng.uniform(low, high))
+            else:
+                params[key] = spec[rng.integers(len(spec))]
+        samples.append(params)
+    return samples
+
+
+class SharedArrays:
+    """把一组 numpy 数组放入共享内存，worker 按名称映射为零拷贝视图而非逐任务 pickle"""
+
+    def __init__(self, arrays: dict):
+        self.blocks = {}
+        self.meta = {}
+        for name, values in arrays.items():
+            values = np.ascontiguousarray(values)
+            shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[...] = values
+            self.blocks[name] = shm
+            self.meta[name] = (shm.name, values.dtype.str, values.shape)
+
+    def handles(self) -> dict:
+        """worker 初始化所需的共享内存名称、dtype 与形状"""
+        return dict(self.meta)
+
+    def close(self):
+        for shm in self.blocks.values():
+            shm.close()
+            shm.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SharedMarketData(SharedArrays):
+    """对齐后的时间戳与 spot/future 序列及存在的成本列（COST_COLUMNS），extra 中可附带预先计算好的其他序列"""
+
+    def __init__(self, market_data: pd.DataFrame, extra: dict = None):
+        super().__init__({
+            'timestamp': market_data.index.values.astype('datetime64[ns]').view(np.int64),
+            'spot': market_data['spot'].to_numpy(dtype=np.float64),
+            'future': market_data['future'].to_numpy(dtype=np.float64),
+            **_cost_columns(market_data),
+            **(extra or {}),
+        })
+
+
+def _attach(handles: dict) -> dict:
+    """在当前进程中映射共享内存，返回零拷贝的 numpy 视图"""
+    blocks = {}
+    arrays = {}
+    for name, (shm_name, dtype, shape) in handles.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks[name] = shm
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    if 'timestamp' in arrays:
+        arrays['index'] = pd.DatetimeIndex(arrays['timestamp'].view('datetime64[ns]'))
+    return {'blocks': blocks, 'arrays': arrays}
+
+
+def _cost_kwargs(arrays: dict, sl=slice(None)) -> dict:
+    """共享数组中的成本列按 sl 切片，作为 backtest_arrays 的关键字参数"""
+    return {name: arrays[name][sl] for name in COST_COLUMNS if name in arrays}
+
+
+def _init_worker(handles: dict, n_workers=None):
+    _shared.update(_attach(handles))
+    if n_workers is not None:
+        configure_worker(n_workers)
+
+
+def _run_group(signal_params: dict, backtest_params: list, initial_capital) -> list:
+    """计算一组策略参数的信号，并依次回测其下的全部回测参数"""
+    arrays = _shared['arrays']
+    if 'data_key' not in _shared:
+        _shared['data_key'] = fingerprint(arrays['spot'], arrays['future'])
+    # 同一窗口、不同阈值的信号组共享缓存中的滚动统计量
+    signal = signals_from_prices(arrays['spot'], arrays['future'], **signal_params, cache=CACHE,
+                                 data_key=_shared['data_key'])
+    rows = []
+    for params in backtest_params:
+        position_history, metrics = backtest_arrays(
+            arrays['index'], arrays['spot'], arrays['future'], signal,
+            initial_capital=initial_capital, raw_metrics=True, **_cost_kwargs(arrays), **params)
+        if not metrics:
+            metrics = {"初始资金": initial_capital, "最终资金": initial_capital, "交易次数": 0}
+        rows.append({**signal_params, **params, **metrics})
+    return rows
+
+
+def _split_params(params: dict) -> tuple:
+    unknown = set(params) - set(SIGNAL_PARAMS) - set(BACKTEST_PARAMS)
+    if unknown:
+        raise ValueError(f"不支持的扫描参数: {sorted(unknown)}")
+    signal_params = {k: params.get(k, v) for k, v in SIGNAL_PARAMS.items()}
+    backtest_params = {k: params.get(k, getattr(backtest, k.upper())) for k in BACKTEST_PARAMS}
+    return signal_params, backtest_params
+
+
+def run_sweep(market_data: pd.DataFrame, params: list, n_jobs=None, initial_capital=INITIAL_CAPITAL) -> pd.DataFrame:
+    """
+    并行参数扫描，返回每组参数一行的指标表。
+
+    参数:
+        market_data: 含 spot/future 列、按时间对齐的 DataFrame（如 MeanReversionStrategy.market_data）
+        params: 参数字典列表（param_grid / param_sample 的输出），未给出的参数取默认值
+        n_jobs: 进程数，默认为 CPU 核数；1 表示在当前进程内顺序执行
+    """
+    groups = {}
+    for p in params:
+        signal_params, backtest_params = _split_params(p)
+        groups.setdefault(tuple(signal_params.items()), []).append(backtest_params)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    logging.info(f"参数扫描: {len(params)} 组参数, {len(groups)} 组信号, {n_jobs} 个进程")
+
+    rows = []
+    with SharedMarketData(market_data) as shared:
+        if n_jobs == 1:
+            _init_worker(shared.handles())
+            try:
+                for key, backtest_params in groups.items():
+                    rows.extend(_run_group(dict(key), backtest_params, initial_capital))
+            finally:
+                _shared.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                     initargs=(shared.handles(), n_jobs)) as pool:
+                futures = [pool.submit(_run_group, dict(key), backtest_params, initial_capital)
+                           for key, backtest_params in groups.items()]
+                for future in futures:
+                    rows.extend(future.result())
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    from strategy import MeanReversionStrategy
+
+    engine = MeanReversionStrategy()
+    engine.config()
+    engine.load_data()
+
+    space = {
+        'zscore_window': [60, 120, 240],
+        'zscore_threshold': [1.8, 2.1, 2.5],
+        'min_volatility': [0.03, 0.05],
+        'take_profit': [0.01, 0.02, 0.03],
+        'stop_loss': [0.02, 0.03],
+    }
+    results = run_sweep(engine.market_data, param_grid(space))
+    print(results.sort_values('最终资金', ascending=False).head(20).to_string())
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from datastore import timeframe_to_ms
+
+DEFAULT_START = '2024-01-01 00:00:00'
+
+
+def _ar1(noise: np.ndarray, phi: float, block: int = 256) -> np.ndarray:
+    """
+    x[t] = phi * x[t-1] + noise[t] 的分块向量化实现（沿第 0 轴）。
+
+    块内用 phi 的幂次把递推化为累加和，块间只需顺序传递一个边界值，千万级长度也只循环 n/block 次。
+    """
+    noise = np.asarray(noise, dtype=np.float64)
+    n = noise.shape[0]
+    tail = noise.shape[1:]
+    n_blocks = -(-n // block)
+    padded = np.zeros((n_blocks * block,) + tail)
+    padded[:n] = noise
+    padded = padded.reshape((n_blocks, block) + tail)
+    expand = (slice(None),) + (None,) * len(tail)
+
+    powers = phi ** np.arange(block, dtype=np.float64)
+    # 块内: x[j] = sum_{i<=j} phi^(j-i) e[i] = phi^j * cumsum(e[i] / phi^i)
+    local = np.cumsum(padded / powers[expand], axis=1) * powers[expand]
+    carry_weight = phi * powers  # 上一块末值对块内第 j 项的贡献 phi^(j+1)
+    out = np.empty_like(local)
+    last = np.zeros(tail)
+    for b in range(n_blocks):
+        out[b] = local[b] + carry_weight[expand] * last
+        last = out[b, -1]
+    return out.reshape((n_blocks * block,) + tail)[:n]
+
+
+def generate_pair(n_bars: int, timeframe: str = '5m', start: str = DEFAULT_START, spot0: float = 40000.0,
+                  sigma: float = 1e-3, premium_phi: float = 0.98, premium_sigma: float = 2e-4,
+                  premium_mean: float = 0.0, seed: int = 0) -> tuple:
+    """
+    生成一对协整的现货/永续合约 OHLCV。
+
+    现货收盘价为几何随机游走，溢价率 (spot - future) / spot 为 AR(1) 均值回归过程，
+    返回 (spot, future) 两个与 DataFetcher._process_data 结构相同的 DataFrame。
+    """
+    rng = np.random.default_rng(seed)
+    spot_close = spot0 * np.exp(np.cumsum(rng.normal(0.0, sigma, n_bars)))
+    premium = premium_mean + _ar1(rng.normal(0.0, premium_sigma, n_bars), premium_phi)
+    future_close = spot_close * (1 - premium)
+    index = pd.date_range(pd.Timestamp(start), periods=n_bars, freq=pd.Timedelta(timeframe_to_ms(timeframe), 'ms'),
+                          name='timestamp')
+    return (_ohlcv_frame(index, spot_close, sigma, rng),
+            _ohlcv_frame(index, future_close, sigma, rng))
+
+
+def generate_panel(n_bars: int, n_symbols: int, timeframe: str = '5m', start: str = DEFAULT_START,
+                   sigma: float = 1e-3, premium_phi: float = 0.98, premium_sigma: float = 2e-4, seed: int = 0) -> tuple:
+    """生成 (bars × symbols) 的现货/合约收盘价面板，返回 (index, spot, future)"""
+    rng = np.random.default_rng(seed)
+    spot = 100 * np.exp(np.cumsum(rng.normal(0.0, sigma, (n_bars, n_symbols)), axis=0))
+    premium = _ar1(rng.normal(0.0, premium_sigma, (n_bars, n_symbols)), premium_phi)
+    index = pd.date_range(pd.Timestamp(start), periods=n_bars, freq=pd.Timedelta(timeframe_to_ms(timeframe), 'ms'),
+                          name='timestamp')
+    return index, spot, spot * (1 - premium)
+
+
+def generate_market_data(n_bars: int, **kwargs) -> pd.DataFrame:
+    """生成与 MeanReversionStrategy.market_data 相同结构（spot/future 两列）的对齐数据"""
+    spot, future = generate_pair(n_bars, **kwargs)
+    return pd.DataFrame({'spot': spot['close'], 'future': future['close']})
+
+
+def to_ohlcv_list(df: pd.DataFrame) -> list:
+    """转换为 ccxt fetch_ohlcv 返回的 [[timestamp, open, high, low, close, volume], ...] 格式"""
+    timestamp = df.index.values.astype('datetime64[ms]').astype(np.int64)
+    values = df[['open', 'high', 'low', 'close', 'volume']].to_numpy()
+    return np.column_stack([timestamp.astype(np.float64), values]).tolist()
+
+
+def _ohlcv_frame(index, close, sigma, rng) -> pd.DataFrame:
+    open_ = np.empty_like(close)
+    open_[0] = close[0]
+    open_[1:] = close[:-1]
+    wick = np.abs(rng.normal(0.0, sigma / 2, (2, len(close))))
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + wick[0]),
+        'low': np.minimum(open_, close) * (1 - wick[1]),
+        'close': close,
+        'volume': rng.lognormal(3.0, 1.0, len(close)),
+    }, index=index)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# 模块均位于仓库根目录（非安装包），测试直接按模块名导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fetcher(tmp_path, monkeypatch):
+    """数据目录在临时目录下的 DataFetcher，调试文件不写出；交易所由 mock_exchange.attach 指定"""
+    import artifacts
+    from datafetcher import DataFetcher
+    from datastore import MarketDataStore
+
+    # 旧缓存与 CSV 副本的路径相对当前目录
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(artifacts.SINK, 'disabled', set(artifacts.KINDS))
+    fetcher = DataFetcher()
+    fetcher.store = MarketDataStore(str(tmp_path / 'store'))
+    return fetcher
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import ccxt
+import numpy as np
+
+from datastore import FUNDING_INTERVAL_MS
+
+MINUTE_MS = 60 * 1000
+
+
+class MockExchange:
+    """
+    本地模拟交易所，接口与 DownloadScheduler 用到的 ccxt 方法相同。
+
+    K 线按时间戳确定性生成，同一根 K 线多次请求结果相同；可配置上市时间、最后一根 K 线、
+    单次返回条数上限（截断）、指定 since 的请求抛出 ExchangeError，以及按请求权重的滑动窗口限频；
+    不返回当前时间之后的 K 线，最后一根可能尚未收盘。
+    资金费率每 funding_interval_ms 结算一次，费率同样按结算时间确定性生成。
+    """
+
+    def __init__(self, listed_ms=0, last_ms=None, max_limit=None, fail_since=(), weight_limit=None,
+                 window=1.0, rate_limit_ms=50, funding_interval_ms=FUNDING_INTERVAL_MS):
+        self.listed_ms = listed_ms
+        self.funding_interval_ms = funding_interval_ms
+        self.last_ms = last_ms
+        self.max_limit = max_limit
+        self.fail_since = set(fail_since)
+        # 每 window 秒内允许的请求权重之和，超出时抛出 RateLimitExceeded（与 Binance 的 IP 权重限制相同）
+        self.weight_limit = weight_limit
+        self.window = window
+        self.rateLimit = rate_limit_ms
+        self.enableRateLimit = True
+        self.options = {}
+        self.calls = []
+        self.rejected = 0
+        self.used = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def kline_weight(limit):
+        """Binance K 线接口的请求权重随 limit 分档"""
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+
+    def _charge(self, weight):
+        with self.lock:
+            now = time.monotonic()
+            self.used = [(t, w) for t, w in self.used if now - t < self.window]
+            if self.weight_limit is not None and sum(w for _, w in self.used) + weight > self.weight_limit:
+                self.rejected += 1
+                raise ccxt.RateLimitExceeded('429 Too Many Requests')
+            self.used.append((now, weight))
+
+    def _timestamps(self, since, limit, step):
+        start = max(-(-since // step) * step, -(-self.listed_ms // step) * step)
+        if self.max_limit is not None:
+            limit = min(limit, self.max_limit)
+        ts = np.arange(start, start + limit * step, step, dtype=np.int64)
+        if self.last_ms is not None:
+            ts = ts[ts <= self.last_ms]
+        # 与交易所相同：最多返回到当前正在形成的一根
+        return ts[ts <= time.time() * 1000]
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params=None):
+        self._charge(self.kline_weight(limit))
+        with self.lock:
+            self.calls.append(('ohlcv', self.options.get('defaultType'), since, limit))
+        if since in self.fail_since:
+            raise ccxt.ExchangeError(f'模拟错误: since={since}')
+        step = {'1m': MINUTE_MS, '5m': 5 * MINUTE_MS}[timeframe]
+        ts = self._timestamps(since, limit, step)
+        close = 100 + (ts // step) % 50 * 0.1
+        return [[int(t), c, c + 0.5, c - 0.5, c, 1.0] for t, c in zip(ts, close)]
+
+    @staticmethod
+    def funding_rate(ts, step):
+        return 1e-4 * ((ts // step) % 7 - 3)
+
+    def fetch_funding_rate_history(self, symbol=None, since=None, limit=None, params=None):
+        self._charge(1)
+        with self.lock:
+            self.calls.append(('funding', self.options.get('defaultType'), since, limit))
+        if since in self.fail_since:
+            raise ccxt.ExchangeError(f'模拟错误: since={since}')
+        step = self.funding_interval_ms
+        ts = self._timestamps(since, limit, step)
+        return [{'symbol': symbol, 'timestamp': int(t), 'fundingRate': float(r)}
+                for t, r in zip(ts, self.funding_rate(ts, step))]
+
+
+def attach(fetcher, exchange):
+    """让 fetcher 的所有市场都使用 exchange"""
+    fetcher._create_exchange = lambda data_source, contract_type: exchange
+    fetcher.scheduler.exchanges.clear()
+    return exchange
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import alignment
+from alignment import align_legs
+
+T0 = pd.Timestamp('2024-01-01')
+NAN = np.nan
+
+
+def _leg(name, minutes, values):
+    return pd.Series(values, index=T0 + pd.to_timedelta(minutes, unit='min'), name=name, dtype=np.float64)
+
+
+@pytest.fixture(params=['numba', 'numpy'])
+def legs(request, monkeypatch):
+    if request.param == 'numpy':
+        monkeypatch.setattr(alignment, 'njit', None)
+    return {
+        'spot': _leg('spot', [0, 1, 2, 3, 5], [10, 11, 12, 13, 15]),
+        'future': _leg('future', [0, 2, 3, 4, 5], [20, 22, 23, 24, 25]),
+        'index': _leg('index_price', [0, 1, 2, 5], [30, 31, 32, 35]),
+    }
+
+
+def _minutes(frame):
+    return list((frame.index - T0) // pd.Timedelta('1min'))
+
+
+def test_inner(legs):
+    frame, report = align_legs(legs, policy='inner')
+    assert _minutes(frame) == [0, 2, 5]
+    assert frame.to_numpy().tolist() == [[10, 20, 30], [12, 22, 32], [15, 25, 35]]
+    assert report['dropped'] == {'spot': 2, 'future': 2, 'index': 1} and report['rows'] == 3
+    assert not any(m.any() for m in report['missing'].values())
+    expected = pd.concat([legs[name] for name in legs], axis=1, join='inner')
+    pd.testing.assert_frame_equal(frame, expected, check_names=False, check_freq=False)
+
+
+def test_outer_and_missing_bitmap(legs):
+    frame, report = align_legs(legs, policy='outer', dropna=False)
+    assert _minutes(frame) == [0, 1, 2, 3, 4, 5]
+    np.testing.assert_array_equal(frame.to_numpy(), [[10, 20, 30], [11, NAN, 31], [12, 22, 32],
+                                                     [13, 23, NAN], [NAN, 24, NAN], [15, 25, 35]])
+    assert report['missing']['spot'].tolist() == [False, False, False, False, True, False]
+    assert report['missing']['future'].tolist() == [False, True, False, False, False, False]
+    assert report['missing']['index'].tolist() == [False, False, False, True, True, False]
+    # dropna 只保留各腿都有值的行
+    assert _minutes(align_legs(legs, policy='outer')[0]) == [0, 2, 5]
+
+
+def test_ffill_and_staleness(legs):
+    frame, report = align_legs(legs, policy='ffill')
+    assert _minutes(frame) == [0, 1, 2, 3, 4, 5]
+    np.testing.assert_array_equal(frame.to_numpy(), [[10, 20, 30], [11, 20, 31], [12, 22, 32],
+                                                     [13, 23, 32], [13, 24, 32], [15, 25, 35]])
+    # 填充的值在 missing 中仍标记为缺失
+    assert report['missing']['index'].tolist() == [False, False, False, True, True, False]
+
+    # 超过 1 分钟的旧值视为缺失：第 4 分钟的指数价格（2 分钟前）被屏蔽
+    frame, report = align_legs(legs, policy='ffill', max_staleness='1min', dropna=False)
+    np.testing.assert_array_equal(frame['index_price'].to_numpy(), [30, 31, 32, 32, NAN, 35])
+    assert frame['spot'].to_numpy()[4] == 13
+    frame, _ = align_legs(legs, policy='ffill', max_staleness='1min')
+    assert _minutes(frame) == [0, 1, 2, 3, 5]
+
+
+def test_invalid_policy(legs):
+    with pytest.raises(ValueError):
+        align_legs(legs, policy='left')
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+from synthetic import generate_market_data, generate_pair
+
+
+@pytest.fixture(scope='module')
+def market_data():
+    df = generate_market_data(20_000, seed=1)
+    premium = (df['spot'] - df['future']) / df['spot']
+    df['signal'] = np.where(premium > 6e-4, -1, np.where(premium < -6e-4, 1, 0))
+    return df
+
+
+@pytest.fixture(scope='module')
+def costed_data(market_data):
+    """同一行情附带成交量与 8 小时结算的资金费率列"""
+    spot, future = generate_pair(len(market_data), seed=1)
+    df = market_data.assign(spot_volume=spot['volume'].to_numpy(), future_volume=future['volume'].to_numpy())
+    settlements = pd.date_range(df.index[0], df.index[-1], freq='8h')
+    funding = pd.Series(np.random.default_rng(1).normal(1e-4, 3e-4, len(settlements)), index=settlements)
+    df['funding_rate'] = backtest.funding_per_bar(df.index, funding)
+    return df
+
+
+@pytest.mark.parametrize('enable_fee, enable_slippage', [(False, False), (True, False), (True, True)])
+def test_kernel_matches_reference(market_data, monkeypatch, enable_fee, enable_slippage):
+    monkeypatch.setattr(backtest, 'ENABLE_FEE', enable_fee)
+    monkeypatch.setattr(backtest, 'ENABLE_SLIPPAGE', enable_slippage)
+    assert backtest.check_parity(market_data)
+
+
+def test_reference_uses_cost_columns(costed_data, monkeypatch):
+    """参照实现同样按逐 bar 滑点与资金费计算，带成本列时与数组内核一致"""
+    monkeypatch.setattr(backtest, 'ENABLE_FEE', True)
+    monkeypatch.setattr(backtest, 'ENABLE_SLIPPAGE', True)
+    monkeypatch.setattr(backtest, 'ENABLE_FUNDING', True)
+    assert backtest.check_parity(costed_data)
+    constant = backtest._run_backtest_reference(costed_data[['spot', 'future', 'signal']])
+    assert not constant.equals(backtest._run_backtest_reference(costed_data))
+
+
+def test_parity_without_trades(market_data):
+    df = market_data.copy()
+    df['signal'] = 0
+    assert backtest.check_parity(df)
+
+
+def test_module_settings_apply_at_call_time(market_data, monkeypatch):
+    """运行时修改 backtest.ENABLE_FEE 等全局量，与显式传参的结果相同"""
+    monkeypatch.setattr(backtest, 'ENABLE_DEBUG', False)
+    expected, _ = backtest.run_backtest(market_data, enable_fee=True, take_profit=0.01)
+    monkeypatch.setattr(backtest, 'ENABLE_FEE', True)
+    monkeypatch.setattr(backtest, 'TAKE_PROFIT', 0.01)
+    actual, _ = backtest.run_backtest(market_data)
+    assert len(actual) and actual.equals(expected)
+    assert not actual.equals(backtest.run_backtest(market_data, enable_fee=False)[0])
+
+
+def test_chunked_uses_module_settings(market_data, monkeypatch):
+    import chunked
+
+    monkeypatch.setattr(backtest, 'ENABLE_DEBUG', False)
+    monkeypatch.setattr(chunked, 'ENABLE_DEBUG', False)
+    blocks = lambda: (market_data.iloc[lo:lo + 5000] for lo in range(0, len(market_data), 5000))
+    expected, _ = chunked.run_backtest_chunked(blocks(), zscore_window=60, enable_fee=True, take_profit=0.01)
+    monkeypatch.setattr(backtest, 'ENABLE_FEE', True)
+    monkeypatch.setattr(backtest, 'TAKE_PROFIT', 0.01)
+    actual, _ = chunked.run_backtest_chunked(blocks(), zscore_window=60)
+    assert len(actual) and actual.equals(expected)
+
+
+@pytest.mark.parametrize('block_bars', [997, 5000])
+def test_chunked_matches_run_backtest(market_data, monkeypatch, block_bars):
+    """块很小时头寸跨块持有，分块回测的交易记录与指标仍与一次性回测一致"""
+    import chunked
+
+    monkeypatch.setattr(backtest, 'ENABLE_DEBUG', False)
+    monkeypatch.setattr(chunked, 'ENABLE_DEBUG', False)
+    params = dict(zscore_window=60, enable_fee=True, enable_slippage=True)
+    errors = chunked.check_parity(market_data, block_bars, **params)
+    assert errors and max(errors.values()) < 1e-9
+
+    positions, _ = chunked.run_backtest_chunked(chunked.iter_frame_blocks(market_data, block_bars), **params)
+    entry = market_data.index.get_indexer(positions['entry_time']) // block_bars
+    exit_ = market_data.index.get_indexer(positions['exit_time']) // block_bars
+    assert (entry != exit_).sum() > 0
@@ -0,0 +1,147 @@
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ccxt = pytest.importorskip('ccxt')
+
+from backtest import funding_per_bar
+from datastore import FUNDING_INTERVAL_MS
+from mock_exchange import MockExchange, MINUTE_MS, attach
+
+REQUEST = dict(symbol='BTC/USDT', start_time='2024-01-02 00:00:00', range='1d', timeframe='1m',
+               contract_type='spot')
+
+
+FUNDING_REQUEST = dict(symbol='BTC/USDT', start_time='2024-01-01 00:00:00', range='10d')
+
+
+def expected_index(plan):
+    return np.arange(plan['start_ms'], plan['end_ms'], MINUTE_MS)
+
+
+def timestamps(df):
+    return df.index.values.astype('datetime64[ms]').astype(np.int64)
+
+
+def test_only_gaps_are_downloaded(fetcher):
+    exchange = attach(fetcher, MockExchange())
+    inner = fetcher.fetch_data(**REQUEST)
+    inner_plan = fetcher._plan_request(**REQUEST)
+    assert not inner_plan['missing']
+    assert np.array_equal(timestamps(inner), expected_index(inner_plan))
+
+    exchange.calls.clear()
+    outer_request = dict(REQUEST, start_time='2024-01-01 00:00:00', range='3d')
+    outer_plan = fetcher._plan_request(**outer_request)
+    assert outer_plan['missing'] == [(outer_plan['start_ms'], inner_plan['start_ms']),
+                                     (inner_plan['end_ms'], outer_plan['end_ms'])]
+    outer = fetcher.fetch_data(**outer_request)
+    # 已缓存的一天不再请求，两侧的新数据与原有数据合并成连续的序列
+    assert all(not inner_plan['start_ms'] <= since < inner_plan['end_ms'] for _, _, since, _ in exchange.calls)
+    assert np.array_equal(timestamps(outer), expected_index(outer_plan))
+    assert not fetcher.store.missing(outer_plan['store_key'], outer_plan['start_ms'], outer_plan['end_ms'])
+    assert outer.loc[inner.index].equals(inner)
+
+
+def test_truncated_window_is_resumed(fetcher):
+    plan = fetcher._plan_request(**REQUEST)
+    # 每次最多返回 300 根：只记录到实际返回的最后一根 K 线为止
+    exchange = attach(fetcher, MockExchange(max_limit=300))
+    fetcher.fetch_data(**REQUEST)
+    missing = fetcher.store.missing(plan['store_key'], plan['start_ms'], plan['end_ms'])
+    assert missing and missing[0][0] == plan['start_ms'] + 300 * MINUTE_MS
+
+    exchange.max_limit = None
+    exchange.calls.clear()
+    df = fetcher.fetch_data(**REQUEST)
+    assert sorted(since for _, _, since, _ in exchange.calls) == [start for start, _ in missing]
+    assert np.array_equal(timestamps(df), expected_index(plan))
+    assert not fetcher.store.missing(plan['store_key'], plan['start_ms'], plan['end_ms'])
+
+
+def test_failed_window_is_resumed(fetcher):
+    plan = fetcher._plan_request(**REQUEST)
+    failed = plan['start_ms'] + fetcher.scheduler.batch_limit * MINUTE_MS
+    exchange = attach(fetcher, MockExchange(fail_since={failed}))
+    df = fetcher.fetch_data(**REQUEST)
+    # 失败的窗口不记入覆盖区间，其余窗口正常落盘
+    assert fetcher.store.missing(plan['store_key'], plan['start_ms'], plan['end_ms']) == [(failed, plan['end_ms'])]
+    assert timestamps(df)[-1] == failed - MINUTE_MS
+
+    exchange.fail_since.clear()
+    exchange.calls.clear()
+    df = fetcher.fetch_data(**REQUEST)
+    assert [since for _, _, since, _ in exchange.calls] == [failed]
+    assert np.array_equal(timestamps(df), expected_index(plan))
+
+
+def test_unclosed_candle_is_not_stored(fetcher):
+    attach(fetcher, MockExchange())
+    now_ms = int(time.time() * 1000)
+    start = datetime.fromtimestamp((now_ms - 2 * 60 * MINUTE_MS) // 1000).strftime('%Y-%m-%d %H:%M:%S')
+    request = dict(REQUEST, start_time=start)
+    plan = fetcher._plan_request(**request)
+    closed_before = now_ms // MINUTE_MS * MINUTE_MS
+    df = fetcher.fetch_data(**request)
+    closed_after = int(time.time() * 1000) // MINUTE_MS * MINUTE_MS
+    # 只落盘已收盘的 K 线，覆盖区间止于当前未收盘的一根，之后的部分下次续传
+    assert closed_before - MINUTE_MS <= timestamps(df)[-1] < closed_after
+    gap_start = fetcher.store.missing(plan['store_key'], plan['start_ms'], plan['end_ms'])[0][0]
+    assert gap_start == timestamps(df)[-1] + MINUTE_MS
+
+
+def funding_range(fetcher, request=FUNDING_REQUEST):
+    start_ms = int(datetime.strptime(request['start_time'], '%Y-%m-%d %H:%M:%S').timestamp()) * 1000
+    return start_ms, start_ms + fetcher._parse_range(request['range'])
+
+
+def test_funding_is_cached_and_mapped_to_bars(fetcher):
+    exchange = attach(fetcher, MockExchange())
+    start_ms, end_ms = funding_range(fetcher)
+    funding = fetcher.fetch_funding(**FUNDING_REQUEST)
+    settlements = np.arange(-(-start_ms // FUNDING_INTERVAL_MS) * FUNDING_INTERVAL_MS, end_ms, FUNDING_INTERVAL_MS)
+    assert np.array_equal(timestamps(funding), settlements)
+    assert np.array_equal(funding.to_numpy(), MockExchange.funding_rate(settlements, FUNDING_INTERVAL_MS))
+    assert exchange.calls and all(kind == 'funding' for kind, _, _, _ in exchange.calls)
+
+    # 再次请求直接读缓存
+    exchange.calls.clear()
+    key = fetcher.store.funding_key('binance', FUNDING_REQUEST['symbol'])
+    assert not fetcher.store.missing(key, start_ms, end_ms)
+    assert fetcher.fetch_funding(**FUNDING_REQUEST).equals(funding)
+    assert not exchange.calls
+
+    # 每次结算计入结算时刻及之后的第一根 bar
+    index = pd.date_range(pd.to_datetime(start_ms, unit='ms'), pd.to_datetime(end_ms, unit='ms'), freq='1h',
+                          inclusive='left')
+    rates = funding_per_bar(index, funding)
+    positions = index.get_indexer(funding.index)
+    assert (positions >= 0).all()
+    assert np.array_equal(rates[positions], funding.to_numpy())
+    assert not np.delete(rates, positions).any()
+
+
+def test_dense_funding_is_paginated(fetcher):
+    """结算间隔短于 8 小时时一页取不完：覆盖区间记到最后一条之后，下次从那里续传"""
+    interval = FUNDING_INTERVAL_MS // 2
+    exchange = attach(fetcher, MockExchange(funding_interval_ms=interval))
+    start_ms, end_ms = funding_range(fetcher)
+    key = fetcher.store.funding_key('binance', FUNDING_REQUEST['symbol'])
+    funding = fetcher.fetch_funding(**FUNDING_REQUEST)
+    missing = fetcher.store.missing(key, start_ms, end_ms)
+    assert missing == [(timestamps(funding)[-1] + 1, end_ms)]
+
+    for _ in range(10):
+        if not missing:
+            break
+        exchange.calls.clear()
+        funding = fetcher.fetch_funding(**FUNDING_REQUEST)
+        assert [since for _, _, since, _ in exchange.calls] == [missing[0][0]]
+        missing = fetcher.store.missing(key, start_ms, end_ms)
+    assert not missing
+    settlements = np.arange(-(-start_ms // interval) * interval, end_ms, interval)
+    assert np.array_equal(timestamps(funding), settlements)
+    assert np.array_equal(funding.to_numpy(), MockExchange.funding_rate(settlements, interval))
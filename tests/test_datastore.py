@@ -0,0 +1,114 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datastore import MarketDataStore, DAY_MS, OHLCV_COLUMNS
+
+MINUTE_MS = 60 * 1000
+KEY = ('binance', 'spot', 'BTC/USDT', '1m')
+DAY = 19723 * DAY_MS    # 2024-01-01
+
+
+def _ohlcv(start_ms, n, step=MINUTE_MS, offset=0.0):
+    ts = start_ms + np.arange(n, dtype=np.int64) * step
+    close = 100 + np.arange(n) % 37 * 0.25 + offset
+    return np.column_stack([ts, close, close + 1, close - 1, close + 0.5, np.arange(n) % 5 + 1.0])
+
+
+def test_write_read_across_day_boundary(tmp_path):
+    store = MarketDataStore(str(tmp_path))
+    rows = _ohlcv(DAY + DAY_MS - 30 * MINUTE_MS, 60)
+    assert store.write(KEY, rows) == 60
+    assert store.partitions(KEY) == [DAY // DAY_MS, DAY // DAY_MS + 1]
+
+    columns = store.read(KEY)
+    np.testing.assert_array_equal(columns['timestamp'], rows[:, 0].astype(np.int64))
+    for i, name in enumerate(OHLCV_COLUMNS):
+        np.testing.assert_array_equal(columns[name], rows[:, i + 1])
+    # 跨分区的半开区间读取
+    part = store.read(KEY, int(rows[10, 0]), int(rows[50, 0]))
+    np.testing.assert_array_equal(part['timestamp'], rows[10:50, 0].astype(np.int64))
+
+    # 重叠写入按时间戳去重，新数据覆盖旧数据
+    store.write(KEY, _ohlcv(int(rows[20, 0]), 20, offset=1000))
+    df = store.load_frame(KEY)
+    assert len(df) == 60 and df['close'].iloc[20] == rows[0, 4] + 1000 and df['close'].iloc[40] == rows[40, 4]
+    assert df.index.is_monotonic_increasing
+
+
+def test_coverage_merge_and_missing(tmp_path):
+    store = MarketDataStore(str(tmp_path))
+    start, end = DAY, DAY + 100 * MINUTE_MS
+    assert store.missing(KEY, start, end) == [(start, end)]
+    store.add_coverage(KEY, start + 10 * MINUTE_MS, start + 20 * MINUTE_MS)
+    store.add_coverage(KEY, start + 40 * MINUTE_MS, start + 50 * MINUTE_MS)
+    assert store.missing(KEY, start, end) == [(start, start + 10 * MINUTE_MS),
+                                              (start + 20 * MINUTE_MS, start + 40 * MINUTE_MS),
+                                              (start + 50 * MINUTE_MS, end)]
+    # 相接的区间合并为一段
+    store.add_coverage(KEY, start + 20 * MINUTE_MS, start + 40 * MINUTE_MS)
+    assert store.coverage(KEY) == [(start + 10 * MINUTE_MS, start + 50 * MINUTE_MS)]
+    assert store.has_range(KEY, start + 15 * MINUTE_MS, start + 45 * MINUTE_MS)
+    assert not store.has_range(KEY, start, start + 45 * MINUTE_MS)
+
+
+def test_migrate_pickle_cache(tmp_path):
+    pytest.importorskip('ccxt')
+    from datastore import migrate_pickle_cache
+
+    # 被截断的旧缓存：请求 1 天，只拿到前 600 根
+    rows = _ohlcv(DAY, 600).tolist()
+    with open(tmp_path / 'binance_spot_BTCUSDT_1m_2024-01-01-00:00:00_1d.pkl', 'wb') as f:
+        pickle.dump(rows, f)
+    (tmp_path / 'notacache.pkl').write_bytes(pickle.dumps([]))
+    store = MarketDataStore(str(tmp_path / 'store'))
+
+    migrated = migrate_pickle_cache(str(tmp_path), store)
+    assert [os.path.basename(path) for path in migrated] == ['binance_spot_BTCUSDT_1m_2024-01-01-00:00:00_1d.pkl']
+    key = ('binance', 'spot', 'BTCUSDT', '1m')
+    assert store.coverage(key) == [(DAY, DAY + 600 * MINUTE_MS)]
+    assert store.missing(key, DAY, DAY + DAY_MS) == [(DAY + 600 * MINUTE_MS, DAY + DAY_MS)]
+    np.testing.assert_array_equal(store.read(key)['close'], np.asarray(rows)[:, 4])
+
+
+def test_timeframe_to_ms():
+    from datastore import timeframe_to_ms
+    from synthetic import generate_pair
+
+    assert [timeframe_to_ms(tf) for tf in ('1m', '15m', '4h', '1d')] == [60_000, 900_000, 14_400_000, 86_400_000]
+    for bad in ('0m', '5x', 'm'):
+        with pytest.raises(ValueError):
+            timeframe_to_ms(bad)
+    spot, _ = generate_pair(3, timeframe='4h')
+    assert (spot.index[1] - spot.index[0]) == pd.Timedelta('4h')
+
+
+def _pandas_resample(df, rule):
+    return df.resample(rule, origin='epoch').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+                                                  'volume': 'sum'}).dropna()
+
+
+def test_resampled_matches_pandas_and_rebuilds_after_base_write(tmp_path):
+    store = MarketDataStore(str(tmp_path))
+    start, end, five = DAY, DAY + 60 * MINUTE_MS, 5 * MINUTE_MS
+    store.write(KEY, _ohlcv(start, 30))
+    store.add_coverage(KEY, start, start + 30 * MINUTE_MS)
+
+    first = store.load_resampled(KEY, '5m', five, start, end)
+    assert len(first) == 6
+    pd.testing.assert_frame_equal(first, _pandas_resample(store.load_frame(KEY), '5min'), check_freq=False,
+                                  check_names=False)
+
+    # 基础数据新增下载（并改写了已聚合区间内的一根）后，派生数据整体重建
+    rows = _ohlcv(start + 29 * MINUTE_MS, 31, offset=500)
+    store.write(KEY, rows)
+    store.add_coverage(KEY, start + 29 * MINUTE_MS, end)
+    second = store.load_resampled(KEY, '5m', five, start, end)
+    assert len(second) == 12
+    pd.testing.assert_frame_equal(second, _pandas_resample(store.load_frame(KEY), '5min'), check_freq=False,
+                                  check_names=False)
+    assert second['close'].iloc[5] == rows[0, 4]
+    assert store.coverage(store.derived_key(KEY, '5m')) == [(start, end)]
@@ -0,0 +1,86 @@
+import time
+
+import numpy as np
+import pytest
+
+ccxt = pytest.importorskip('ccxt')
+
+import downloader
+from mock_exchange import MockExchange, MINUTE_MS, attach
+
+REQUEST = dict(symbol='BTC/USDT', start_time='2024-01-02 00:00:00', range='1d', timeframe='1m',
+               contract_type='spot')
+# 令牌桶每秒 1000 / rate_limit_ms 个权重；交易所限额多留一次请求的余量，吸收线程调度的抖动
+RATE_LIMIT_MS = 50
+WEIGHT_LIMIT = 1000 // RATE_LIMIT_MS + 2
+
+
+def test_weighted_requests_saturate_without_rejections(fetcher):
+    exchange = attach(fetcher, MockExchange(weight_limit=WEIGHT_LIMIT, rate_limit_ms=RATE_LIMIT_MS))
+    # limit=100 的 K 线请求权重为 2：按请求数计数会以两倍的权重触发限频
+    fetcher.scheduler.batch_limit = 100
+    plan = fetcher._plan_request(**REQUEST)
+    total = sum(MockExchange.kline_weight(-(-(until - since) // MINUTE_MS)) for since, until in
+                fetcher.scheduler._windows(plan['start_ms'], plan['end_ms'], MINUTE_MS))
+
+    start = time.perf_counter()
+    fetcher.fetch_data(**REQUEST)
+    elapsed = time.perf_counter() - start
+    assert exchange.rejected == 0
+    assert not fetcher.store.missing(plan['store_key'], plan['start_ms'], plan['end_ms'])
+    # 接近限额运行：耗时不超过按权重计算的理论值太多
+    assert elapsed < 2 * total * RATE_LIMIT_MS / 1000 + 1
+
+
+def test_unit_weight_overruns_weighted_limit(fetcher, monkeypatch):
+    monkeypatch.setattr(downloader, 'request_weight', lambda timeframe, limit: 1)
+    exchange = attach(fetcher, MockExchange(weight_limit=WEIGHT_LIMIT, rate_limit_ms=RATE_LIMIT_MS))
+    fetcher.scheduler.batch_limit = 100
+    fetcher.scheduler.base_delay = 0.01
+    fetcher.fetch_data(**REQUEST)
+    assert exchange.rejected > 0
+
+
+def test_empty_response_is_recorded_as_covered(fetcher):
+    request = dict(REQUEST, range='2d')
+    plan = fetcher._plan_request(**request)
+    last = plan['start_ms'] + 499 * MINUTE_MS
+    # 最后一根 K 线在第一个窗口中间：之后的两个窗口返回空列表
+    exchange = attach(fetcher, MockExchange(last_ms=last))
+    df = fetcher.fetch_data(**request)
+    assert df.index[-1].value // 10 ** 6 == last
+    assert fetcher.store.missing(plan['store_key'], plan['start_ms'], plan['end_ms']) == \
+        [(last + MINUTE_MS, plan['start_ms'] + fetcher.scheduler.batch_limit * MINUTE_MS)]
+
+    exchange.calls.clear()
+    fetcher.fetch_data(**request)
+    assert [since for _, _, since, _ in exchange.calls] == [last + MINUTE_MS]
+
+
+def test_weight_above_bucket_capacity_keeps_average_rate():
+    bucket = downloader.TokenBucket(rate=100)
+    start = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire(5)
+    # 首次放行不等待，之后每次需还清 5 个权重
+    assert 0.2 <= time.perf_counter() - start < 0.5
+
+
+def test_unexpected_error_only_fails_its_window(fetcher):
+    exchange = attach(fetcher, MockExchange())
+    plan = fetcher._plan_request(**REQUEST)
+    broken = plan['start_ms']
+    fetch_ohlcv = exchange.fetch_ohlcv
+
+    def flaky(symbol, timeframe='1m', since=None, limit=None, params=None):
+        if symbol == 'ETH/USDT' and since == broken:
+            raise KeyError('close')
+        return fetch_ohlcv(symbol, timeframe, since, limit, params)
+    exchange.fetch_ohlcv = flaky
+
+    btc, eth = fetcher.fetch_many([REQUEST, dict(REQUEST, symbol='ETH/USDT')])
+    # 意外异常只让该窗口留待续传，其余窗口与其他市场照常完成
+    assert len(btc) == 1440
+    eth_key = ('binance', 'spot', 'ETH/USDT', '1m')
+    assert fetcher.store.missing(eth_key, plan['start_ms'], plan['end_ms']) == \
+        [(broken, broken + fetcher.scheduler.batch_limit * MINUTE_MS)]
@@ -0,0 +1,40 @@
+import tracemalloc
+
+import numpy as np
+
+from instrumentation import Instrumentation, _rss_current_mb, _rss_peak_mb
+
+MB = 1024 * 1024
+
+
+def test_nested_stage_keeps_outer_traced_peak():
+    instrument = Instrumentation(enabled=True, trace_memory=True)
+    with instrument.stage('outer'):
+        block = np.ones(40 * MB // 8)
+        del block
+        with instrument.stage('inner'):
+            small = np.ones(MB // 8)
+            del small
+    records = {record['stage']: record for record in instrument.records}
+    # 内层阶段 reset_peak 之前外层已分配过 40 MB，外层峰值不应被内层覆盖
+    assert records['outer']['traced_peak_mb'] >= 40
+    assert 1 <= records['inner']['traced_peak_mb'] < 40
+    assert records['inner']['parent'] == 'outer'
+    assert not tracemalloc.is_tracing()
+
+
+def test_stage_memory_is_per_stage():
+    instrument = Instrumentation(enabled=True)
+    # 超出进程已有峰值 100 MB，保证本阶段创新高
+    size_mb = int(_rss_peak_mb() - _rss_current_mb()) + 100
+    with instrument.stage('heavy'):
+        block = np.ones(size_mb * MB // 8)
+        del block
+    with instrument.stage('light'):
+        pass
+    heavy, light = instrument.records
+    assert heavy['peak_rss_growth_mb'] >= 50
+    # 之后的阶段不再沿用前一阶段抬高的进程峰值
+    assert light['peak_rss_growth_mb'] < 10
+    assert light['process_peak_rss_mb'] >= heavy['peak_rss_growth_mb']
+    assert 'process_peak_rss_mb' in instrument.report()
@@ -0,0 +1,47 @@
+import json
+import os
+
+import pandas as pd
+
+import jobqueue
+import synthetic
+
+
+def _loader(data):
+    if data['symbol'] == 'BAD/USDT':
+        raise ValueError('数据加载失败')
+    spot, future = synthetic.generate_pair(2000, seed=0)
+    return pd.DataFrame({'spot': spot['close'], 'future': future['close']})
+
+
+def _submit(queue_dir, symbols):
+    return jobqueue.submit_study(str(queue_dir), symbols=symbols, params=[{'zscore_window': 60}], chunk=1)
+
+
+def test_failed_job_moves_to_failed_and_worker_continues(tmp_path):
+    _submit(tmp_path, ('BAD/USDT', 'BTC/USDT'))
+    assert jobqueue.run_worker(str(tmp_path), worker_id='w', loader=_loader, poll=0) == 1
+    status = jobqueue.queue_status(str(tmp_path))
+    assert status == {'pending': 0, 'claimed': 0, 'results': 1, 'failed': 1}
+    name = os.listdir(tmp_path / 'failed')[0]
+    with open(tmp_path / 'failed' / name, encoding='utf-8') as f:
+        job = json.load(f)
+    assert job['attempts'] == jobqueue.MAX_ATTEMPTS and 'ValueError' in job['error']
+    assert len(jobqueue.collect_results(str(tmp_path))) == 1
+
+
+def test_worker_tolerates_reclaimed_job(tmp_path):
+    _submit(tmp_path, ('BTC/USDT',))
+
+    def loader(data):
+        # 模拟任务执行期间被 requeue_stale 收回：领取文件消失
+        for name in os.listdir(tmp_path / 'claimed'):
+            os.replace(tmp_path / 'claimed' / name, tmp_path / 'pending' / name)
+        if loader.calls == 0:
+            loader.calls += 1
+            raise RuntimeError('worker 中断')
+        return _loader(data)
+    loader.calls = 0
+
+    assert jobqueue.run_worker(str(tmp_path), worker_id='w', loader=loader, poll=0) == 1
+    assert jobqueue.queue_status(str(tmp_path))['results'] == 1
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+import backtest
+import strategy
+from marketframe import MarketFrame
+from synthetic import generate_pair
+
+
+def _market_data(n_bars=20_000):
+    spot, future = generate_pair(n_bars, seed=2)
+    df = strategy._leg(spot, 'spot').join(strategy._leg(future, 'future'))
+    funding = np.zeros(n_bars)
+    funding[::96] = 1e-4
+    df['funding_rate'] = funding
+    return df
+
+
+def test_from_frame_keeps_cost_columns():
+    df = _market_data(1000)
+    frame = MarketFrame.from_frame(df)
+    for name in ('spot_volume', 'future_volume', 'funding_rate'):
+        assert name in frame.columns
+        np.testing.assert_array_equal(frame[name].to_numpy(), df[name].to_numpy())
+    assert list(frame.to_frame().columns) == ['spot', 'future', 'spot_volume', 'future_volume', 'funding_rate']
+
+
+def test_compact_backtest_applies_funding_and_slippage(monkeypatch):
+    for module in (backtest, strategy):
+        monkeypatch.setattr(module, 'ENABLE_DEBUG', False)
+    monkeypatch.setattr(strategy, 'ENABLE_SIGNAL_CACHE', False)
+    costs = dict(enable_fee=True, enable_slippage=True, enable_funding=True)
+    results = []
+    for compact in (False, True):
+        monkeypatch.setattr(strategy, 'COMPACT_MARKET_DATA', compact)
+        engine = strategy.MeanReversionStrategy()
+        engine.config()
+        engine.market_data = _market_data()
+        engine.generate_signals()
+        results.append(backtest.run_backtest(engine.market_data, **costs)[0])
+    expected, actual = results
+    assert len(expected)
+    # MarketFrame 的索引为毫秒精度，时间列的 dtype 可能与原 DataFrame 不同
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    without_funding = backtest.run_backtest(engine.market_data, enable_fee=True, enable_slippage=True,
+                                            enable_funding=False)[0]
+    assert not actual.equals(without_funding)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics import drawdown_stats, performance_stats, StreamingStats
+
+
+def _hours(n):
+    return pd.date_range('2024-01-01', periods=n, freq='1h')
+
+
+def test_drawdown_by_hand():
+    index = _hours(7)
+    stats = drawdown_stats(index, [100, 110, 99, 105, 121, 90, 95])
+    # 前高 121（第 4 小时），谷底 90（第 5 小时），之后未收复
+    assert stats['max_drawdown'] == pytest.approx((90 / 121 - 1) * 100)
+    assert stats['peak_time'] == index[4] and stats['trough_time'] == index[5]
+    assert np.isnan(stats['max_drawdown_recovery']) and stats['recovery_time'] is None
+    # 最长水下时间：110 之后的第 2、3 小时，以及 121 之后的第 5、6 小时
+    assert stats['max_drawdown_duration'] == 2.0
+
+    stats = drawdown_stats(_hours(5), [100, 80, 90, 100, 120])
+    assert stats['max_drawdown'] == pytest.approx(-20.0)
+    assert stats['max_drawdown_recovery'] == 2.0 and stats['recovery_time'] == _hours(5)[3]
+    assert stats['max_drawdown_duration'] == 2.0
+
+    assert drawdown_stats(_hours(3), [100, 101, 102])['max_drawdown'] == 0.0
+
+
+@pytest.mark.parametrize('block', [5, 999, 20_000])
+def test_streaming_matches_batch(block):
+    rng = np.random.default_rng(5)
+    n = 20_000
+    index = pd.date_range('2024-01-01', periods=n, freq='5min')
+    equity = 10_000 * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    position = rng.integers(-1, 2, n)
+    expected = performance_stats(index, equity, position, traded=5e5)
+
+    stream = StreamingStats()
+    for lo in range(0, n, block):
+        stream.update(index[lo:lo + block], equity[lo:lo + block], position[lo:lo + block])
+    actual = stream.result(traded=5e5)
+
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, float):
+            assert actual[key] == pytest.approx(value, rel=1e-9, nan_ok=True), key
+        else:
+            assert actual[key] == value, key
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from online import OnlineSignalEngine, RollingStats
+from strategy import compute_premium_pct, rolling_zscore, compute_volatility, signals_from_prices
+from synthetic import generate_market_data
+
+
+def test_rolling_stats_match_pandas():
+    x = np.random.default_rng(0).normal(size=5000).cumsum()
+    stats = RollingStats(50, resync_every=777)
+    mean, std = np.array([stats.update(v) for v in x.tolist()]).T
+    np.testing.assert_allclose(mean, pd.Series(x).rolling(50).mean(), rtol=0, atol=1e-9)
+    np.testing.assert_allclose(std, pd.Series(x).rolling(50).std(), rtol=0, atol=1e-9)
+
+
+def test_streaming_signals_match_batch():
+    market_data = generate_market_data(50_000, seed=0)
+    spot, future = market_data['spot'].to_numpy(), market_data['future'].to_numpy()
+    params = {'zscore_window': 120, 'zscore_threshold': 2.1, 'min_volatility': 0.05}
+    online = OnlineSignalEngine(**params).run(spot, future)
+
+    premium_pct = pd.Series(compute_premium_pct(spot, future))
+    _, _, zscore = rolling_zscore(premium_pct, params['zscore_window'])
+    np.testing.assert_allclose(online['zscore'], zscore, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(online['volatility'], compute_volatility(premium_pct), rtol=0, atol=1e-9)
+    signal = signals_from_prices(spot, future, **params)
+    assert (signal != 0).any()
+    np.testing.assert_array_equal(online['signal'].to_numpy(), signal)
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+from panel import panel_signals, run_backtest_panel
+from strategy import signals_from_prices
+from synthetic import generate_pair
+
+SYMBOLS = ('BTC/USDT', 'ETH/USDT', 'SOL/USDT')
+PARAMS = {'zscore_window': 60, 'zscore_threshold': 2.1, 'min_volatility': 0.05}
+
+
+@pytest.fixture(scope='module')
+def prices():
+    pairs = [generate_pair(20_000, seed=seed) for seed in range(len(SYMBOLS))]
+    index = pairs[0][0].index
+    spot = np.asfortranarray(np.column_stack([s['close'].to_numpy() for s, _ in pairs]))
+    future = np.asfortranarray(np.column_stack([f['close'].to_numpy() for _, f in pairs]))
+    # 第三个品种较晚上市
+    spot[:3000, 2] = np.nan
+    future[:3000, 2] = np.nan
+    return index, spot, future
+
+
+@pytest.mark.parametrize('enable_jit', [True, False])
+def test_panel_matches_per_symbol(prices, monkeypatch, enable_jit):
+    monkeypatch.setattr(backtest, 'ENABLE_JIT', enable_jit)
+    index, spot, future = prices
+    signal = panel_signals(spot, future, **PARAMS)['signal']
+    positions, metrics = run_backtest_panel(index, spot, future, signal, SYMBOLS)
+
+    for j, symbol in enumerate(SYMBOLS):
+        valid = ~np.isnan(spot[:, j])
+        spot_j, future_j = spot[valid, j], future[valid, j]
+        expected_signal = signals_from_prices(spot_j, future_j, **PARAMS)
+        np.testing.assert_array_equal(signal[valid, j], expected_signal)
+        expected, expected_metrics = backtest.backtest_arrays(pd.DatetimeIndex(index[valid]), spot_j, future_j,
+                                                              expected_signal, raw_metrics=True)
+        assert len(expected) and positions[symbol].equals(expected)
+        row = metrics.loc[symbol]
+        pd.testing.assert_series_equal(row, pd.Series(expected_metrics, dtype=row.dtype), check_names=False)
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+import paper
+from synthetic import generate_pair
+
+ENGINE_PARAMS = {'zscore_window': 60, 'zscore_threshold': 1.8, 'min_volatility': 0.0}
+
+
+@pytest.fixture(scope='module')
+def legs():
+    return generate_pair(3000, seed=3)
+
+
+@pytest.mark.parametrize('enable_fee, enable_slippage, enable_funding',
+                         [(False, False, False), (True, True, False), (True, True, True)])
+def test_paper_trading_matches_backtest(legs, monkeypatch, enable_fee, enable_slippage, enable_funding):
+    monkeypatch.setattr(backtest, 'ENABLE_FEE', enable_fee)
+    monkeypatch.setattr(backtest, 'ENABLE_SLIPPAGE', enable_slippage)
+    monkeypatch.setattr(backtest, 'ENABLE_FUNDING', enable_funding)
+    spot, future = legs
+    # 每 8 小时结算一次，含一条早于首根 K 线（忽略）与一条不在 K 线时刻上的结算
+    times = pd.date_range(spot.index[0] - pd.Timedelta('8h'), spot.index[-1], freq='8h') + pd.Timedelta('1min')
+    funding = pd.Series(np.where(np.arange(len(times)) % 2, 3e-4, -2e-4), index=times)
+    result = paper.check_parity(spot, future, ENGINE_PARAMS, funding)
+    assert result['signal_mismatches'] == 0
+    assert result['trades'] > 0 and result['trades_match']
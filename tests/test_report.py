@@ -0,0 +1,20 @@
+import re
+
+from report import write_index
+
+
+def test_index_columns_cover_runs_without_trades(tmp_path):
+    no_trades = {"初始资金": 10000, "最终资金": 10000, "交易次数": 0}
+    traded = {"初始资金": 10000, "最终资金": 10500.0, "总收益": 500.0, "交易次数": 3, "夏普比率": 1.2}
+    entries = [
+        {'name': 'report_0000', 'params': {'zscore_window': 60}, 'metrics': no_trades, 'files': ['a.png']},
+        {'name': 'report_0001', 'params': {'zscore_window': 120, 'take_profit': 0.01}, 'metrics': traded,
+         'files': ['b.png']},
+    ]
+    with open(write_index(str(tmp_path), entries), encoding='utf-8') as f:
+        page = f.read()
+    header = re.findall(r'<th>(.*?)</th>', page)
+    assert header == ['报告', 'zscore_window', 'take_profit', '初始资金', '最终资金', '交易次数', '总收益', '夏普比率',
+                      '图表']
+    rows = re.findall(r'<tr><td>.*?</tr>', page)
+    assert [len(re.findall(r'<td>', row)) for row in rows] == [len(header)] * 2
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+import backtest
+import search
+from sweep import param_grid
+from synthetic import generate_market_data
+
+N_BARS = 2700
+MIN_BARS = 100
+
+
+@pytest.fixture(scope='module')
+def market_data():
+    return generate_market_data(N_BARS, seed=3)
+
+
+@pytest.fixture(autouse=True)
+def quiet(monkeypatch):
+    monkeypatch.setattr(backtest, 'ENABLE_DEBUG', False)
+
+
+def test_successive_halving_rungs(market_data):
+    params = param_grid({'zscore_window': [10, 20, 30], 'zscore_threshold': [1.5, 2.0, 2.5],
+                         'take_profit': [0.005, 0.01, 0.02]})
+    history, report = search.successive_halving(market_data, params, eta=3, min_bars=MIN_BARS, n_jobs=1)
+    # 27 组候选：每轮保留 1/3，数据长度乘以 3，最后一轮在完整数据上
+    assert [(r['configs'], r['bars']) for r in report['rungs']] == [(27, 100), (9, 300), (3, 900), (1, N_BARS)]
+    assert report['bar_evals'] == 27 * 100 + 9 * 300 + 3 * 900 + N_BARS
+    assert report['grid_bar_evals'] == 27 * N_BARS
+    assert report['saved'] == pytest.approx(1 - report['bar_evals'] / report['grid_bar_evals'])
+    assert len(history) == 27 + 9 + 3 + 1
+    assert history.groupby('rung')['bars'].agg(['first', 'size']).values.tolist() == \
+        [[100, 27], [300, 9], [900, 3], [N_BARS, 1]]
+    last = history[history['rung'] == 3].iloc[0]
+    assert {k: last[k] for k in report['best']} == report['best']
+    assert report['best_score'] == last['最终资金']
+
+
+def test_hyperband_brackets(market_data):
+    space = {'zscore_window': [10, 20, 30], 'zscore_threshold': (1.5, 2.5)}
+    history, report = search.hyperband(market_data, space, eta=3, min_bars=MIN_BARS, n_jobs=1, seed=0)
+    rungs = {b['bracket']: [(r['configs'], r['bars']) for r in b['rungs']] for b in report['brackets']}
+    assert rungs == {
+        3: [(27, 100), (9, 300), (3, 900), (1, N_BARS)],
+        2: [(12, 300), (4, 900), (2, N_BARS)],
+        1: [(6, 900), (2, N_BARS)],
+        0: [(4, N_BARS)],
+    }
+    assert report['candidates'] == 27 + 12 + 6 + 4
+    assert report['bar_evals'] == sum(c * b for bracket in rungs.values() for c, b in bracket)
+    assert report['grid_bar_evals'] == report['candidates'] * N_BARS
+    assert len(history) == sum(c for bracket in rungs.values() for c, _ in bracket)
+    final = history[history['bars'] == N_BARS]
+    assert report['best_score'] == final['最终资金'].max()
+
+
+def test_compare_with_grid_ties(market_data):
+    """目标值相同但参数不同的搜索结果不算与网格最优相同"""
+    params = search._normalize(param_grid({'zscore_window': [10], 'zscore_threshold': [50.0, 60.0]}))
+    history = pd.DataFrame(params)
+    report = {'best': params[1], 'bar_evals': 2 * N_BARS, 'seconds': 0.0}
+    result = search.compare_with_grid(market_data, history, report, n_jobs=1)
+    assert result['grid_best'] == params[0]
+    assert result['grid_best_score'] == backtest.INITIAL_CAPITAL
+    assert result['search_best_rank'] == 2
+    assert not result['same_best']
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import signalcache
+from signalcache import SignalCache, fingerprint
+from strategy import signals_from_prices
+from synthetic import generate_market_data
+
+PARAMS = {'zscore_window': 60, 'zscore_threshold': 2.1, 'min_volatility': 0.05}
+
+
+@pytest.fixture(scope='module')
+def prices():
+    df = generate_market_data(5000, seed=6)
+    return df['spot'].to_numpy(), df['future'].to_numpy()
+
+
+def test_fingerprint_keys_on_content(prices):
+    spot, future = prices
+    assert fingerprint(spot, future) == fingerprint(spot.copy(), future.copy())
+    changed = spot.copy()
+    changed[-1] += 1e-9
+    assert fingerprint(changed, future) != fingerprint(spot, future)
+    assert fingerprint(spot.astype(np.float32), future) != fingerprint(spot, future)
+    assert fingerprint(spot, future) != fingerprint(future, spot)
+
+
+def test_identical_hits_and_different_misses(prices):
+    spot, future = prices
+    cache = SignalCache()
+    expected = signals_from_prices(spot, future, **PARAMS)
+    np.testing.assert_array_equal(signals_from_prices(spot, future, **PARAMS, cache=cache), expected)
+    misses = cache.misses
+    np.testing.assert_array_equal(signals_from_prices(spot.copy(), future.copy(), **PARAMS, cache=cache), expected)
+    assert cache.misses == misses and cache.hits > 0
+
+    # 只换阈值：滚动统计量命中，信号重新计算
+    hits = cache.hits
+    signals_from_prices(spot, future, **dict(PARAMS, zscore_threshold=1.5), cache=cache)
+    assert cache.misses == misses + 1 and cache.hits > hits
+    # 换窗口或换数据都不命中
+    signals_from_prices(spot, future, **dict(PARAMS, zscore_window=120), cache=cache)
+    assert cache.misses > misses + 1
+    misses = cache.misses
+    changed = spot * 1.001
+    np.testing.assert_array_equal(signals_from_prices(changed, future, **PARAMS, cache=cache),
+                                  signals_from_prices(changed, future, **PARAMS))
+    assert cache.misses > misses
+
+
+def test_worker_budget_is_shared(prices, monkeypatch):
+    spot, future = prices
+    cache = SignalCache()
+    signals_from_prices(spot, future, **PARAMS, cache=cache)
+    assert len(cache.entries) > 1
+    cache.resize(1)
+    assert len(cache.entries) == 1 and cache.nbytes == next(iter(cache.entries.values())).nbytes
+
+    monkeypatch.setattr(signalcache, 'CACHE', SignalCache())
+    signalcache.configure_worker(8)
+    assert signalcache.CACHE.max_bytes == signalcache.MAX_BYTES // 8
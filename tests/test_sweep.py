@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+from strategy import signals_from_prices
+from sweep import run_sweep
+from synthetic import generate_pair
+
+PARAMS = {'zscore_window': 60, 'zscore_threshold': 2.0, 'min_volatility': 0.0, 'take_profit': 0.01}
+
+
+@pytest.fixture(scope='module')
+def market_data():
+    """含成交量与资金费率列的行情，与 load_data 的输出结构相同"""
+    spot, future = generate_pair(20_000, seed=2)
+    df = pd.DataFrame({'spot': spot['close'], 'future': future['close'],
+                       'spot_volume': spot['volume'], 'future_volume': future['volume']})
+    settlements = pd.date_range(df.index[0], df.index[-1], freq='8h')
+    funding = pd.Series(np.random.default_rng(2).normal(1e-4, 3e-4, len(settlements)), index=settlements)
+    df['funding_rate'] = backtest.funding_per_bar(df.index, funding)
+    return df
+
+
+def test_sweep_matches_run_backtest_with_costs(market_data, monkeypatch):
+    """共享数组带上成本列：启用滑点与资金费时扫描结果与按 DataFrame 成本列的单次回测一致"""
+    monkeypatch.setattr(backtest, 'ENABLE_FEE', True)
+    monkeypatch.setattr(backtest, 'ENABLE_SLIPPAGE', True)
+    monkeypatch.setattr(backtest, 'ENABLE_FUNDING', True)
+    spot, future = market_data['spot'].to_numpy(), market_data['future'].to_numpy()
+    signal = signals_from_prices(spot, future, PARAMS['zscore_window'], PARAMS['zscore_threshold'],
+                                 PARAMS['min_volatility'])
+    backtest_params = dict(take_profit=PARAMS['take_profit'], raw_metrics=True)
+    _, expected = backtest.backtest_arrays(market_data.index, spot, future, signal,
+                                           **backtest._cost_columns(market_data), **backtest_params)
+    _, without_costs = backtest.backtest_arrays(market_data.index, spot, future, signal, **backtest_params)
+    assert expected['最终资金'] != without_costs['最终资金']
+
+    # n_jobs=1 同样经共享内存句柄映射数组（_init_worker/_attach），与多进程的数据路径相同
+    row = run_sweep(market_data, [PARAMS], n_jobs=1).iloc[0]
+    assert row['交易次数'] == expected['交易次数'] > 0
+    assert row['最终资金'] == expected['最终资金']
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from visualizer import minmax_decimate, lttb
+
+
+def pixel_ranges(x, y, n_buckets, lo, hi):
+    """逐像素列的 (min, max)，用于与降采样结果对照"""
+    column = np.minimum(((x - lo) / (hi - lo) * n_buckets).astype(np.int64), n_buckets - 1)
+    return {c: (y[column == c].min(), y[column == c].max()) for c in np.unique(column)}
+
+
+def test_minmax_preserves_each_pixel_on_irregular_x():
+    rng = np.random.default_rng(0)
+    # 前半段密集、后半段稀疏：按点数等分时一个桶会跨越很多像素列
+    x = np.sort(np.concatenate([rng.uniform(0, 10, 50_000), rng.uniform(10, 100, 500)]))
+    y = rng.normal(size=len(x)).cumsum()
+    xd, yd = minmax_decimate(x, y, 200)
+    assert len(xd) < len(x) and np.all(np.diff(xd) >= 0)
+    expected = pixel_ranges(x, y, 200, x[0], x[-1])
+    actual = pixel_ranges(xd, yd, 200, x[0], x[-1])
+    assert actual == expected
+
+
+def test_datetime_x():
+    x = np.arange('2024-01-01', '2024-03-01', dtype='datetime64[m]')
+    y = np.sin(np.arange(len(x)) / 500.0)
+    xd, yd = minmax_decimate(x, y, 300)
+    assert xd.dtype == x.dtype and len(xd) <= 2 * 300 + 2
+    assert yd.max() == y.max() and yd.min() == y.min()
+
+
+@pytest.mark.parametrize('decimate', [lambda x, y: minmax_decimate(x, y, 100), lambda x, y: lttb(x, y, 200)])
+def test_nan_gaps_stay_broken(decimate):
+    x = np.arange(100_000, dtype=np.float64)
+    y = np.cos(x / 1000)
+    y[:120] = np.nan        # 滚动窗口的前导 NaN
+    y[40_000:41_000] = np.nan
+    xd, yd = decimate(x, y)
+    assert len(xd) < 1000
+    gap = np.flatnonzero(np.isnan(yd))
+    assert set(xd[gap]) == {0.0, 40_000.0}
+    # 缺口两侧的有效点保留，折线恰好在缺口处断开
+    assert {119.0 + 1, 39_999.0, 41_000.0} <= set(xd[~np.isnan(yd)])
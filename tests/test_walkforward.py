@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+from synthetic import generate_market_data
+from walkforward import make_folds, run_walk_forward
+
+PARAMS = [{'zscore_window': w, 'zscore_threshold': t} for w in (60, 120) for t in (1.8, 2.1)]
+
+
+def test_rolling_and_expanding_folds():
+    index = pd.date_range('2024-01-01', periods=100, freq='1h')
+    rolling = make_folds(index, 40, 20)
+    assert [(f[0].start, f[0].stop, f[1].start, f[1].stop) for f in rolling] == [(0, 40, 40, 60), (20, 60, 60, 80),
+                                                                                  (40, 80, 80, 100)]
+    expanding = make_folds(index, 40, 20, step=30, mode='expanding')
+    assert [(f[0].start, f[0].stop, f[1].start, f[1].stop) for f in expanding] == [(0, 40, 40, 60), (0, 70, 70, 90)]
+    # 时间长度按 bar 数换算
+    assert make_folds(index, '40h', '20h') == rolling
+    with pytest.raises(ValueError):
+        make_folds(index, 40, 20, mode='anchored')
+
+
+@pytest.mark.parametrize('mode', ['rolling', 'expanding'])
+def test_test_bars_never_in_train(mode):
+    index = pd.date_range('2024-01-01', periods=1000, freq='5min')
+    folds = make_folds(index, 300, 100, step=70, mode=mode)
+    assert folds
+    for train, test in folds:
+        assert train.stop == test.start and test.stop <= len(index)
+        assert not set(range(train.start, train.stop)) & set(range(test.start, test.stop))
+
+
+def test_stitched_equity_is_bar_level(monkeypatch):
+    monkeypatch.setattr(backtest, 'ENABLE_DEBUG', False)
+    market_data = generate_market_data(12_000, seed=4)
+    equity, folds = run_walk_forward(market_data, PARAMS, train_size=4000, test_size=2000, n_jobs=1)
+
+    assert len(folds) == 4
+    # 每根样本外 bar 都有盯市资金，而不只是平仓时刻
+    assert equity.index.equals(market_data.index[4000:12_000])
+    for _, fold in folds.iterrows():
+        fold_equity = equity[fold['test_start']:fold['test_end']]
+        assert len(fold_equity) == 2000
+        assert fold_equity.iloc[0] == pytest.approx(fold['start_capital'])
+    assert (folds['start_capital'].iloc[1:].to_numpy() == folds['end_capital'].iloc[:-1].to_numpy()).all()
+    assert folds['test_交易次数'].sum() > 0
+    # 持仓期间的浮动盈亏进入资金曲线（仅用平仓资金时取值个数不超过交易次数 + 折数）
+    assert equity.nunique() > folds['test_交易次数'].sum() + len(folds)
@@ -1,14 +1,120 @@
+import io
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from matplotlib import pyplot as plt
+from types import SimpleNamespace
+import matplotlib
+
+from instrumentation import stage
+from artifacts import submit, enabled as artifact_enabled
 
 ENABLE_DEBUG = True
+# 折线降采样方式：'minmax' - 每像素保留最小/最大值；'lttb' - Largest-Triangle-Three-Buckets；None - 不降采样
+DECIMATION = 'minmax'
+
+
+def _numeric(x: np.ndarray) -> np.ndarray:
+    """横坐标转为 float64，时间按纳秒计"""
+    return (x.view(np.int64) if x.dtype.kind == 'M' else x).astype(np.float64)
+
+
+def _first_in_segment(mask: np.ndarray, segment: np.ndarray) -> np.ndarray:
+    """每段中第一个 mask 为 True 的位置"""
+    idx = np.flatnonzero(mask)
+    _, first = np.unique(segment[idx], return_index=True)
+    return idx[first]
+
+
+def _keep_gaps(y: np.ndarray, decimate_valid) -> np.ndarray:
+    """
+    只对非 NaN 点降采样（decimate_valid 接收有效点位置或全选切片，返回其中保留的下标），
+    再保留每段连续 NaN 的第一个点及其两侧的有效点，折线在缺口处断开而不是直线连过。
+    """
+    valid = ~np.isnan(y)
+    if valid.all():
+        return decimate_valid(slice(None))
+    pos = np.flatnonzero(valid)
+    keep = pos[decimate_valid(pos)] if len(pos) else pos
+    missing = ~valid
+    run_start = np.flatnonzero(missing & ~np.concatenate([[False], missing[:-1]]))
+    run_end = np.flatnonzero(missing & ~np.concatenate([missing[1:], [False]]))
+    before = run_start[run_start > 0] - 1
+    after = run_end[run_end < len(y) - 1] + 1
+    return np.unique(np.concatenate([keep, run_start, before, after]))
+
+
+def _minmax_indices(xf: np.ndarray, y: np.ndarray, n_buckets: int, x_range) -> np.ndarray:
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    edges = np.linspace(x_range[0], x_range[1], n_buckets + 1)[1:-1]
+    starts = np.unique(np.concatenate([[0], np.searchsorted(xf, edges, side='left')]))
+    starts = starts[starts < n]
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    low = _first_in_segment(y == np.minimum.reduceat(y, starts)[segment], segment)
+    high = _first_in_segment(y == np.maximum.reduceat(y, starts)[segment], segment)
+    return np.unique(np.concatenate([[0, n - 1], low, high]))
+
+
+def minmax_decimate(x: np.ndarray, y: np.ndarray, n_buckets: int, x_range=None) -> tuple:
+    """
+    把横坐标范围 x_range（默认为数据首尾）等分为 n_buckets 段，每段只保留最小值和最大值（按原顺序），外加首尾两点。
+
+    按横坐标而非点数分段：n_buckets 取坐标轴像素宽度时每段恰好对应一个像素列，
+    不规则的 x（阶梯资金曲线、有缺口的行情）下每个像素列内折线的竖直范围仍与原始数据相同。
+    NaN 点保留为断点。
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) == 0:
+        return x, y
+    xf = _numeric(x)
+    if x_range is None:
+        x_range = (xf[0], xf[-1])
+    keep = _keep_gaps(y, lambda pos: _minmax_indices(xf[pos], y[pos], n_buckets, x_range))
+    return x[keep], y[keep]
+
+
+def _lttb_indices(xf: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # 各桶均值用前缀和一次算出
+    cx = np.concatenate([[0.0], np.cumsum(xf)])
+    cy = np.concatenate([[0.0], np.cumsum(y)])
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        if b + 2 < len(edges):
+            nlo, nhi = edges[b + 1], edges[b + 2]
+        else:
+            nlo, nhi = n - 1, n
+        avg_x = (cx[nhi] - cx[nlo]) / (nhi - nlo)
+        avg_y = (cy[nhi] - cy[nlo]) / (nhi - nlo)
+        area = np.abs((xf[a] - avg_x) * (y[lo:hi] - y[a]) - (xf[a] - xf[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        keep[b + 1] = a
+    return keep
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> tuple:
+    """Largest-Triangle-Three-Buckets 降采样：每个桶保留与前一选中点、后一桶均值构成三角形面积最大的点；NaN 点保留为断点"""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    xf = _numeric(x)
+    keep = _keep_gaps(y, lambda pos: _lttb_indices(xf[pos], y[pos], n_out))
+    return x[keep], y[keep]
+
 
 class Visualizer:
     """图表绘制类"""
 
-    def __init__(self):
+    def __init__(self, decimation=DECIMATION):
+        # 折线按坐标轴像素宽度降采样，信号散点与交易标记始终逐点绘制
+        self.decimation = decimation
         # 图表注册字典，默认注册 premium/signals 图表和资金曲线图表
         self.charts = {}
         self.register_chart("premium_signals", self._plot_premium_signals)
@@ -18,26 +124,56 @@ class Visualizer:
         """关联策略类，方便获取配置参数"""
         self.strategy = strategy
 
+    def __getstate__(self):
+        """传给 worker 进程时只保留策略的配置参数，不携带行情数据"""
+        state = self.__dict__.copy()
+        strategy = state.get('strategy')
+        if strategy is not None:
+            skip = ('market_data', 'alignment')
+            state['strategy'] = SimpleNamespace(**{k: v for k, v in vars(strategy).items()
+                                                  if k not in skip and not isinstance(v, pd.DataFrame)})
+        return state
+
     def load_data(self, *data):
         """导入数据"""
         self.data = data
 
     def register_chart(self, key: str, func):
-        """注册新的图表绘制方法，便于后续扩展图表"""
+        """注册新的图表绘制方法，便于后续扩展图表；签名为 func(ax, market_data, position_history)"""
         self.charts[key] = func
 
     def _configure_plot(self):
-        plt.rcParams['font.sans-serif'] = ['Arial Unicode MS']
+        matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS']
+
+    def decimate(self, ax, x, y) -> tuple:
+        """按 ax 的像素宽度对折线数据降采样，供注册的图表方法使用；NaN 点保留，折线在缺口处断开"""
+        x = np.asarray(x)
+        y = np.asarray(y, dtype=np.float64)
+        if self.decimation is None:
+            return x, y
+        width = max(int(ax.get_window_extent().width), 1)
+        if self.decimation == 'minmax':
+            return minmax_decimate(x, y, width)
+        if self.decimation == 'lttb':
+            return lttb(x, y, 2 * width)
+        raise ValueError("无效的 decimation 参数，请使用 'minmax'、'lttb' 或 None。")
+
+    def line(self, ax, series: pd.Series, *args, **kwargs):
+        """降采样后绘制以时间为索引的折线"""
+        x, y = self.decimate(ax, series.index.to_numpy(), series.to_numpy())
+        return ax.plot(x, y, *args, **kwargs)
 
     def _plot_premium(self, ax, market_data: pd.DataFrame, premium_col: str):
         """绘制 premium 和移动平均"""
-        ax.plot(
+        self.line(
+            ax,
             market_data[premium_col],
             label='溢价',
             color='#2ca02c',
             linewidth=1
         )
-        ax.plot(
+        self.line(
+            ax,
             market_data['mean_premium_pct'],
             '--',
             label='移动平均',
@@ -54,13 +190,15 @@ class Visualizer:
         ax.set_ylabel(f'{self.strategy.SYMBOL}' + '溢价（USDT）' if premium_col == 'premium' else '溢价率（%）')
 
     def _plot_signals(self, ax, market_data: pd.DataFrame, premium_col: str):
-        """绘制交易信号"""
-        long_signals = market_data[market_data['signal'] == 1]
-        short_signals = market_data[market_data['signal'] == -1]
-        ax.scatter(long_signals.index, long_signals[premium_col],
-                   marker='^', color='g', s=30, label='做多信号')
-        ax.scatter(short_signals.index, short_signals[premium_col],
-                   marker='v', color='r', s=30, label='做空信号')
+        """绘制交易信号（逐点绘制，不降采样）"""
+        signal = market_data['signal'].to_numpy()
+        index = market_data.index.to_numpy()
+        premium = market_data[premium_col].to_numpy()
+        # 无连线的 marker 折线与 scatter 外观一致（markersize 为 scatter 面积 s=30 的平方根），渲染快得多
+        for value, marker, color, label in ((1, '^', 'g', '做多信号'), (-1, 'v', 'r', '做空信号')):
+            mask = signal == value
+            ax.plot(index[mask], premium[mask], linestyle='none', marker=marker, color=color,
+                    markersize=np.sqrt(30), label=label)
 
     def _plot_premium_signals(self, ax, market_data: pd.DataFrame, premium_col: str):
         """组合绘制 premium 和信号"""
@@ -68,9 +206,17 @@ class Visualizer:
         self._plot_signals(ax, market_data, premium_col)
 
     def _plot_capital(self, ax, market_data, position_history: pd.DataFrame):
-        """绘制资金曲线"""
-        ax.plot(
-            position_history.set_index('exit_time')['final_capital'].copy().reindex(market_data.index, method='ffill'),
+        """绘制资金曲线：资金只在平仓时变化，直接按平仓时间画阶梯线，无需对齐到全部 bar"""
+        if position_history.empty:
+            return
+        capital = position_history['final_capital'].to_numpy()
+        x = np.concatenate([market_data.index[:1].to_numpy(), position_history['exit_time'].to_numpy(),
+                            market_data.index[-1:].to_numpy()])
+        y = np.concatenate([position_history['initial_capital'].to_numpy()[:1], capital, capital[-1:]])
+        x, y = self.decimate(ax, x, y)
+        ax.step(
+            x, y,
+            where='post',
             label='资金曲线',
             color='#1f77b4',
             linewidth=1
@@ -79,22 +225,30 @@ class Visualizer:
         ax.set_xlabel('时间')
         ax.legend()
 
-    def _save_if_debug(self):
-        if ENABLE_DEBUG:
-            plt.savefig(
-                f"debug/plot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-
-    def plot_signals(self, market_data: pd.DataFrame, premium_col: str = 'premium_pct'):
-        """绘制 premium 和信号"""
-        self._configure_plot()
-        fig, ax = plt.subplots(figsize=(15, 8))
-        self.charts["premium_signals"](
-            ax, market_data, premium_col=premium_col)
-        plt.tight_layout()
-        self._save_if_debug()
-        plt.show()
-
-    def plot(self, market_data: pd.DataFrame, position_history: pd.DataFrame, layout: str = 'stacked'):
+    def _save_if_debug(self, fig):
+        if ENABLE_DEBUG and artifact_enabled('plot'):
+            # 渲染须在主线程完成，写盘交给后台线程
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png')
+            submit('plot', f"plot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png", buffer.getvalue())
+
+    def plot_signals(self, market_data: pd.DataFrame, premium_col: str = 'premium_pct', show: bool = True):
+        """绘制 premium 和信号；show=False 时不调用 plt.show()，直接返回 Figure"""
+        # pyplot 只在交互绘图时导入，无界面渲染（report.py）不加载 GUI 后端
+        from matplotlib import pyplot as plt
+        with stage('plot', rows=len(market_data)):
+            self._configure_plot()
+            fig, ax = plt.subplots(figsize=(15, 8))
+            self.charts["premium_signals"](
+                ax, market_data, premium_col=premium_col)
+            fig.tight_layout()
+            self._save_if_debug(fig)
+        if show:
+            plt.show()
+        return fig
+
+    def plot(self, market_data: pd.DataFrame, position_history: pd.DataFrame, layout: str = 'stacked',
+             show: bool = True):
         """
         统一绘图接口，根据 layout 参数选择布局，同时利用注册的图表方法便于后续扩展。
 
@@ -104,17 +258,29 @@ class Visualizer:
             layout: 
                 'stacked' - 上下两块面板（上面绘制 premium/signals，下面绘制资金曲线）
                 'twin'    - 单图双 y 轴（左侧绘制 premium/signals，右侧绘制资金曲线）
+            show: 是否调用 plt.show()；为 False 时直接返回 Figure
         """
-        self._configure_plot()
+        from matplotlib import pyplot as plt
+        # 绘制与保存计入 plot 阶段，plt.show() 的阻塞等待不计入
+        with stage('plot', rows=len(market_data)):
+            self._configure_plot()
+            fig = plt.figure(figsize=(15, 8))
+            self.draw(fig, market_data, position_history, layout)
+            self._save_if_debug(fig)
+        if show:
+            plt.show()
+        return fig
 
+    def draw(self, fig, market_data: pd.DataFrame, position_history: pd.DataFrame, layout: str = 'stacked'):
+        """在给定的 Figure 上按 layout 绘制，不依赖 pyplot 的全局状态，可用于无界面渲染"""
         if layout == 'stacked':
-            fig, (ax_top, ax_bottom) = plt.subplots(2, 1, figsize=(15, 8))
+            ax_top, ax_bottom = fig.subplots(2, 1)
             # premium/signals 面板使用 'premium_pct' 字段
             self.charts["premium_signals"](
                 ax_top, market_data, premium_col='premium_pct')
             self.charts["capital"](ax_bottom, market_data, position_history)
         elif layout == 'twin':
-            fig, ax_left = plt.subplots(figsize=(15, 8))
+            ax_left = fig.subplots()
             ax_right = ax_left.twinx()
             # premium/signals 面板使用 'premium' 字段
             self.charts["premium_signals"](
@@ -123,7 +289,19 @@ class Visualizer:
             ax_right.set_xlabel('时间')
         else:
             raise ValueError("无效的 layout 参数，请使用 'stacked' 或 'twin'。")
+        fig.tight_layout()
 
-        plt.tight_layout()
-        self._save_if_debug()
-        plt.show()
+    def draw_charts(self, fig, market_data: pd.DataFrame, position_history: pd.DataFrame, charts=None):
+        """
+        在给定的 Figure 上自上而下逐个绘制注册的图表（默认全部）。
+
+        premium_signals 以 premium_pct 绘制，其余图表按 (ax, market_data, position_history) 调用。
+        """
+        charts = list(charts or self.charts)
+        axes = fig.subplots(len(charts), 1, squeeze=False)[:, 0]
+        for key, ax in zip(charts, axes):
+            if key == 'premium_signals':
+                self.charts[key](ax, market_data, premium_col='premium_pct')
+            else:
+                self.charts[key](ax, market_data, position_history)
+        fig.tight_layout()
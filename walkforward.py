@@ -0,0 +1,185 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest import backtest_arrays, INITIAL_CAPITAL
+from strategy import compute_premium_pct, rolling_zscore, compute_volatility, compute_raw_signal, \
+    filter_low_volatility
+from sweep import SharedMarketData, _attach, _split_params, _cost_kwargs
+
+# worker 进程内的共享数据
+_shared = {}
+
+
+def make_folds(index, train_size, test_size, step=None, mode='rolling') -> list:
+    """
+    把时间轴切分为训练/测试折，返回 [(train_slice, test_slice), ...]。
+
+    参数:
+        index: market_data.index
+        train_size / test_size / step: bar 数，或 '90d' 之类的时间长度（按 pd.Timedelta 解析）
+        mode: 'rolling' - 训练窗口定长滚动；'expanding' - 训练窗口起点固定、逐折扩张
+    """
+    index = pd.DatetimeIndex(index)
+
+    def to_bars(size):
+        if isinstance(size, str):
+            return int(np.searchsorted(index, index[0] + pd.Timedelta(size)))
+        return int(size)
+
+    train_bars = to_bars(train_size)
+    test_bars = to_bars(test_size)
+    step_bars = to_bars(step) if step is not None else test_bars
+    if mode not in ('rolling', 'expanding'):
+        raise ValueError("无效的 mode 参数，请使用 'rolling' 或 'expanding'。")
+
+    folds = []
+    train_end = train_bars
+    while train_end + test_bars <= len(index):
+        train_start = 0 if mode == 'expanding' else train_end - train_bars
+        folds.append((slice(train_start, train_end), slice(train_end, train_end + test_bars)))
+        train_end += step_bars
+    return folds
+
+
+def _precompute(market_data: pd.DataFrame, windows) -> dict:
+    """各折共用的滚动统计只在全序列上算一次（均为因果计算，不引入未来信息）"""
+    premium_pct = pd.Series(compute_premium_pct(market_data['spot'].to_numpy(dtype=np.float64),
+                                                market_data['future'].to_numpy(dtype=np.float64)))
+    arrays = {'volatility': compute_volatility(premium_pct).to_numpy()}
+    for window in windows:
+        arrays[f'zscore_{window}'] = rolling_zscore(premium_pct, window)[2].to_numpy()
+    return arrays
+
+
+def _signal(arrays, sl, zscore_window, zscore_threshold, min_volatility):
+    raw_signal = compute_raw_signal(arrays[f'zscore_{zscore_window}'][sl], zscore_threshold)
+    return filter_low_volatility(raw_signal, arrays['volatility'][sl], min_volatility)
+
+
+def _evaluate(arrays, sl, params, initial_capital, return_equity=False):
+    """在切片上回测，return_equity=True 时额外返回逐 bar 盯市资金（Series）"""
+    signal_params, backtest_params = _split_params(params)
+    result = backtest_arrays(
+        arrays['index'][sl], arrays['spot'][sl], arrays['future'][sl], _signal(arrays, sl, **signal_params),
+        initial_capital=initial_capital, raw_metrics=True, return_equity=return_equity, **_cost_kwargs(arrays, sl),
+        **backtest_params)
+    position_history, metrics = result[0], result[1]
+    if not metrics:
+        metrics = {"初始资金": initial_capital, "最终资金": initial_capital, "交易次数": 0}
+    if return_equity:
+        return position_history, metrics, result[2]['equity']
+    return position_history, metrics
+
+
+def _init_worker(handles: dict):
+    _shared.update(_attach(handles))
+
+
+def _run_fold(fold_id, train_slice, test_slice, params, objective, initial_capital) -> dict:
+    """在训练折上选出目标最优的参数，再在紧随其后的测试折上回测"""
+    arrays = _shared['arrays']
+    best_params, best_score = None, -np.inf
+    for p in params:
+        _, metrics = _evaluate(arrays, train_slice, p, initial_capital)
+        score = metrics.get(objective, np.nan)
+        if score is not None and not np.isnan(score) and score > best_score:
+            best_params, best_score = p, score
+    if best_params is None:
+        best_params = params[0]
+    position_history, test_metrics, equity = _evaluate(arrays, test_slice, best_params, initial_capital,
+                                                        return_equity=True)
+    index = arrays['index']
+    return {
+        'fold': fold_id,
+        'train_start': index[train_slice.start],
+        'train_end': index[train_slice.stop - 1],
+        'test_start': index[test_slice.start],
+        'test_end': index[test_slice.stop - 1],
+        'params': best_params,
+        'train_score': best_score,
+        'test_metrics': test_metrics,
+        'position_history': position_history,
+        'equity': equity,
+    }
+
+
+def run_walk_forward(market_data: pd.DataFrame, params: list, train_size, test_size, step=None,
+                     mode='rolling', objective='最终资金', n_jobs=None, initial_capital=INITIAL_CAPITAL) -> tuple:
+    """
+    滚动/扩张窗口的 walk-forward 优化。
+
+    参数:
+        market_data: 含 spot/future 列、按时间对齐的 DataFrame
+        params: 候选参数列表（sweep.param_grid / param_sample 的输出）
+        objective: 训练折上用于选参的指标（raw 指标字典中的键，越大越好）
+
+    返回 (equity, folds)：equity 为拼接后的逐 bar 样本外盯市资金曲线（各折首尾复利衔接，
+    折末未平仓的头寸不带入下一折），folds 为每折一行的选中参数与样本外指标。
+    """
+    folds = make_folds(market_data.index, train_size, test_size, step, mode)
+    if not folds:
+        raise ValueError("数据长度不足以切分出任何训练/测试折。")
+    windows = sorted({_split_params(p)[0]['zscore_window'] for p in params})
+    n_jobs = n_jobs or os.cpu_count() or 1
+    logging.info(f"walk-forward: {len(folds)} 折, {len(params)} 组候选参数, {n_jobs} 个进程")
+
+    results = []
+    with SharedMarketData(market_data, extra=_precompute(market_data, windows)) as shared:
+        tasks = [(i, train, test, params, objective, initial_capital) for i, (train, test) in enumerate(folds)]
+        if n_jobs == 1:
+            _init_worker(shared.handles())
+            try:
+                results = [_run_fold(*task) for task in tasks]
+            finally:
+                _shared.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                     initargs=(shared.handles(),)) as pool:
+                results = list(pool.map(_run_fold, *zip(*tasks)))
+
+    # 回测对初始资金是线性的，按上一折的期末资金缩放即可把各折的资金曲线首尾相接
+    capital = initial_capital
+    equity = []
+    rows = []
+    for result in results:
+        scale = capital / initial_capital
+        equity.append(result['equity'] * scale)
+        final_capital = result['test_metrics']['最终资金'] * scale
+        rows.append({
+            'fold': result['fold'],
+            'train_start': result['train_start'],
+            'train_end': result['train_end'],
+            'test_start': result['test_start'],
+            'test_end': result['test_end'],
+            **result['params'],
+            f'train_{objective}': result['train_score'],
+            **{f'test_{k}': v for k, v in result['test_metrics'].items()},
+            'start_capital': capital,
+            'end_capital': final_capital,
+        })
+        capital = final_capital
+    equity = pd.concat(equity).rename('equity')
+    return equity, pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    from strategy import MeanReversionStrategy
+    from sweep import param_grid
+
+    engine = MeanReversionStrategy()
+    engine.config()
+    engine.load_data()
+
+    space = {
+        'zscore_window': [60, 120, 240],
+        'zscore_threshold': [1.8, 2.1, 2.5],
+        'take_profit': [0.01, 0.02],
+        'stop_loss': [0.02, 0.03],
+    }
+    equity, folds = run_walk_forward(engine.market_data, param_grid(space), train_size='90d', test_size='30d')
+    print(folds.to_string())
+    print(f"样本外最终资金: {folds['end_capital'].iloc[-1]}")